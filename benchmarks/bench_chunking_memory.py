@@ -0,0 +1,125 @@
+"""
+Benchmark mémoire du découpage en chunks.
+
+Chaque taille de document est traitée dans un sous-processus dédié afin que
+le pic de RSS (ru_maxrss) mesuré ne dépende que de cette exécution.
+
+Usage :
+    python -m benchmarks.bench_chunking_memory --sizes 1 5 10 25 50
+    python -m benchmarks.bench_chunking_memory --sizes 1 2 4 --legacy
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from src.ingestion.chunking import build_text_splitter, iter_chunks
+
+PARAGRAPH = (
+    "Le présent contrat définit les conditions de maintenance applicatives. "
+    "Le prestataire s'engage sur un délai d'intervention de quatre heures ouvrées, "
+    "et sur la fourniture d'un rapport mensuel d'activité.\n\n"
+)
+BATCH_SIZE = 256
+
+
+def synthetic_segments(size_mb: float, segment_size: int = 1_000_000):
+    """Génère un document synthétique de size_mb Mo par segments"""
+    total = int(size_mb * 1_000_000)
+    segment = (PARAGRAPH * (segment_size // len(PARAGRAPH) + 1))[:segment_size]
+    produced = 0
+    while produced < total:
+        part = segment[:total - produced]
+        produced += len(part)
+        yield part
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est exprimé en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_streaming(size_mb: float) -> dict:
+    """Chemin de production : découpage en flux, stockage simulé par lots"""
+    splitter = build_text_splitter()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+
+    chunks = 0
+    batch = []
+    for chunk in iter_chunks(splitter, synthetic_segments(size_mb)):
+        batch.append({"content": chunk, "metadata": {"chunk_index": chunks}})
+        chunks += 1
+        if len(batch) >= BATCH_SIZE:
+            batch.clear()
+
+    return {
+        "mode": "streaming",
+        "size_mb": size_mb,
+        "chunks": chunks,
+        "duration": round(time.perf_counter() - start, 3),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def run_legacy(size_mb: float) -> dict:
+    """Ancien chemin : document complet en mémoire et une métadonnée par caractère"""
+    splitter = build_text_splitter()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+
+    content = "".join(synthetic_segments(size_mb))
+    documents = splitter.create_documents(
+        texts=[content],
+        metadatas=[{"doc_id": "bench", "chunk_index": i} for i in range(len(content))]
+    )
+
+    return {
+        "mode": "legacy",
+        "size_mb": size_mb,
+        "chunks": len(documents),
+        "duration": round(time.perf_counter() - start, 3),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 5, 10, 25, 50], help="Tailles en Mo")
+    parser.add_argument("--legacy", action="store_true", help="Mesure aussi l'ancien découpage")
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="streaming", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        runner = run_legacy if args.mode == "legacy" else run_streaming
+        print(json.dumps(runner(args.child)))
+        return
+
+    modes = ["streaming", "legacy"] if args.legacy else ["streaming"]
+    results = []
+    for mode in modes:
+        for size in args.sizes:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_chunking_memory", "--child", str(size), "--mode", mode],
+                check=True,
+                capture_output=True,
+                text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            print(
+                f"{result['mode']:>9} {result['size_mb']:>6} Mo : {result['chunks']:>7} chunks "
+                f"en {result['duration']:>7}s, pic RSS {result['peak_rss_mb']} Mo",
+                file=sys.stderr
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Benchmark de bout en bout : ingestion, recherche et endpoints de l'API.
+
+Tout tourne dans un répertoire temporaire (collection ChromaDB, index BM25,
+file de traitements) avec un faux serveur Ollama (latence et débit de
+tokens configurables) et des embeddings déterministes (backend "hashing"),
+sans réseau ni modèle. Le corpus synthétique est généré à partir d'une graine :
+deux exécutions sur la même machine sont comparables.
+
+Phases :
+- ingest : DocumentProcessor.process_document (docs/s, chunks/s)
+- search : ChromaDBManager.search_documents par mode (latences p50/p95/p99)
+- api    : /add_documents/ jusqu'à la fin du lot, /search_documents/, /ask
+
+Le résultat (JSON) contient le commit git et la mémoire résidente maximale
+après chaque phase. --compare affiche l'écart avec un résultat précédent.
+
+Usage :
+    python -m benchmarks.bench_e2e --documents 200 --queries 300 --output bench.json
+    python -m benchmarks.bench_e2e --output new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.fake_ollama import FakeOllamaServer
+
+WORDS = (
+    "contrat prestataire maintenance facture délai pénalité service client livraison "
+    "garantie résiliation avenant tarif révision indice disponibilité incident support "
+    "astreinte sauvegarde hébergement licence recette jalon paiement échéance périmètre "
+    "engagement niveau qualité audit sécurité données sous-traitance réversibilité"
+).split()
+
+
+def make_corpus(documents: int, doc_chars: int, seed: int = 42) -> List[Dict]:
+    """Documents de paragraphes pseudo-aléatoires, chacun citant une référence unique"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(documents):
+        paragraphs, size = [], 0
+        while size < doc_chars:
+            reference = f"REF-{index:04d}-{len(paragraphs):03d}"
+            paragraph = " ".join(rng.choices(WORDS, k=rng.randint(40, 90))) + f" (référence {reference})."
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        corpus.append({
+            "doc_id": f"bench_doc_{index}",
+            "content": "\n\n".join(paragraphs),
+            "metadata": {"author": f"auteur_{index % 5}", "category": f"categorie_{index % 3}", "source": "bench"}
+        })
+    return corpus
+
+
+def make_queries(corpus: List[Dict], count: int, seed: int = 7) -> List[str]:
+    """Extraits de 6 mots tirés du corpus, la moitié avec une référence"""
+    rng = random.Random(seed)
+    queries = []
+    for index in range(count):
+        paragraph = rng.choice(rng.choice(corpus)["content"].split("\n\n"))
+        words = paragraph.split()
+        start = rng.randint(0, max(0, len(words) - 8))
+        query = " ".join(words[start:start + 6])
+        if index % 2:
+            query += " " + paragraph.rsplit("référence ", 1)[1].rstrip(").")
+        queries.append(query)
+    return queries
+
+
+def latency_summary(durations: List[float]) -> Dict:
+    ordered = sorted(durations)
+
+    def percentile(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99)
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def bench_ingest(corpus: List[Dict], concurrency: int) -> Dict:
+    from src.ingestion.document_processor import get_document_processor
+
+    document_processor = get_document_processor()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    chunks = 0
+
+    async def ingest(document: Dict):
+        nonlocal chunks
+        async with semaphore:
+            result = await document_processor.process_document(
+                doc_id=document["doc_id"], content=document["content"], metadata=dict(document["metadata"])
+            )
+            chunks += result["chunks_info"]["total_chunks"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ingest(document) for document in corpus))
+    duration = time.perf_counter() - start
+    return {
+        "documents": len(corpus),
+        "chunks": chunks,
+        "concurrency": concurrency,
+        "duration": round(duration, 3),
+        "docs_per_second": round(len(corpus) / duration, 2),
+        "chunks_per_second": round(chunks / duration, 1),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+async def bench_search(queries: List[str], modes: List[str], n_results: int) -> Dict:
+    from src.db.chroma import get_db_manager
+
+    db_manager = get_db_manager()
+
+    results = {}
+    for mode in modes:
+        await db_manager.search_documents(queries[0], n_results=n_results, mode=mode)
+        durations = []
+        for query in queries:
+            start = time.perf_counter()
+            await db_manager.search_documents(query, n_results=n_results, mode=mode, min_relevance_score=0)
+            durations.append(time.perf_counter() - start)
+        results[mode] = latency_summary(durations)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+async def bench_api(corpus: List[Dict], queries: List[str], ask_queries: int) -> Dict:
+    import httpx
+    import src.main as api
+
+    # Cycle de vie de l'application (création des services, workers de la file)
+    async with api.lifespan(api.app):
+        async with httpx.AsyncClient(app=api.app, base_url="http://bench", timeout=300) as client:
+            # Ingestion par lot via la file de traitements
+            documents = [{**document, "doc_id": f"api_{document['doc_id']}"} for document in corpus]
+            start = time.perf_counter()
+            response = await client.post("/add_documents/", json={"documents": documents})
+            response.raise_for_status()
+            batch_id = response.json()["batch_id"]
+            while True:
+                status = (await client.get(f"/batches/{batch_id}")).json()
+                if status["progress"] >= 1:
+                    break
+                await asyncio.sleep(0.05)
+            batch_duration = time.perf_counter() - start
+
+            search_durations = []
+            for query in queries:
+                start = time.perf_counter()
+                response = await client.post("/search_documents/", json={"query": query, "n_results": 5})
+                response.raise_for_status()
+                search_durations.append(time.perf_counter() - start)
+
+            first_tokens, totals = [], []
+            for query in queries[:ask_queries]:
+                async with client.stream("POST", "/ask", json={"question": query, "min_relevance_score": 0}) as response:
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                        elif line.startswith("data: ") and event == "done":
+                            metrics = json.loads(line[len("data: "):])
+                            if metrics.get("time_to_first_token") is not None:
+                                first_tokens.append(metrics["time_to_first_token"])
+                            totals.append(metrics["total_time"])
+
+    return {
+        "batch_ingest": {
+            "documents": len(documents),
+            "completed": status["completed"],
+            "failed": status["failed"],
+            "duration": round(batch_duration, 3),
+            "docs_per_second": round(len(documents) / batch_duration, 2)
+        },
+        "search_endpoint": latency_summary(search_durations),
+        "ask_time_to_first_token": latency_summary(first_tokens) if first_tokens else None,
+        "ask_total": latency_summary(totals) if totals else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare(current: Dict, baseline: Dict, path: str = ""):
+    """Affiche l'écart relatif des métriques numériques communes aux deux résultats"""
+    for key, value in current.items():
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and isinstance(previous, dict):
+            compare(value, previous, name)
+        elif isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+            change = (value - previous) / previous * 100
+            print(f"{name:<55} {previous:>12} -> {value:>12} ({change:+.1f} %)", file=sys.stderr)
+
+
+async def run(args) -> Dict:
+    corpus = make_corpus(args.documents, args.doc_chars)
+    queries = make_queries(corpus, args.queries)
+    results = {}
+    if "ingest" in args.phases:
+        results["ingest"] = await bench_ingest(corpus, args.concurrency)
+        print(f"ingest : {results['ingest']['docs_per_second']} docs/s, "
+              f"{results['ingest']['chunks_per_second']} chunks/s", file=sys.stderr)
+    if "search" in args.phases:
+        results["search"] = await bench_search(queries, args.modes, args.n_results)
+        for mode in args.modes:
+            print(f"search ({mode}) : p50 {results['search'][mode]['p50_ms']} ms, "
+                  f"p99 {results['search'][mode]['p99_ms']} ms", file=sys.stderr)
+    if "api" in args.phases:
+        results["api"] = await bench_api(corpus[:args.api_documents], queries, args.ask_queries)
+        print(f"api : {results['api']['batch_ingest']['docs_per_second']} docs/s (lot), "
+              f"/search_documents/ p50 {results['api']['search_endpoint']['p50_ms']} ms", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--doc-chars", type=int, default=8000, help="Taille approximative d'un document")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents ingérés simultanément")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=["vector", "hybrid"], choices=["vector", "lexical", "hybrid"])
+    parser.add_argument("--api-documents", type=int, default=50, help="Documents ingérés via /add_documents/")
+    parser.add_argument("--ask-queries", type=int, default=20)
+    parser.add_argument("--phases", nargs="+", default=["ingest", "search", "api"], choices=["ingest", "search", "api"])
+    parser.add_argument("--ollama-latency", type=float, default=0.05, help="Délai avant le premier token (s)")
+    parser.add_argument("--ollama-tokens-per-second", type=float, default=0.0, help="0 = illimité")
+    parser.add_argument("--embedding-backend", default="hashing", choices=["onnx", "sentence-transformers", "hashing"])
+    parser.add_argument("--search-cache", action="store_true", help="Laisse le cache des résultats de recherche actif")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Résultat précédent (JSON) à comparer")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(latency=args.ollama_latency, tokens_per_second=args.ollama_tokens_per_second).start()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Configuration lue à l'import des modules de l'API : à définir avant
+        os.environ.update({
+            "OLLAMA_HOST": server.url,
+            "DATA_DIR": tmp_dir,
+            "CHROMA_PATH": os.path.join(tmp_dir, "chroma"),
+            "LEXICAL_INDEX_PATH": os.path.join(tmp_dir, "bm25"),
+            "EMBEDDING_BACKEND": args.embedding_backend,
+            "LLM_CACHE_ENABLED": "false",
+            "WARMUP_ENABLED": "false",
+            "SEARCH_CACHE_ENABLED": "true" if args.search_cache else "false"
+        })
+        for name in ("DOCUMENT_STORE_PATH", "JOB_QUEUE_PATH", "LLM_CACHE_PATH", "SEARCH_GENERATION_PATH"):
+            os.environ.pop(name, None)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "ollama_requests": server.requests,
+        "results": results
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Comparaison avec {baseline.get('commit')} :", file=sys.stderr)
+        compare(results, baseline.get("results", {}))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark du moteur d'embedding : débit (textes/s) selon le backend, la
+taille des lots et le nombre de threads, indépendamment de ChromaDB.
+
+Les textes ont des longueurs variées (comme des chunks de fin de document)
+pour mesurer l'effet du tri par longueur et du padding dynamique.
+
+Usage :
+    python -m benchmarks.bench_embeddings --backend onnx --texts 1000 --batch-sizes 16 64 256 --threads 1 2 4
+    python -m benchmarks.bench_embeddings --backend hashing
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from src.db.embeddings import EMBEDDING_BACKENDS, create_embedder
+
+WORDS = (
+    "contrat prestataire maintenance facture délai pénalité service client livraison "
+    "garantie résiliation avenant tarif révision indice disponibilité incident support"
+).split()
+
+
+def make_texts(count: int, max_words: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(10, max_words))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="onnx", choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--max-words", type=int, default=180, help="Longueur maximale d'un texte, en mots")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.max_words)
+    results = []
+    for batch_size in args.batch_sizes:
+        for threads in args.threads:
+            engine = create_embedder(args.backend, batch_size=batch_size, threads=threads)
+            try:
+                # Chargement du modèle hors mesure
+                engine.embed(texts[:batch_size])
+                start = time.perf_counter()
+                engine.embed(texts)
+                duration = time.perf_counter() - start
+            finally:
+                engine.shutdown()
+
+            result = {
+                "backend": args.backend,
+                "batch_size": batch_size,
+                "threads": threads,
+                "texts": len(texts),
+                "duration": round(duration, 3),
+                "texts_per_second": round(len(texts) / duration, 1)
+            }
+            results.append(result)
+            print(
+                f"{args.backend} lots de {batch_size:>4}, {threads} threads : "
+                f"{result['texts_per_second']:>9} textes/s",
+                file=sys.stderr
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark de la recherche hybride (BM25 + vecteurs) face à la recherche vectorielle seule.
+
+Un corpus synthétique de chunks au vocabulaire proche est indexé dans une
+collection ChromaDB temporaire ; chaque chunk contient une référence unique
+(ex. "XR-2041-B"). Chaque requête cite une référence : le chunk attendu est
+celui qui la contient. Le benchmark reporte le recall@k et la latence
+(p50, p95) de chaque mode de recherche.
+
+Usage :
+    python -m benchmarks.bench_hybrid_search --chunks 2000 --queries 200 --k 1 3 10
+    python -m benchmarks.bench_hybrid_search --embedding-backend hashing   # hors ligne
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+WORDS = (
+    "contrat prestataire maintenance facture délai pénalité service client livraison "
+    "garantie résiliation avenant tarif révision indice disponibilité incident support "
+    "astreinte sauvegarde hébergement licence recette jalon paiement échéance"
+).split()
+
+
+def make_reference(rng: random.Random) -> str:
+    letters = "ABCDEFGHJKLMNPRSTUVWXYZ"
+    return f"{rng.choice(letters)}{rng.choice(letters)}-{rng.randint(1000, 9999)}-{rng.choice(letters)}"
+
+
+def make_corpus(chunks: int, seed: int = 42):
+    rng = random.Random(seed)
+    references = set()
+    while len(references) < chunks:
+        references.add(make_reference(rng))
+    references = sorted(references)
+    rng.shuffle(references)
+
+    ids, contents = [], []
+    for index, reference in enumerate(references):
+        words = rng.choices(WORDS, k=60)
+        words.insert(rng.randint(0, len(words)), f"référence {reference}")
+        ids.append(f"bench_chunk_{index}")
+        contents.append(" ".join(words))
+    return ids, contents, references
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(args):
+    from src.db.chroma import get_db_manager
+
+    db_manager = get_db_manager()
+
+    ids, contents, references = make_corpus(args.chunks)
+    start = time.perf_counter()
+    await db_manager.add_documents(ids, contents, [{"doc_id": "bench"} for _ in ids])
+    print(f"{len(ids)} chunks indexés en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    rng = random.Random(7)
+    queries = [(index, f"Quelles sont les conditions pour la référence {references[index]} ?")
+               for index in rng.sample(range(len(ids)), min(args.queries, len(ids)))]
+    max_k = max(args.k)
+
+    results = []
+    for mode in args.modes:
+        hits = {k: 0 for k in args.k}
+        latencies = []
+        # Préchauffage (chargement du modèle d'embedding, caches)
+        await db_manager.search_documents(queries[0][1], n_results=max_k, min_relevance_score=0, mode=mode)
+        for index, query in queries:
+            start = time.perf_counter()
+            response = await db_manager.search_documents(query, n_results=max_k, min_relevance_score=0, mode=mode)
+            latencies.append(time.perf_counter() - start)
+            found = [result["content"] for result in response["results"]]
+            for k in args.k:
+                hits[k] += contents[index] in found[:k]
+
+        result = {
+            "mode": mode,
+            "chunks": len(ids),
+            "queries": len(queries),
+            **{f"recall@{k}": round(hits[k] / len(queries), 3) for k in args.k},
+            "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 2)
+        }
+        results.append(result)
+        print(
+            f"{mode:>7} : " + ", ".join(f"recall@{k} {result[f'recall@{k}']}" for k in args.k)
+            + f", p50 {result['latency_p50_ms']} ms, p95 {result['latency_p95_ms']} ms",
+            file=sys.stderr
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--embedding-backend", default=os.getenv("EMBEDDING_BACKEND", "onnx"),
+                        choices=["onnx", "sentence-transformers", "hashing"])
+    parser.add_argument("--modes", nargs="+", default=["vector", "hybrid"], choices=["vector", "lexical", "hybrid"])
+    args = parser.parse_args()
+
+    # Collection et index lexical temporaires : les données de l'API ne sont pas touchées
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["CHROMA_PATH"] = os.path.join(tmp_dir, "chroma")
+        os.environ["DATA_DIR"] = tmp_dir
+        os.environ["LEXICAL_INDEX_PATH"] = os.path.join(tmp_dir, "bm25")
+        os.environ["LEXICAL_INDEX_ENABLED"] = "true"
+        os.environ["EMBEDDING_BACKEND"] = args.embedding_backend
+        results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark de l'extraction de texte par format (PDF, HTML, Markdown, texte).
+
+Pour chaque format, un corpus synthétique est analysé séquentiellement dans
+le processus courant, puis via le pool de processus de l'API avec différents
+nombres de workers ; le débit est reporté en documents/s et en Mo/s.
+
+Usage :
+    python -m benchmarks.bench_parsers --documents 40 --paragraphs 200 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from src.ingestion.parsers import DocumentParser, extract_text
+
+PARAGRAPH = (
+    "Le prestataire assure la maintenance corrective et évolutive de l'application "
+    "de gestion des contrats, avec un engagement de disponibilité de 99,5 %."
+)
+
+
+def make_text(paragraphs: int) -> bytes:
+    return "\n\n".join(f"{index}. {PARAGRAPH}" for index in range(paragraphs)).encode()
+
+
+def make_markdown(paragraphs: int) -> bytes:
+    parts = []
+    for index in range(paragraphs):
+        if index % 10 == 0:
+            parts.append(f"## Section {index // 10}")
+        parts.append(f"- **Point {index}** : {PARAGRAPH}")
+    return "\n\n".join(parts).encode()
+
+
+def make_html(paragraphs: int) -> bytes:
+    body = "".join(
+        (f"<h2>Section {index // 10}</h2>" if index % 10 == 0 else "")
+        + f"<p><b>Point {index}</b> : {PARAGRAPH}</p>"
+        for index in range(paragraphs)
+    )
+    return f"<html><head><style>p {{margin: 0}}</style></head><body>{body}</body></html>".encode()
+
+
+def make_pdf(paragraphs: int, lines_per_page: int = 40) -> bytes:
+    """PDF minimal (Helvetica, une ligne par paragraphe) sans dépendance externe"""
+    lines = [f"{index}. {PARAGRAPH}".encode("cp1252", errors="replace") for index in range(paragraphs)]
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    }
+    kids = []
+    for page_index, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * page_index, 5 + 2 * page_index
+        stream = b"BT /F1 8 Tf 30 800 Td 10 TL " + b"".join(
+            b"(" + line.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b") '"
+            for line in page_lines
+        ) + b" ET"
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(pages)
+
+    output = b"%PDF-1.4\n"
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offsets[object_id] for object_id in sorted(objects))
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return output
+
+
+GENERATORS = {"pdf": make_pdf, "html": make_html, "markdown": make_markdown, "text": make_text}
+FILENAMES = {"pdf": "bench.pdf", "html": "bench.html", "markdown": "bench.md", "text": "bench.txt"}
+
+
+def bench_sequential(data: bytes, file_format: str, documents: int) -> float:
+    # Import des bibliothèques d'analyse hors mesure
+    extract_text(data, file_format)
+    start = time.perf_counter()
+    for _ in range(documents):
+        extract_text(data, file_format)
+    return time.perf_counter() - start
+
+
+async def bench_pool(data: bytes, file_format: str, documents: int, workers: int) -> float:
+    parser = DocumentParser(max_workers=workers)
+    try:
+        # Démarrage des processus hors mesure
+        await asyncio.gather(*(parser.parse(data, FILENAMES[file_format]) for _ in range(workers)))
+        start = time.perf_counter()
+        await asyncio.gather(*(parser.parse(data, FILENAMES[file_format]) for _ in range(documents)))
+        return time.perf_counter() - start
+    finally:
+        parser.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--paragraphs", type=int, default=200, help="Paragraphes par document")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--formats", nargs="+", default=list(GENERATORS), choices=list(GENERATORS))
+    args = parser.parse_args()
+
+    results = []
+    for file_format in args.formats:
+        data = GENERATORS[file_format](args.paragraphs)
+        size_mb = len(data) * args.documents / 1_000_000
+        runs = [("sequential", 0, bench_sequential(data, file_format, args.documents))]
+        for workers in args.workers:
+            runs.append(("pool", workers, asyncio.run(bench_pool(data, file_format, args.documents, workers))))
+
+        for mode, workers, duration in runs:
+            result = {
+                "format": file_format,
+                "mode": mode,
+                "workers": workers,
+                "documents": args.documents,
+                "document_bytes": len(data),
+                "duration": round(duration, 3),
+                "docs_per_second": round(args.documents / duration, 1),
+                "mb_per_second": round(size_mb / duration, 2)
+            }
+            results.append(result)
+            print(
+                f"{file_format:>9} {mode:>10} ({workers} workers) : "
+                f"{result['docs_per_second']:>8} docs/s, {result['mb_per_second']:>7} Mo/s",
+                file=sys.stderr
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark de l'étape de diversification (regroupement des chunks
+consécutifs + MMR) sur des candidats synthétiques.
+
+Les candidats forment des groupes de chunks consécutifs quasi identiques,
+comme ceux produits par le chevauchement du découpage. L'implémentation
+NumPy est comparée à un MMR en Python pur (boucles sur les similarités).
+
+Usage :
+    python -m benchmarks.bench_rerank --candidates 50 100 200 500 --k 10 --repeat 200
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from src.db.rerank import rerank_results
+
+
+def make_candidates(count: int, dimension: int = 384, group_size: int = 3, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    results, embeddings = [], {}
+    for index in range(count):
+        group, position = divmod(index, group_size)
+        if position == 0:
+            base = rng.normal(size=dimension)
+        vector = base + 0.05 * rng.normal(size=dimension)
+        chunk_id = f"chunk_{index}"
+        embeddings[chunk_id] = (vector / np.linalg.norm(vector)).astype(np.float32)
+        results.append({
+            "id": chunk_id,
+            "content": "",
+            "metadata": {"doc_id": f"doc_{group % 7}", "chunk_index": group * group_size + position},
+            "rrf_score": 1 / (61 + index)
+        })
+    return results, embeddings
+
+
+def python_mmr(results, embeddings, k: int, lambda_mult: float = 0.5):
+    """MMR de référence, sans vectorisation"""
+    vectors = [embeddings[result["id"]].tolist() for result in results]
+    top = results[0]["rrf_score"]
+    relevance = [result["rrf_score"] / top for result in results]
+    selected = [0]
+    while len(selected) < min(k, len(results)):
+        best, best_score = None, float("-inf")
+        for index in range(len(results)):
+            if index in selected:
+                continue
+            max_similarity = max(sum(a * b for a, b in zip(vectors[index], vectors[other])) for other in selected)
+            score = lambda_mult * relevance[index] - (1 - lambda_mult) * max_similarity
+            if score > best_score:
+                best, best_score = index, score
+        selected.append(best)
+    return selected
+
+
+def timings(function, repeat: int):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return durations[len(durations) // 2], durations[min(len(durations) - 1, int(0.95 * len(durations)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--skip-python", action="store_true", help="Ne mesure pas le MMR en Python pur")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.candidates:
+        candidates, embeddings = make_candidates(count, args.dimension)
+        p50, p95 = timings(lambda: rerank_results(candidates, embeddings, args.k), args.repeat)
+        result = {
+            "candidates": count,
+            "k": args.k,
+            "numpy_p50_ms": round(p50 * 1000, 3),
+            "numpy_p95_ms": round(p95 * 1000, 3)
+        }
+        if not args.skip_python:
+            python_p50, _ = timings(lambda: python_mmr(candidates, embeddings, args.k), max(1, args.repeat // 50))
+            result["python_p50_ms"] = round(python_p50 * 1000, 1)
+        results.append(result)
+        print(
+            f"{count:>5} candidats : NumPy p50 {result['numpy_p50_ms']} ms, p95 {result['numpy_p95_ms']} ms"
+            + (f", Python pur {result['python_p50_ms']} ms" if "python_p50_ms" in result else ""),
+            file=sys.stderr
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
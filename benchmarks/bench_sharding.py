@@ -0,0 +1,202 @@
+"""
+Benchmark du partitionnement : collection unique face aux collections
+partitionnées par métadonnée (category) ou par hash.
+
+Un corpus synthétique d'embeddings normalisés, regroupés autour d'un centre
+par catégorie, est indexé dans une base ChromaDB temporaire par disposition.
+Pour chacune, le benchmark reporte :
+- le temps de construction de l'index (ajout par lots, chunks/s) ;
+- la latence (p50, p95, p99) des requêtes sans filtre (fan-out sur tous les
+  shards et fusion top-k) et filtrées par catégorie (un seul shard en mode key) ;
+- le recall@k face à la recherche exacte (produit scalaire sur tout le corpus).
+
+En mode embarqué, les requêtes d'un fan-out se partagent le GIL ; avec --http
+(serveur `chroma run` temporaire, comme en production multi-workers), elles
+sont réellement concurrentes.
+
+Usage :
+    python -m benchmarks.bench_sharding --chunks 20000 --categories 8 --shard-counts 2 4 8
+    python -m benchmarks.bench_sharding --http --chunks 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.bench_e2e import git_commit, latency_summary
+from benchmarks.bench_workers import free_port, start_chroma
+
+
+def make_corpus(chunks: int, categories: int, dim: int, documents: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(categories, dim))
+    # Une catégorie par document ; les chunks d'un document sont écrits ensemble, comme à l'ingestion
+    doc_ids = np.sort(rng.integers(0, documents, size=chunks))
+    labels = rng.integers(0, categories, size=documents)[doc_ids]
+    embeddings = centers[labels] + rng.normal(scale=1.5, size=(chunks, dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = [f"bench{doc_id}_chunk_{index:016x}" for index, doc_id in enumerate(doc_ids)]
+    metadatas = [
+        {"doc_id": f"bench{doc_id}", "category": f"categorie-{label}"}
+        for doc_id, label in zip(doc_ids, labels)
+    ]
+    return ids, embeddings.astype(np.float32), metadatas, labels, centers
+
+
+def make_queries(centers: np.ndarray, queries: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, len(centers), size=queries)
+    vectors = centers[labels] + rng.normal(scale=1.5, size=(queries, centers.shape[1]))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32), labels
+
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int, mask: np.ndarray = None) -> List[np.ndarray]:
+    scores = queries @ embeddings.T
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    return [np.argsort(-row)[:k] for row in scores]
+
+
+def bench_layout(name: str, collection, args, corpus, queries) -> Dict:
+    ids, embeddings, metadatas, labels, _ = corpus
+    query_vectors, query_labels = queries
+
+    start = time.perf_counter()
+    for offset in range(0, len(ids), args.batch_size):
+        collection.add(
+            ids=ids[offset:offset + args.batch_size],
+            embeddings=embeddings[offset:offset + args.batch_size].tolist(),
+            metadatas=metadatas[offset:offset + args.batch_size]
+        )
+    build_time = time.perf_counter() - start
+
+    position = {chunk_id: index for index, chunk_id in enumerate(ids)}
+    result = {
+        "layout": name,
+        "shards": len(collection.shards()) if hasattr(collection, "shards") else 1,
+        "build_seconds": round(build_time, 3),
+        "build_chunks_per_second": round(len(ids) / build_time, 1)
+    }
+
+    for mode in ("unfiltered", "filtered"):
+        if mode == "unfiltered":
+            expected = exact_top_k(embeddings, query_vectors, args.k)
+        else:
+            expected = [
+                exact_top_k(embeddings, vector[None, :], args.k, labels == label)[0]
+                for vector, label in zip(query_vectors, query_labels)
+            ]
+        durations, recalls = [], []
+        # Préchauffage (chargement des index HNSW)
+        collection.query(query_embeddings=[query_vectors[0].tolist()], n_results=args.k, include=[])
+        for vector, label, truth in zip(query_vectors, query_labels, expected):
+            where = {"category": f"categorie-{label}"} if mode == "filtered" else None
+            start = time.perf_counter()
+            response = collection.query(
+                query_embeddings=[vector.tolist()], n_results=args.k, where=where, include=["distances"]
+            )
+            durations.append(time.perf_counter() - start)
+            found = {position[chunk_id] for chunk_id in response["ids"][0]}
+            recalls.append(len(found & set(truth.tolist())) / args.k)
+        result[mode] = {**latency_summary(durations), f"recall@{args.k}": round(float(np.mean(recalls)), 3)}
+
+    print(
+        f"{name}: construction {result['build_seconds']}s, "
+        f"p50 {result['unfiltered']['p50_ms']} ms (filtrée {result['filtered']['p50_ms']} ms), "
+        f"recall {result['unfiltered'][f'recall@{args.k}']}",
+        file=sys.stderr
+    )
+    return result
+
+
+def run(args, tmp_dir: str, http_port: Optional[int] = None) -> List[Dict]:
+    import chromadb
+    from src.db.sharding import COLLECTION_METADATA, ShardRouter, ShardedCollection
+
+    corpus = make_corpus(args.chunks, args.categories, args.dim, args.documents)
+    queries = make_queries(corpus[4], args.queries)
+    layouts = [("single", None), ("key:category", "key")] + [
+        (f"hash:{count}", count) for count in args.shard_counts
+    ]
+
+    results = []
+    for index, (name, layout) in enumerate(layouts):
+        if http_port is None:
+            client = chromadb.PersistentClient(path=os.path.join(tmp_dir, f"layout{index}"))
+        else:
+            client = chromadb.HttpClient(host="127.0.0.1", port=http_port)
+        # Nom de base propre à chaque disposition : un même serveur les héberge toutes
+        base = f"bench{index}"
+        if layout is None:
+            collection = client.create_collection(base, metadata=COLLECTION_METADATA)
+        elif layout == "key":
+            collection = ShardedCollection(
+                client, ShardRouter("key", "category", base=base), fanout_threads=args.fanout_threads
+            )
+        else:
+            collection = ShardedCollection(
+                client, ShardRouter("hash", count=layout, base=base), fanout_threads=args.fanout_threads
+            )
+        results.append(bench_layout(name, collection, args, corpus, queries))
+        for stored in client.list_collections():
+            if stored.name == base or stored.name.startswith(f"{base}_"):
+                client.delete_collection(stored.name)
+
+    base = results[0]
+    for result in results:
+        result["build_speedup"] = round(base["build_seconds"] / result["build_seconds"], 2)
+        for mode in ("unfiltered", "filtered"):
+            result[mode]["p50_speedup"] = round(base[mode]["p50_ms"] / result[mode]["p50_ms"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--shard-counts", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--fanout-threads", type=int, default=8)
+    parser.add_argument("--http", action="store_true", help="Interroge un serveur `chroma run` temporaire")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    chroma: Optional[subprocess.Popen] = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            port = None
+            if args.http:
+                port = free_port()
+                chroma = start_chroma(os.path.join(tmp_dir, "server"), port)
+            results = run(args, tmp_dir, port)
+        finally:
+            if chroma is not None:
+                chroma.terminate()
+                chroma.wait(timeout=30)
+
+    report = {
+        "commit": git_commit(),
+        "cpus": os.cpu_count(),
+        "parameters": vars(args),
+        "results": results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark des instantanés : export et import de la collection, face à la
+reconstruction par réingestion (embeddings recalculés).
+
+Un corpus synthétique (paragraphes de bench_e2e, un chunk par paragraphe) est
+ingéré dans une base temporaire, puis, pour chaque stockage d'objets (local,
+faux serveur S3 de benchmarks.fake_s3), le benchmark reporte :
+- la durée et le débit (chunks/s, Mo/s) de l'export ;
+- la durée de l'import dans une base vide (téléchargement compris) ;
+- la taille de l'instantané (embeddings et enregistrements) ;
+- le gain de l'import face à la réingestion du même corpus.
+
+Usage :
+    python -m benchmarks.bench_snapshot --documents 200 --embedding-backend onnx
+    python -m benchmarks.bench_snapshot --s3-latency 0.01 --s3-bandwidth 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.bench_e2e import git_commit, make_corpus
+from benchmarks.fake_s3 import FakeS3Server
+
+
+def use_data_dir(path: str):
+    """Base, index lexical et compteur de génération propres à une instance"""
+    os.environ["DATA_DIR"] = path
+    os.environ["CHROMA_PATH"] = os.path.join(path, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(path, "bm25")
+    os.environ["SEARCH_GENERATION_PATH"] = os.path.join(path, "collection.generation")
+
+
+def bench_store(label: str, store, source, tmp_dir: str, args, ingest_seconds: float) -> Dict:
+    from src.db.chroma import ChromaDBManager
+    from src.db.snapshot import export_snapshot, import_snapshot
+
+    manifest = export_snapshot(source.collection, store, label, source.embedder.name, args.page_size, tmp_dir)
+    snapshot_bytes = sum(item["bytes"] for item in manifest["files"].values())
+
+    use_data_dir(os.path.join(tmp_dir, f"restore_{label}"))
+    target = ChromaDBManager(embedder=source.embedder)
+    start = time.perf_counter()
+    imported = import_snapshot(target, store, label, args.page_size, tmp_dir=tmp_dir)
+    import_seconds = time.perf_counter() - start
+    if target.collection.count() != manifest["count"]:
+        raise AssertionError(f"{label} : {target.collection.count()} chunks restaurés, {manifest['count']} attendus")
+
+    result = {
+        "store": label,
+        "chunks": manifest["count"],
+        "snapshot_mb": round(snapshot_bytes / 1024 / 1024, 2),
+        "embeddings_mb": round(manifest["files"]["embeddings.npy"]["bytes"] / 1024 / 1024, 2),
+        "export_seconds": manifest["export_time"],
+        "export_mb_per_second": round(snapshot_bytes / 1024 / 1024 / manifest["export_time"], 1),
+        "import_seconds": round(import_seconds, 3),
+        "download_seconds": imported["download_time"],
+        "import_chunks_per_second": round(manifest["count"] / import_seconds, 1),
+        "speedup_vs_reingest": round(ingest_seconds / import_seconds, 2)
+    }
+    print(
+        f"{label}: export {result['export_seconds']}s, import {result['import_seconds']}s "
+        f"({result['import_chunks_per_second']} chunks/s, x{result['speedup_vs_reingest']} face à la réingestion)",
+        file=sys.stderr
+    )
+    return result
+
+
+def run(args, tmp_dir: str) -> Dict:
+    from src.db.chroma import ChromaDBManager
+    from src.db.object_store import LocalObjectStore, S3ObjectStore
+
+    corpus = make_corpus(args.documents, args.doc_chars)
+    ids, contents, metadatas = [], [], []
+    for document in corpus:
+        for index, paragraph in enumerate(document["content"].split("\n\n")):
+            ids.append(f"{document['doc_id']}_chunk_{index:04d}")
+            contents.append(paragraph)
+            metadatas.append({**document["metadata"], "doc_id": document["doc_id"], "chunk_index": index})
+
+    use_data_dir(os.path.join(tmp_dir, "source"))
+    source = ChromaDBManager()
+    start = time.perf_counter()
+    asyncio.run(source.add_documents(ids=ids, contents=contents, metadatas=metadatas))
+    ingest_seconds = time.perf_counter() - start
+    print(f"Réingestion : {len(ids)} chunks en {ingest_seconds:.1f}s ({source.embedder.name})", file=sys.stderr)
+
+    results = [bench_store("local", LocalObjectStore(os.path.join(tmp_dir, "snapshots")), source, tmp_dir, args, ingest_seconds)]
+    server = FakeS3Server(latency=args.s3_latency, bandwidth=args.s3_bandwidth * 1024 * 1024).start()
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    try:
+        store = S3ObjectStore(
+            "snapshots", endpoint_url=server.url, part_size=args.part_size * 1024 * 1024, max_concurrency=args.max_concurrency
+        )
+        results.append(bench_store("s3", store, source, tmp_dir, args, ingest_seconds))
+    finally:
+        server.stop()
+    return {
+        "embedding_backend": source.embedder.name,
+        "chunks": len(ids),
+        "reingest_seconds": round(ingest_seconds, 3),
+        "reingest_chunks_per_second": round(len(ids) / ingest_seconds, 1),
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--doc-chars", type=int, default=20000)
+    parser.add_argument("--embedding-backend", default=os.getenv("EMBEDDING_BACKEND", "onnx"),
+                        choices=["onnx", "sentence-transformers", "hashing"])
+    parser.add_argument("--page-size", type=int, default=1024, help="Chunks lus ou écrits par lot")
+    parser.add_argument("--part-size", type=int, default=8, help="Taille des parties S3 (Mo)")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Parties S3 transférées en parallèle")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="Délai par requête du faux S3 (s)")
+    parser.add_argument("--s3-bandwidth", type=float, default=0.0, help="Débit par requête du faux S3 (Mo/s, 0 = illimité)")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_BACKEND"] = args.embedding_backend
+    os.environ["LEXICAL_INDEX_ENABLED"] = "true"
+    # Bases temporaires : les données de l'API ne sont pas touchées
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = {"commit": git_commit(), "parameters": vars(args), **run(args, tmp_dir)}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
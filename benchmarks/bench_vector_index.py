@@ -0,0 +1,194 @@
+"""
+Benchmark de l'index vectoriel : index HNSW de ChromaDB face à l'index exact
+int8 en mémoire mappée (src/db/vector_index.py), à plusieurs tailles de corpus.
+
+Le corpus synthétique d'embeddings normalisés regroupés par catégorie est
+celui de bench_sharding. Pour chaque taille et chaque index, la construction
+puis les requêtes tournent chacune dans un processus neuf, et le benchmark
+reporte :
+- le temps de construction et la taille de l'index sur disque ;
+- la mémoire résidente ajoutée par l'ouverture de l'index et les requêtes ;
+- la latence (p50, p95, p99) d'une requête seule ;
+- le débit de requêtes par lots (--batch requêtes par appel) ;
+- le recall@k face à la recherche exacte en float32.
+
+Usage :
+    python -m benchmarks.bench_vector_index --sizes 10000 50000 200000 --dim 384
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.bench_e2e import git_commit, latency_summary
+from benchmarks.bench_sharding import exact_top_k, make_corpus, make_queries
+
+BACKENDS = ("hnsw", "int8")
+COLLECTION = "bench_vectors"
+
+
+def rss_mb() -> float:
+    """Mémoire résidente courante du processus (Linux)"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, filename))
+        for directory, _, files in os.walk(path)
+        for filename in files
+    )
+
+
+def build(backend: str, work_dir: str, batch_size: int, search_ef: int = 0) -> Dict:
+    embeddings = np.load(os.path.join(work_dir, "embeddings.npy"))
+    ids = [f"chunk_{index}" for index in range(len(embeddings))]
+    index_dir = os.path.join(work_dir, backend)
+    start = time.perf_counter()
+    if backend == "hnsw":
+        import chromadb
+        from src.db.sharding import COLLECTION_METADATA
+
+        metadata = {**COLLECTION_METADATA, **({"hnsw:search_ef": search_ef} if search_ef else {})}
+        collection = chromadb.PersistentClient(path=index_dir).create_collection(COLLECTION, metadata=metadata)
+        for offset in range(0, len(ids), batch_size):
+            collection.add(ids=ids[offset:offset + batch_size], embeddings=embeddings[offset:offset + batch_size].tolist())
+    else:
+        from src.db.vector_index import Int8VectorIndex
+
+        index = Int8VectorIndex(index_dir, embeddings.shape[1])
+        for offset in range(0, len(ids), batch_size):
+            index.add(ids[offset:offset + batch_size], embeddings[offset:offset + batch_size])
+    build_seconds = time.perf_counter() - start
+    return {"build_seconds": round(build_seconds, 3), "index_mb": round(directory_bytes(index_dir) / 1024 / 1024, 2)}
+
+
+def query(backend: str, work_dir: str, k: int, batch: int) -> Dict:
+    queries = np.load(os.path.join(work_dir, "queries.npy"))
+    index_dir = os.path.join(work_dir, backend)
+    rss_before = rss_mb()
+    if backend == "hnsw":
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=index_dir).get_collection(COLLECTION)
+
+        def search(vectors: np.ndarray) -> List[List[str]]:
+            return collection.query(query_embeddings=vectors.tolist(), n_results=k, include=[])["ids"]
+    else:
+        from src.db.vector_index import Int8VectorIndex
+
+        index = Int8VectorIndex(index_dir, queries.shape[1])
+
+        def search(vectors: np.ndarray) -> List[List[str]]:
+            return [[chunk_id for chunk_id, _ in hits] for hits in index.search(vectors, k)]
+
+    # Préchauffage (chargement de l'index HNSW, pages des codes int8)
+    search(queries[:1])
+    durations, found = [], []
+    for vector in queries:
+        start = time.perf_counter()
+        found.extend(search(vector[None, :]))
+        durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        search(queries[offset:offset + batch])
+    batch_seconds = time.perf_counter() - start
+    return {
+        "rss_mb": round(rss_mb() - rss_before, 1),
+        "single": latency_summary(durations),
+        "batch_queries_per_second": round(len(queries) / batch_seconds, 1),
+        "found": found
+    }
+
+
+def run_phase(phase: str, backend: str, work_dir: str, args) -> Dict:
+    """Une phase dans un processus neuf : la mémoire mesurée est celle de l'index seul"""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_vector_index", "--phase", phase, "--backend", backend,
+         "--work-dir", work_dir, "--k", str(args.k), "--batch", str(args.batch), "--batch-size", str(args.batch_size),
+         "--hnsw-search-ef", str(args.hnsw_search_ef)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_size(size: int, args, tmp_dir: str) -> List[Dict]:
+    work_dir = os.path.join(tmp_dir, f"size{size}")
+    os.makedirs(work_dir)
+    _, embeddings, _, _, centers = make_corpus(size, args.categories, args.dim, max(1, size // 40))
+    queries, _ = make_queries(centers, args.queries)
+    np.save(os.path.join(work_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(work_dir, "queries.npy"), queries)
+    expected = [{f"chunk_{index}" for index in row} for row in exact_top_k(embeddings, queries, args.k)]
+    del embeddings
+
+    results = []
+    for backend in BACKENDS:
+        result = {"size": size, "backend": backend, **run_phase("build", backend, work_dir, args)}
+        measured = run_phase("query", backend, work_dir, args)
+        found = measured.pop("found")
+        result.update(measured)
+        result[f"recall@{args.k}"] = round(float(np.mean([
+            len(truth & set(ids)) / args.k for truth, ids in zip(expected, found)
+        ])), 4)
+        print(
+            f"{size} chunks, {backend}: construction {result['build_seconds']}s, {result['index_mb']} Mo sur disque, "
+            f"+{result['rss_mb']} Mo RSS, p50 {result['single']['p50_ms']} ms, "
+            f"{result['batch_queries_per_second']} requêtes/s par lots, recall {result[f'recall@{args.k}']}",
+            file=sys.stderr
+        )
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=64, help="Requêtes par appel en mode lots")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Chunks ajoutés par écriture")
+    parser.add_argument("--hnsw-search-ef", type=int, default=0,
+                        help="hnsw:search_ef de la collection (0 = valeur par défaut de ChromaDB, 10, comme l'application)")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    # Phases exécutées dans un sous-processus
+    parser.add_argument("--phase", choices=["build", "query"], help=argparse.SUPPRESS)
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase == "build":
+        print(json.dumps(build(args.backend, args.work_dir, args.batch_size, args.hnsw_search_ef)))
+        return
+    if args.phase == "query":
+        print(json.dumps(query(args.backend, args.work_dir, args.k, args.batch)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = [result for size in args.sizes for result in bench_size(size, args, tmp_dir)]
+    report = {
+        "commit": git_commit(),
+        "cpus": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("phase", "backend", "work_dir")},
+        "results": results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark de l'historique des versions (deltas compressés et keyframes).
+
+Un document synthétique subit des centaines de révisions (lignes modifiées,
+insérées ou supprimées à chaque révision). Pour chaque intervalle de
+keyframes, le benchmark reporte :
+- la croissance du stockage, face à des copies complètes brutes et compressées ;
+- la latence d'enregistrement d'une version ;
+- la latence de reconstruction de la dernière version et de versions
+  historiques tirées au hasard (p50, p95, p99), cache désactivé ;
+- les chunks à réembedder par révision (empreintes de chunks nouvelles), face
+  au nombre total de chunks du document.
+
+Usage :
+    python -m benchmarks.bench_versions --revisions 500 --lines 2000 --keyframe-intervals 10 25 100
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, List
+
+from benchmarks.bench_e2e import git_commit, latency_summary
+
+WORDS = (
+    "contrat prestataire maintenance facture délai pénalité service client livraison "
+    "garantie résiliation avenant tarif révision indice disponibilité incident support"
+).split()
+
+
+def make_revisions(lines: int, revisions: int, edits: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+
+    def line() -> str:
+        return " ".join(rng.choices(WORDS, k=12)) + "\n"
+
+    document = [line() for _ in range(lines)]
+    contents = ["".join(document)]
+    for _ in range(revisions - 1):
+        for _ in range(edits):
+            action = rng.random()
+            position = rng.randrange(len(document))
+            if action < 0.6:
+                document[position] = line()
+            elif action < 0.8:
+                document.insert(position, line())
+            elif len(document) > 1:
+                del document[position]
+        contents.append("".join(document))
+    return contents
+
+
+def chunk_churn(contents: List[str]) -> Dict:
+    """Chunks nouveaux (à embedder) par révision, avec le découpage de l'ingestion"""
+    from src.ingestion.chunking import build_text_splitter, iter_chunks
+
+    splitter = build_text_splitter(chunk_size=1000, chunk_overlap=200)
+    previous = None
+    embedded, totals = [], []
+    for content in contents:
+        hashes = {hashlib.sha256(chunk.encode("utf-8")).hexdigest() for chunk in iter_chunks(splitter, content)}
+        if previous is not None:
+            embedded.append(len(hashes - previous))
+            totals.append(len(hashes))
+        previous = hashes
+    return {
+        "chunks_per_document": round(sum(totals) / len(totals), 1) if totals else 0,
+        "embedded_chunks_per_revision": round(sum(embedded) / len(embedded), 2) if embedded else 0
+    }
+
+
+def bench_interval(interval: int, contents: List[str], args, tmp_dir: str) -> Dict:
+    from src.db.versions import VersionStore
+
+    store = VersionStore(os.path.join(tmp_dir, f"versions_{interval}.sqlite3"), keyframe_interval=interval, cache_entries=1)
+    append_durations = []
+    growth = []
+    for index, content in enumerate(contents, 1):
+        start = time.perf_counter()
+        store.append("bench", content, {"revision": index})
+        append_durations.append(time.perf_counter() - start)
+        if index % max(1, len(contents) // 10) == 0 or index == len(contents):
+            growth.append({"versions": index, "stored_bytes": store.stats()["stored_bytes"]})
+
+    latest_durations = []
+    for _ in range(args.reads):
+        start = time.perf_counter()
+        store.latest("bench")
+        latest_durations.append(time.perf_counter() - start)
+
+    rng = random.Random(7)
+    historical_durations = []
+    for _ in range(args.reads):
+        version = rng.randint(1, len(contents) - 1)
+        store.cache.clear()
+        start = time.perf_counter()
+        record = store.get("bench", version)
+        historical_durations.append(time.perf_counter() - start)
+        if record["content"] != contents[version - 1]:
+            raise AssertionError(f"Version {version} mal reconstruite")
+
+    stats = store.stats()
+    result = {
+        "keyframe_interval": interval,
+        "versions": stats["versions"],
+        "keyframes": stats["keyframes"],
+        "stored_bytes": stats["stored_bytes"],
+        "compression_ratio": stats["compression_ratio"],
+        "growth": growth,
+        "append": latency_summary(append_durations),
+        "read_latest": latency_summary(latest_durations),
+        "read_historical": latency_summary(historical_durations)
+    }
+    print(
+        f"keyframes /{interval}: {stats['stored_bytes'] / 1024:.0f} Ko (x{stats['compression_ratio']}), "
+        f"dernière version p50 {result['read_latest']['p50_ms']} ms, "
+        f"historique p50 {result['read_historical']['p50_ms']} ms / p95 {result['read_historical']['p95_ms']} ms",
+        file=sys.stderr
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=2000, help="Lignes du document initial")
+    parser.add_argument("--edits", type=int, default=5, help="Lignes modifiées, insérées ou supprimées par révision")
+    parser.add_argument("--keyframe-intervals", type=int, nargs="+", default=[10, 25, 100])
+    parser.add_argument("--reads", type=int, default=200, help="Lectures mesurées par type")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    contents = make_revisions(args.lines, args.revisions, args.edits)
+    raw_bytes = sum(len(content.encode("utf-8")) for content in contents)
+    compressed_bytes = sum(len(zlib.compress(content.encode("utf-8"))) for content in contents)
+    print(
+        f"{len(contents)} révisions : copies complètes {raw_bytes / 1024:.0f} Ko, "
+        f"compressées {compressed_bytes / 1024:.0f} Ko",
+        file=sys.stderr
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = [bench_interval(interval, contents, args, tmp_dir) for interval in args.keyframe_intervals]
+
+    report = {
+        "commit": git_commit(),
+        "parameters": vars(args),
+        "full_copies_bytes": raw_bytes,
+        "compressed_copies_bytes": compressed_bytes,
+        "chunks": chunk_churn(contents),
+        "results": results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
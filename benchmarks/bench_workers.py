@@ -0,0 +1,246 @@
+"""
+Montée en charge de l'API avec le nombre de workers uvicorn (CHROMA_MODE=http).
+
+Un serveur ChromaDB (`chroma run`, ou --chroma-host/--chroma-port pour un
+serveur existant) et un faux serveur Ollama sont partagés par toutes les
+exécutions. Pour chaque nombre de workers, l'API est démarrée avec
+`uvicorn --workers N` puis :
+- un lot de documents est ingéré via /add_documents/ (docs/s jusqu'à la fin du lot) ;
+- des recherches sont envoyées en continu par --concurrency clients pendant
+  --duration secondes (requêtes/s, latences p50/p95/p99).
+
+Le cache des résultats de recherche est désactivé : chaque requête calcule
+son embedding et interroge ChromaDB. Le gain attendu suit le nombre de
+cœurs disponibles (l'embedding et la sérialisation sont liés au CPU).
+
+Sous requêtes concurrentes, le serveur ChromaDB 0.4.x renvoie parfois une
+erreur 500 KeyError('...CollectionQueryEvent') : course dans le regroupement
+de ses événements de télémétrie, indépendante de l'API. Ces erreurs sont
+comptées dans "errors" avec quelques exemples.
+
+Usage :
+    python -m benchmarks.bench_workers --workers 1 2 4 --documents 100 --duration 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_e2e import git_commit, latency_summary, make_corpus, make_queries
+from benchmarks.fake_ollama import FakeOllamaServer
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float, consecutive: int = 1):
+    """Attend que `url` réponde 200 `consecutive` fois de suite (une fois par worker)"""
+    deadline = time.monotonic() + timeout
+    successes = 0
+    while time.monotonic() < deadline:
+        try:
+            successes = successes + 1 if httpx.get(url, timeout=2).status_code == 200 else 0
+        except httpx.HTTPError:
+            successes = 0
+        if successes >= consecutive:
+            return
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} ne répond pas après {timeout}s")
+
+
+def start_chroma(path: str, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        # CLI installée avec chromadb, à côté de l'interpréteur dans un virtualenv
+        [shutil.which("chroma") or os.path.join(os.path.dirname(sys.executable), "chroma"),
+         "run", "--path", path, "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    wait_for(f"http://127.0.0.1:{port}/api/v1/heartbeat", timeout=60)
+    return process
+
+
+def start_api(workers: int, port: int, env: Dict) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+    wait_for(f"http://127.0.0.1:{port}/readyz", timeout=120, consecutive=workers * 3)
+    return process
+
+
+async def ingest(base_url: str, documents: List[Dict]) -> Dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        start = time.perf_counter()
+        response = await client.post("/add_documents/", json={"documents": documents})
+        response.raise_for_status()
+        batch_id = response.json()["batch_id"]
+        while True:
+            status = (await client.get(f"/batches/{batch_id}")).json()
+            if status["progress"] >= 1:
+                break
+            await asyncio.sleep(0.1)
+        duration = time.perf_counter() - start
+    return {
+        "documents": len(documents),
+        "failed": status["failed"],
+        "duration": round(duration, 3),
+        "docs_per_second": round(len(documents) / duration, 2)
+    }
+
+
+async def search_load(base_url: str, queries: List[str], concurrency: int, duration: float) -> Dict:
+    durations = []
+    errors = 0
+    error_samples = []
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def user(seed: int):
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/search_documents/",
+                        json={"query": rng.choice(queries), "n_results": 5, "min_relevance_score": 0}
+                    )
+                    response.raise_for_status()
+                    durations.append(time.perf_counter() - start)
+                except httpx.HTTPError as e:
+                    errors += 1
+                    if len(error_samples) < 5:
+                        error_samples.append(
+                            e.response.text[:200] if isinstance(e, httpx.HTTPStatusError) else repr(e)
+                        )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(seed) for seed in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "error_samples": error_samples,
+        "requests_per_second": round(len(durations) / elapsed, 1),
+        **(latency_summary(durations) if durations else {})
+    }
+
+
+def run(args, chroma_host: str, chroma_port: int, data_dir: str, ollama_url: str) -> List[Dict]:
+    corpus = make_corpus(args.documents * (len(args.workers) + 1), args.doc_chars)
+    queries = make_queries(corpus, 500)
+    env = {
+        **os.environ,
+        "CHROMA_MODE": "http",
+        "CHROMADB_HOST": chroma_host,
+        "CHROMADB_PORT": str(chroma_port),
+        "OLLAMA_HOST": ollama_url,
+        "DATA_DIR": data_dir,
+        "EMBEDDING_BACKEND": args.embedding_backend,
+        "LLM_CACHE_ENABLED": "false",
+        "SEARCH_CACHE_ENABLED": "false",
+        "JOB_WORKERS": str(args.job_workers),
+        "PYTHONPATH": os.getcwd()
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+    results = []
+    for index, workers in enumerate(args.workers):
+        port = free_port()
+        api = start_api(workers, port, env)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            # Lot distinct à chaque exécution : la collection grossit, le premier lot sert de base commune
+            if index == 0:
+                asyncio.run(ingest(base_url, corpus[:args.documents]))
+            batch = corpus[(index + 1) * args.documents:(index + 2) * args.documents]
+            batch = [{**document, "doc_id": f"w{workers}_{document['doc_id']}"} for document in batch]
+            result = {
+                "workers": workers,
+                "ingest": asyncio.run(ingest(base_url, batch)),
+                "search": asyncio.run(search_load(base_url, queries, args.concurrency, args.duration))
+            }
+        finally:
+            api.terminate()
+            api.wait(timeout=30)
+        results.append(result)
+        print(
+            f"{workers} worker(s) : ingestion {result['ingest']['docs_per_second']} docs/s, "
+            f"recherche {result['search']['requests_per_second']} req/s "
+            f"(p50 {result['search'].get('p50_ms')} ms, p95 {result['search'].get('p95_ms')} ms)",
+            file=sys.stderr
+        )
+
+    base = results[0]
+    for result in results:
+        result["search_speedup"] = round(
+            result["search"]["requests_per_second"] / base["search"]["requests_per_second"], 2
+        ) if base["search"]["requests_per_second"] else None
+        result["ingest_speedup"] = round(
+            result["ingest"]["docs_per_second"] / base["ingest"]["docs_per_second"], 2
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--documents", type=int, default=100, help="Documents ingérés par exécution")
+    parser.add_argument("--doc-chars", type=int, default=4000)
+    parser.add_argument("--job-workers", type=int, default=2, help="Workers d'ingestion par processus")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients de recherche simultanés")
+    parser.add_argument("--duration", type=float, default=15.0, help="Durée de la charge de recherche (s)")
+    parser.add_argument("--ollama-latency", type=float, default=0.05)
+    parser.add_argument("--embedding-backend", default="hashing", choices=["onnx", "sentence-transformers", "hashing"])
+    parser.add_argument("--chroma-host", help="Serveur ChromaDB existant (sinon `chroma run` dans un répertoire temporaire)")
+    parser.add_argument("--chroma-port", type=int, default=8000)
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(latency=args.ollama_latency).start()
+    chroma: Optional[subprocess.Popen] = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            chroma_host, chroma_port = args.chroma_host, args.chroma_port
+            if chroma_host is None:
+                chroma_host, chroma_port = "127.0.0.1", free_port()
+                chroma = start_chroma(os.path.join(tmp_dir, "chroma"), chroma_port)
+            results = run(args, chroma_host, chroma_port, os.path.join(tmp_dir, "data"), server.url)
+        finally:
+            if chroma is not None:
+                chroma.terminate()
+                chroma.wait(timeout=30)
+            server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "cpus": os.cpu_count(),
+        "parameters": vars(args),
+        "results": results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
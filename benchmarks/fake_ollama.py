@@ -0,0 +1,147 @@
+"""
+Serveur HTTP local imitant l'API Ollama (/api/generate, /api/tags).
+
+Il permet de tester et mesurer le client LLM sans modèle : la latence avant
+le premier token et le débit de tokens sont configurables.
+
+Usage :
+    python -m benchmarks.fake_ollama --port 11434 --latency 0.2 --tokens-per-second 50
+    OLLAMA_HOST=http://localhost:11434 python -m uvicorn src.main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = (
+    "1. Points principaux : le document décrit le périmètre du projet. "
+    "2. Objectifs : réduire les délais de traitement. "
+    "3. Recommandations : automatiser le suivi. "
+    "4. Points d'attention : dépendances externes."
+)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload: dict):
+        data = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": f"{self.server.model}:latest"}]})
+        else:
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.prompt_chars += len(request.get("prompt", ""))
+
+        tokens = [token + " " for token in server.response.split(" ")]
+        num_predict = request.get("options", {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+        delay = 1 / server.tokens_per_second if server.tokens_per_second > 0 else 0
+        model = request.get("model", server.model)
+        # Compteurs du dernier message, comme Ollama (un token approximé par mot)
+        counts = {"prompt_eval_count": len(request.get("prompt", "").split()), "eval_count": len(tokens)}
+
+        time.sleep(server.latency)
+
+        if not request.get("stream", True):
+            time.sleep(delay * len(tokens))
+            self._send_json({"model": model, "response": "".join(tokens), "done": True, **counts})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            self._write_chunk({"model": model, "response": token, "done": False})
+            time.sleep(delay)
+        self._write_chunk({"model": model, "response": "", "done": True, **counts})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        response: str = DEFAULT_RESPONSE,
+        model: str = "mistral"
+    ):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response = response
+        self.model = model
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_chars = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """Démarre le serveur dans un thread d'arrière-plan"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="Délai avant le premier token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Débit de tokens (0 = illimité)")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.latency, args.tokens_per_second)
+    print(f"Faux serveur Ollama sur {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
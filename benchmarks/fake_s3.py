@@ -0,0 +1,266 @@
+"""
+Serveur HTTP local imitant le sous-ensemble de l'API S3 utilisé par les
+instantanés (buckets, objets, lectures par plage, ListObjectsV2, envois en
+plusieurs parties), objets gardés en mémoire.
+
+Il permet de tester et mesurer S3ObjectStore sans MinIO ; les signatures ne
+sont pas vérifiées. Une latence par requête et un débit maximal sont
+configurables pour approcher un stockage distant.
+
+Usage :
+    python -m benchmarks.fake_s3 --port 9000 --latency 0.005
+    S3_ENDPOINT_URL=http://localhost:9000 python -m src.db.snapshot export --url s3://snapshots
+"""
+import argparse
+import hashlib
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def decode_aws_chunked(body: bytes) -> bytes:
+    """Corps « aws-chunked » : taille hexadécimale[;signature]\\r\\n données\\r\\n ... 0\\r\\n [trailers]"""
+    data = bytearray()
+    position = 0
+    while True:
+        end = body.index(b"\r\n", position)
+        size = int(body[position:end].split(b";")[0], 16)
+        position = end + 2
+        if size == 0:
+            return bytes(data)
+        data += body[position:position + size]
+        position += size + 2
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _target(self) -> Tuple[str, str, Dict]:
+        parsed = urlparse(self.path)
+        bucket, _, key = unquote(parsed.path).lstrip("/").partition("/")
+        return bucket, key, {name: values[0] for name, values in parse_qs(parsed.query, keep_blank_values=True).items()}
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b""):
+                        pass
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+            body = bytes(body)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        encoding = self.headers.get("Content-Encoding", "")
+        if "aws-chunked" in encoding or self.headers.get("x-amz-content-sha256", "").startswith("STREAMING"):
+            body = decode_aws_chunked(body)
+        self.server.throttle(len(body))
+        return body
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[Dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_xml(self, xml: str, status: int = 200):
+        self._send(status, ('<?xml version="1.0" encoding="UTF-8"?>' + xml).encode(), {"Content-Type": "application/xml"})
+
+    def _error(self, status: int, code: str):
+        self._send_xml(f"<Error><Code>{code}</Code><Message>{code}</Message></Error>", status)
+
+    def _bucket(self, bucket: str) -> Optional[Dict]:
+        objects = self.server.buckets.get(bucket)
+        if objects is None:
+            self._error(404, "NoSuchBucket")
+        return objects
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        bucket, key, query = self._target()
+        objects = self._bucket(bucket)
+        if objects is None:
+            return
+        if not key:
+            if self.command == "HEAD":
+                self._send(200)
+            else:
+                self._list(objects, query)
+            return
+        item = objects.get(key)
+        if item is None:
+            self._error(404, "NoSuchKey")
+            return
+        data, etag, modified = item
+        headers = {"ETag": etag, "Last-Modified": formatdate(modified, usegmt=True), "Accept-Ranges": "bytes"}
+        range_header = self.headers.get("Range")
+        if range_header and self.command == "GET":
+            first, _, last = range_header.split("=", 1)[1].partition("-")
+            first, last = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+            headers["Content-Range"] = f"bytes {first}-{last}/{len(data)}"
+            self.server.throttle(last - first + 1)
+            self._send(206, data[first:last + 1], headers)
+            return
+        if self.command == "GET":
+            self.server.throttle(len(data))
+        self._send(200, data, headers)
+
+    def _list(self, objects: Dict, query: Dict):
+        prefix = query.get("prefix", "")
+        max_keys = int(query.get("max-keys", 1000))
+        start_after = query.get("continuation-token") or query.get("start-after", "")
+        keys = sorted(key for key in objects if key.startswith(prefix) and key > start_after)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{len(objects[key][0])}</Size>"
+            f"<ETag>{objects[key][1]}</ETag><StorageClass>STANDARD</StorageClass></Contents>"
+            for key in page
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        self._send_xml(
+            f'<ListBucketResult xmlns="{S3_NAMESPACE}"><Name>{escape(self._target()[0])}</Name>'
+            f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{str(truncated).lower()}</IsTruncated>{token}{contents}</ListBucketResult>"
+        )
+
+    def do_PUT(self):
+        time.sleep(self.server.latency)
+        bucket, key, query = self._target()
+        body = self._read_body()
+        server = self.server
+        if not key:
+            with server.lock:
+                server.buckets.setdefault(bucket, {})
+            self._send(200, headers={"Location": f"/{bucket}"})
+            return
+        if self._bucket(bucket) is None:
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if "uploadId" in query:
+            upload = server.uploads.get(query["uploadId"])
+            if upload is None:
+                self._error(404, "NoSuchUpload")
+                return
+            with server.lock:
+                upload["parts"][int(query["partNumber"])] = body
+            self._send(200, headers={"ETag": etag})
+            return
+        with server.lock:
+            server.buckets[bucket][key] = (body, etag, time.time())
+        self._send(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        bucket, key, query = self._target()
+        self._read_body()
+        server = self.server
+        if self._bucket(bucket) is None:
+            return
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with server.lock:
+                server.uploads[upload_id] = {"bucket": bucket, "key": key, "parts": {}}
+            self._send_xml(
+                f'<InitiateMultipartUploadResult xmlns="{S3_NAMESPACE}"><Bucket>{escape(bucket)}</Bucket>'
+                f"<Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+            return
+        if "uploadId" in query:
+            with server.lock:
+                upload = server.uploads.pop(query["uploadId"], None)
+            if upload is None:
+                self._error(404, "NoSuchUpload")
+                return
+            data = b"".join(upload["parts"][number] for number in sorted(upload["parts"]))
+            etag = f'"{hashlib.md5(data).hexdigest()}-{len(upload["parts"])}"'
+            with server.lock:
+                server.buckets[bucket][key] = (data, etag, time.time())
+            self._send_xml(
+                f'<CompleteMultipartUploadResult xmlns="{S3_NAMESPACE}"><Bucket>{escape(bucket)}</Bucket>'
+                f"<Key>{escape(key)}</Key><ETag>{escape(etag)}</ETag></CompleteMultipartUploadResult>"
+            )
+            return
+        self._error(400, "InvalidRequest")
+
+    def do_DELETE(self):
+        time.sleep(self.server.latency)
+        bucket, key, query = self._target()
+        server = self.server
+        with server.lock:
+            if "uploadId" in query:
+                server.uploads.pop(query["uploadId"], None)
+            elif key:
+                server.buckets.get(bucket, {}).pop(key, None)
+            else:
+                server.buckets.pop(bucket, None)
+        self._send(204)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, bandwidth: float = 0.0):
+        super().__init__((host, port), FakeS3Handler)
+        self.latency = latency
+        # Débit par requête en octets/s (0 = illimité)
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, Dict] = {}
+        self.uploads: Dict[str, Dict] = {}
+
+    def throttle(self, size: int):
+        if self.bandwidth > 0:
+            time.sleep(size / self.bandwidth)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeS3Server":
+        """Démarre le serveur dans un thread d'arrière-plan"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Délai par requête (s)")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="Débit par requête en Mo/s (0 = illimité)")
+    args = parser.parse_args()
+
+    server = FakeS3Server(args.host, args.port, args.latency, args.bandwidth * 1024 * 1024)
+    print(f"Faux serveur S3 sur {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Index lexical BM25 incrémental, stocké sur disque et chargé en mémoire mappée.
+
+L'index est une suite de segments immuables (le plus récent en dernier),
+listés dans un manifeste. Chaque écriture ajoute un segment ; une version
+plus récente d'un chunk (ou sa suppression) masque les précédentes. Quand
+il y a trop de segments, des segments contigus sont fusionnés.
+
+Un segment contient des tableaux NumPy lus avec mmap_mode="r" :
+- term_hashes.npy : empreintes 64 bits des termes, triées
+- offsets.npy     : début des postings de chaque terme (n_termes + 1)
+- postings.npy    : numéro local du chunk de chaque posting
+- tfs.npy         : fréquence du terme dans le chunk
+- doc_lens.npy    : longueur de chaque chunk (-1 pour une suppression)
+et doc_ids.json, les identifiants des chunks.
+
+Reconstruction depuis ChromaDB :
+    python -m src.db.bm25 --rebuild
+"""
+from collections import Counter
+from typing import Dict, List, Tuple
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Mots, numéros et références (ex. "XR-2041-B", "v2.3", "ISO/IEC")
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) <= MAX_TERM_LENGTH]
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class _Segment:
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self.term_hashes = np.load(os.path.join(path, "term_hashes.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.doc_lens = np.load(os.path.join(path, "doc_lens.npy"), mmap_mode="r")
+        with open(os.path.join(path, "doc_ids.json")) as f:
+            self.doc_ids: List[str] = json.load(f)
+        # Chunks visibles (ni masqués par un segment plus récent, ni supprimés)
+        self.live = np.ones(len(self.doc_ids), dtype=bool)
+
+    @property
+    def size(self) -> int:
+        return len(self.postings)
+
+    def lookup(self, hashes: np.ndarray) -> List[Tuple[int, slice]]:
+        """(indice du terme de requête, tranche de postings) pour chaque terme présent"""
+        if not len(self.term_hashes):
+            return []
+        positions = np.searchsorted(self.term_hashes, hashes)
+        found = []
+        for query_index, position in enumerate(positions):
+            if position < len(self.term_hashes) and self.term_hashes[position] == hashes[query_index]:
+                found.append((query_index, slice(int(self.offsets[position]), int(self.offsets[position + 1]))))
+        return found
+
+
+def _write_segment(
+    path: str,
+    posting_hashes: np.ndarray,
+    posting_docs: np.ndarray,
+    posting_tfs: np.ndarray,
+    doc_ids: List[str],
+    doc_lens: np.ndarray
+):
+    """Écrit un segment à partir de postings (empreinte du terme, chunk, tf) non triés"""
+    order = np.lexsort((posting_docs, posting_hashes))
+    posting_hashes = posting_hashes[order]
+    term_hashes, counts = np.unique(posting_hashes, return_counts=True)
+    offsets = np.zeros(len(term_hashes) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    tmp_path = f"{path}.tmp"
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "term_hashes.npy"), term_hashes.astype(np.int64))
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "postings.npy"), posting_docs[order].astype(np.int32))
+    np.save(os.path.join(tmp_path, "tfs.npy"), posting_tfs[order].astype(np.int32))
+    np.save(os.path.join(tmp_path, "doc_lens.npy"), doc_lens.astype(np.int32))
+    with open(os.path.join(tmp_path, "doc_ids.json"), "w") as f:
+        json.dump(doc_ids, f)
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    def __init__(
+        self,
+        path: str,
+        k1: float = 1.5,
+        b: float = 0.75,
+        max_segments: int = 16
+    ):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._manifest_mtime = None
+        # Emplacement (segment, rang) de la version visible de chaque chunk
+        self._locations: Dict[str, Tuple[_Segment, int]] = {}
+        self._live_docs = 0
+        self._total_len = 0
+        os.makedirs(path, exist_ok=True)
+        self._manifest_path = os.path.join(path, "manifest.json")
+        self._lock_path = os.path.join(path, "index.lock")
+        self._reload_if_changed()
+
+    # --- Manifeste et chargement --------------------------------------------
+
+    def _read_manifest(self) -> List[str]:
+        if not os.path.exists(self._manifest_path):
+            return []
+        with open(self._manifest_path) as f:
+            return json.load(f)["segments"]
+
+    def _write_manifest(self, segments: List[str]):
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": segments}, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _reload_if_changed(self):
+        """Recharge les segments si le manifeste a été modifié (éventuellement par un autre processus)"""
+        try:
+            # Le manifeste est remplacé par os.replace : l'inode change à chaque écriture
+            stat = os.stat(self._manifest_path)
+            mtime = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._manifest_mtime:
+            return
+
+        with self._lock:
+            names = self._read_manifest()
+            current = [segment.name for segment in self._segments]
+            loaded = {segment.name: segment for segment in self._segments}
+            segments = [loaded.get(name) or _Segment(os.path.join(self.path, name)) for name in names]
+            if names[:len(current)] == current:
+                # Cas courant : de nouveaux segments ont seulement été ajoutés
+                for segment in segments[len(current):]:
+                    self._apply_segment(segment)
+            else:
+                self._locations = {}
+                self._live_docs = 0
+                self._total_len = 0
+                for segment in segments:
+                    self._apply_segment(segment)
+            self._segments = segments
+            self._manifest_mtime = mtime
+
+    def _apply_segment(self, segment: _Segment):
+        """Rend visibles les chunks d'un segment et masque leurs versions précédentes"""
+        doc_lens = np.asarray(segment.doc_lens)
+        segment.live = doc_lens >= 0
+        for index, doc_id in enumerate(segment.doc_ids):
+            previous = self._locations.get(doc_id)
+            if previous is not None:
+                previous_segment, previous_index = previous
+                previous_segment.live[previous_index] = False
+                self._live_docs -= 1
+                self._total_len -= int(previous_segment.doc_lens[previous_index])
+            if segment.live[index]:
+                self._locations[doc_id] = (segment, index)
+                self._live_docs += 1
+                self._total_len += int(doc_lens[index])
+            else:
+                self._locations.pop(doc_id, None)
+
+    @property
+    def _avg_doc_len(self) -> float:
+        return self._total_len / self._live_docs if self._live_docs else 0.0
+
+    # --- Écriture -----------------------------------------------------------
+
+    def add(self, ids: List[str], texts: List[str]):
+        """Indexe (ou réindexe) des chunks"""
+        posting_hashes, posting_docs, posting_tfs, doc_lens = [], [], [], []
+        for index, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                posting_hashes.append(term_hash(term))
+                posting_docs.append(index)
+                posting_tfs.append(tf)
+        self._append_segment(
+            np.array(posting_hashes, dtype=np.int64),
+            np.array(posting_docs, dtype=np.int32),
+            np.array(posting_tfs, dtype=np.int32),
+            list(ids),
+            np.array(doc_lens, dtype=np.int32)
+        )
+
+    def delete(self, ids: List[str]):
+        """Retire des chunks de l'index (segment de suppressions)"""
+        if ids:
+            empty = np.array([], dtype=np.int64)
+            self._append_segment(empty, empty.astype(np.int32), empty.astype(np.int32),
+                                 list(ids), np.full(len(ids), -1, dtype=np.int32))
+
+    def _append_segment(self, posting_hashes, posting_docs, posting_tfs, doc_ids, doc_lens):
+        if not doc_ids:
+            return
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            name = f"seg_{uuid.uuid4().hex}"
+            _write_segment(os.path.join(self.path, name), posting_hashes, posting_docs, posting_tfs, doc_ids, doc_lens)
+            segments = self._read_manifest() + [name]
+            if len(segments) > self.max_segments:
+                segments = self._merge(segments)
+            self._write_manifest(segments)
+        self._reload_if_changed()
+
+    def _merge(self, names: List[str]) -> List[str]:
+        """
+        Fusionne la fenêtre de segments contigus la plus légère, pour revenir
+        à max_segments / 2 segments. Les segments doivent rester contigus pour
+        que l'ordre des versions d'un chunk soit préservé.
+        """
+        segments = [_Segment(os.path.join(self.path, name)) for name in names]
+        window = len(segments) - max(1, self.max_segments // 2) + 1
+        sizes = [segment.size + len(segment.doc_ids) for segment in segments]
+        start = min(range(len(segments) - window + 1), key=lambda i: sum(sizes[i:i + window]))
+        merged = segments[start:start + window]
+
+        posting_hashes, posting_docs, posting_tfs = [], [], []
+        doc_ids, doc_lens = [], []
+        seen = set()
+        # Du plus récent au plus ancien : seule la dernière version de chaque chunk est gardée
+        for segment in reversed(merged):
+            keep = np.zeros(len(segment.doc_ids), dtype=bool)
+            # À l'intérieur d'un segment aussi : un identifiant répété dans un lot est visible à sa dernière occurrence
+            for index in range(len(segment.doc_ids) - 1, -1, -1):
+                doc_id = segment.doc_ids[index]
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                # Les suppressions ne sont utiles que s'il reste des segments plus anciens
+                keep[index] = segment.doc_lens[index] >= 0 or start > 0
+            new_index = np.cumsum(keep) - 1 + len(doc_ids)
+            doc_ids.extend(doc_id for doc_id, kept in zip(segment.doc_ids, keep) if kept)
+            doc_lens.append(np.asarray(segment.doc_lens)[keep])
+
+            counts = np.diff(segment.offsets)
+            hashes = np.repeat(np.asarray(segment.term_hashes), counts)
+            docs = np.asarray(segment.postings)
+            kept_postings = keep[docs]
+            posting_hashes.append(hashes[kept_postings])
+            posting_docs.append(new_index[docs[kept_postings]])
+            posting_tfs.append(np.asarray(segment.tfs)[kept_postings])
+
+        name = f"seg_{uuid.uuid4().hex}"
+        _write_segment(
+            os.path.join(self.path, name),
+            np.concatenate(posting_hashes),
+            np.concatenate(posting_docs),
+            np.concatenate(posting_tfs),
+            doc_ids,
+            np.concatenate(doc_lens)
+        )
+        logger.info(f"Index BM25 : {window} segments fusionnés ({len(doc_ids)} chunks)")
+
+        # Les anciens segments restent lisibles par les processus qui les ont mappés
+        for segment in merged:
+            shutil.rmtree(os.path.join(self.path, segment.name), ignore_errors=True)
+        return names[:start] + [name] + names[start + window:]
+
+    def clear(self):
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            for name in self._read_manifest():
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            self._write_manifest([])
+        self._reload_if_changed()
+
+    # --- Lecture ------------------------------------------------------------
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Renvoie les k meilleurs (chunk_id, score BM25)"""
+        self._reload_if_changed()
+        with self._lock:
+            segments = list(self._segments)
+            live_docs = self._live_docs
+            avg_doc_len = self._avg_doc_len or 1.0
+
+        terms = sorted(set(tokenize(query)))
+        if not terms or not live_docs:
+            return []
+        hashes = np.array([term_hash(term) for term in terms], dtype=np.int64)
+
+        # Fréquence documentaire de chaque terme sur les chunks visibles
+        matches = [(segment, segment.lookup(hashes)) for segment in segments]
+        doc_freqs = np.zeros(len(hashes))
+        for segment, found in matches:
+            for query_index, postings in found:
+                doc_freqs[query_index] += segment.live[segment.postings[postings]].sum()
+        idf = np.log(1 + (live_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+        candidates: List[Tuple[float, str]] = []
+        for segment, found in matches:
+            if not found:
+                continue
+            scores = np.zeros(len(segment.doc_ids))
+            for query_index, postings in found:
+                docs = np.asarray(segment.postings[postings])
+                tfs = np.asarray(segment.tfs[postings], dtype=np.float64)
+                norms = self.k1 * (1 - self.b + self.b * np.asarray(segment.doc_lens)[docs] / avg_doc_len)
+                scores[docs] += idf[query_index] * tfs * (self.k1 + 1) / (tfs + norms)
+            scores[~segment.live] = 0.0
+
+            top = min(k, int((scores > 0).sum()))
+            if top:
+                best = np.argpartition(-scores, top - 1)[:top]
+                candidates.extend((float(scores[index]), segment.doc_ids[index]) for index in best)
+
+        candidates.sort(reverse=True)
+        return [(doc_id, score) for score, doc_id in candidates[:k]]
+
+    def stats(self) -> Dict:
+        self._reload_if_changed()
+        return {
+            "segments": len(self._segments),
+            "live_chunks": self._live_docs,
+            "avg_chunk_tokens": round(self._avg_doc_len, 1)
+        }
+
+
+def rebuild_from_collection(index: BM25Index, collection, page_size: int = 1000) -> int:
+    """Reconstruit l'index à partir des chunks stockés dans ChromaDB"""
+    index.clear()
+    offset = 0
+    total = 0
+    while True:
+        page = collection.get(include=["documents"], limit=page_size, offset=offset)
+        index.add(page["ids"], page["documents"])
+        total += len(page["ids"])
+        if len(page["ids"]) < page_size:
+            return total
+        offset += page_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruit l'index depuis ChromaDB")
+    args = parser.parse_args()
+
+    from src.db.chroma import get_db_manager
+
+    db_manager = get_db_manager()
+
+    if db_manager.lexical_index is None:
+        parser.error("L'index lexical est désactivé (LEXICAL_INDEX_ENABLED=false)")
+    if args.rebuild:
+        total = rebuild_from_collection(db_manager.lexical_index, db_manager.collection)
+        db_manager.generation.bump()
+        print(f"{total} chunks indexés")
+    print(json.dumps(db_manager.lexical_index.stats()))
+
+
+if __name__ == "__main__":
+    main()
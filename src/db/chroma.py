@@ -1,21 +1,98 @@
-import chromadb
+import asyncio
+import copy
+import numpy as np
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 import logging
+import os
+import threading
+import time
+
+from src.db.bm25 import BM25Index
+from src.db.chroma_client import create_chroma_client
+from src.db.embeddings import ChromaEmbeddingFunction, EmbeddingEngine, create_embedder
+from src.db.query_cache import CollectionGeneration, LRUCache, make_search_key
+from src.db.rerank import rerank_results
+from src.db.sharding import COLLECTION_METADATA, ShardedCollection, create_router
+from src.db.vector_index import create_vector_index
+from src.db.versions import get_version_store
+from src.monitoring.metrics import SEARCHES, timed, track_stage
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Constante de la fusion par rang réciproque (Reciprocal Rank Fusion)
+RRF_K = 60
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
 class ChromaDBManager:
-    def __init__(self):
+    def __init__(self, batch_size: Optional[int] = None, embedder: Optional[EmbeddingEngine] = None):
         """Initialisation de ChromaDB avec persistence"""
         try:
-            self.client = chromadb.PersistentClient(path="/chroma/chroma")
-            self.collection = self.client.get_or_create_collection(
-                name="documents",
-                metadata={"hnsw:space": "cosine"}
+            # Les embeddings sont calculés explicitement (ingestion et recherche)
+            self.embedder = embedder or create_embedder()
+            self.embedding_function = ChromaEmbeddingFunction(self.embedder)
+            # Base embarquée ou serveur distant (CHROMA_MODE)
+            self.client = create_chroma_client()
+            data_dir = os.getenv("DATA_DIR", "/app/data")
+            self.generation = CollectionGeneration(
+                os.getenv("SEARCH_GENERATION_PATH", os.path.join(data_dir, "collection.generation"))
             )
+            # Historique des versions du contenu des documents (deltas compressés)
+            self.version_store = get_version_store()
+            # Une collection, ou plusieurs partitionnées par métadonnée ou par hash (SHARD_STRATEGY)
+            self.shard_router = create_router()
+            if self.shard_router.strategy == "none":
+                self.collection = self.client.get_or_create_collection(
+                    name=self.shard_router.base,
+                    metadata=COLLECTION_METADATA,
+                    embedding_function=self.embedding_function
+                )
+            else:
+                self.collection = ShardedCollection(
+                    self.client,
+                    self.shard_router,
+                    self.embedding_function,
+                    version=self.generation.current
+                )
+            # Taille des lots d'écriture (un appel collection.add / un passage d'embedding par lot)
+            self.batch_size = batch_size or int(os.getenv("CHROMA_BATCH_SIZE", "256"))
+            max_batch_size = getattr(self.client, "max_batch_size", None)
+            if max_batch_size:
+                self.batch_size = min(self.batch_size, max_batch_size)
+
+            # Index lexical BM25 tenu à jour à chaque écriture dans la collection
+            self.lexical_index = None
+            if os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true":
+                self.lexical_index = BM25Index(
+                    path=os.getenv(
+                        "LEXICAL_INDEX_PATH",
+                        os.path.join(os.getenv("DATA_DIR", "/app/data"), "bm25")
+                    ),
+                    max_segments=int(os.getenv("LEXICAL_INDEX_MAX_SEGMENTS", "16"))
+                )
+            # Index vectoriel exact int8 en mémoire mappée à la place de l'index HNSW (VECTOR_INDEX=int8)
+            self.vector_index = create_vector_index(self.embedder.dimension)
+            self.search_mode = os.getenv("SEARCH_MODE", "hybrid" if self.lexical_index else "vector")
+            # Sur-échantillonnage initial de la recherche et plafond de la recherche adaptative
+            self.search_overfetch = int(os.getenv("SEARCH_OVERFETCH", "2"))
+            self.search_max_candidates = int(os.getenv("SEARCH_MAX_CANDIDATES", "200"))
+            # Diversification MMR des résultats (désactivée par défaut)
+            self.rerank_enabled = os.getenv("SEARCH_RERANK", "false").lower() == "true"
+            self.rerank_candidates = int(os.getenv("SEARCH_RERANK_CANDIDATES", "50"))
+            self.mmr_lambda = float(os.getenv("SEARCH_MMR_LAMBDA", "0.5"))
+
+            # Caches de recherche : embeddings des requêtes (LRU) et résultats (TTL court),
+            # ces derniers invalidés par la génération de la collection (self.generation) à chaque écriture
+            self.query_embedding_cache = LRUCache(int(os.getenv("QUERY_EMBEDDING_CACHE_ENTRIES", "4096")))
+            self.search_cache = None
+            if os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true":
+                self.search_cache = LRUCache(
+                    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")),
+                    ttl=float(os.getenv("SEARCH_CACHE_TTL", "30"))
+                )
             logger.info("ChromaDB initialisé avec configurations optimisées")
         except Exception as e:
             logger.error(f"Erreur lors de l'initialisation de ChromaDB: {str(e)}")
@@ -23,28 +100,48 @@ class ChromaDBManager:
 
     async def add_document(self, doc_id: str, content: str, metadata: Optional[Dict] = None) -> Dict:
         """
-        Ajoute un document dans ChromaDB avec métadonnées et versioning.
+        Ajoute un document dans ChromaDB avec métadonnées et versioning :
+        chaque contenu différent devient une nouvelle version de l'historique,
+        un contenu inchangé n'est ni réembeddé ni réécrit. La version n'est
+        enregistrée qu'une fois le document écrit, comme dans process_document.
         """
         try:
             # Préparation des métadonnées
             if metadata is None:
                 metadata = {}
-            
-            metadata.update({
+
+            current = await asyncio.to_thread(self.version_store.peek, doc_id, content, metadata)
+            if current["unchanged"]:
+                logger.info(f"Document {doc_id} inchangé (version {current['version']})")
+                return {
+                    "message": f"Document {doc_id} inchangé",
+                    "version": current["version"],
+                    "metadata": metadata
+                }
+
+            stored_metadata = {
+                **metadata,
                 "date_added": datetime.utcnow().isoformat(),
-                "version": 1
-            })
-
-            # Ajout du document
-            self.collection.add(
-                documents=[content],
-                metadatas=[metadata],
-                ids=[doc_id]
+                "version": current["version"] + 1
+            }
+
+            # Ajout du document (la version précédente est remplacée), index lexical et vectoriel compris
+            embeddings = await asyncio.to_thread(self.embedder.embed, [content])
+            await asyncio.to_thread(
+                self._write_batch, self.collection.upsert, [doc_id], [content], embeddings, [stored_metadata]
             )
-            
-            logger.info(f"Document {doc_id} ajouté avec succès")
+
+            version_info = await asyncio.to_thread(self.version_store.append, doc_id, content, metadata)
+            if version_info["version"] != stored_metadata["version"]:
+                # Écriture concurrente du même document : la version attribuée diffère de la version prévue
+                stored_metadata["version"] = version_info["version"]
+                await asyncio.to_thread(self.collection.update, ids=[doc_id], metadatas=[stored_metadata])
+            metadata = stored_metadata
+
+            logger.info(f"Document {doc_id} ajouté avec succès (version {version_info['version']})")
             return {
                 "message": f"Document {doc_id} ajouté avec succès",
+                "version": version_info["version"],
                 "metadata": metadata
             }
 
@@ -52,22 +149,243 @@ class ChromaDBManager:
             logger.error(f"Erreur lors de l'ajout du document {doc_id}: {str(e)}")
             raise
 
-    async def get_document_versions(self, doc_id: str) -> Dict:
-        """Récupère l'historique des versions d'un document."""
+    async def add_documents(
+        self,
+        ids: List[str],
+        contents: List[str],
+        metadatas: Optional[List[Dict]] = None,
+        batch_size: Optional[int] = None,
+        upsert: bool = False
+    ) -> Dict:
+        """
+        Ajoute plusieurs documents par lots : un seul appel collection.add
+        (et un seul appel au moteur d'embedding) par lot au lieu d'un par document.
+        Avec upsert=True, les documents existants sont remplacés.
+        """
+        if metadatas is None:
+            metadatas = [{} for _ in ids]
+        if not (len(ids) == len(contents) == len(metadatas)):
+            raise ValueError("ids, contents et metadatas doivent avoir la même longueur")
+
+        batch_size = batch_size or self.batch_size
+        write = self.collection.upsert if upsert else self.collection.add
+        date_added = datetime.utcnow().isoformat()
+        batches = []
+        start_time = time.perf_counter()
+
+        try:
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                # Pas de champ version : les versions sont celles des documents (VersionStore)
+                batch_metadatas = [
+                    {**(metadata or {}), "date_added": date_added}
+                    for metadata in metadatas[start:end]
+                ]
+
+                batch_start = time.perf_counter()
+                with track_stage("embedding", items=len(batch_metadatas)):
+                    embeddings = await asyncio.to_thread(self.embedder.embed, contents[start:end])
+                embed_time = time.perf_counter() - batch_start
+                await asyncio.to_thread(
+                    self._write_batch, write, ids[start:end], contents[start:end], embeddings, batch_metadatas
+                )
+                batches.append({
+                    "size": len(batch_metadatas),
+                    "embed_time": round(embed_time, 4),
+                    "duration": round(time.perf_counter() - batch_start, 4)
+                })
+
+            total_time = time.perf_counter() - start_time
+            logger.info(
+                f"{len(ids)} documents ajoutés en {len(batches)} lots "
+                f"(taille {batch_size}) en {total_time:.2f}s"
+            )
+            return {
+                "message": f"{len(ids)} documents ajoutés avec succès",
+                "total_documents": len(ids),
+                "batch_size": batch_size,
+                "batches": batches,
+                "total_time": round(total_time, 4)
+            }
+
+        except Exception as e:
+            logger.error(f"Erreur lors de l'ajout par lots ({len(batches)} lots écrits): {str(e)}")
+            raise
+
+    def _write_batch(self, write, ids: List[str], contents: List[str], embeddings: np.ndarray, metadatas: List[Dict]):
+        """Écriture d'un lot dans la collection et l'index lexical (appelée hors de la boucle d'événements)"""
+        with track_stage("chroma_write", items=len(ids)):
+            write(documents=contents, embeddings=embeddings.tolist(), metadatas=metadatas, ids=ids)
+        if self.lexical_index is not None:
+            with track_stage("lexical_write", items=len(ids)):
+                self.lexical_index.add(ids, contents)
+        if self.vector_index is not None:
+            with track_stage("vector_index_write", items=len(ids)):
+                self.vector_index.add(ids, embeddings)
+        self.generation.bump()
+
+    def bulk_load(self, ids: List[str], contents: List[str], embeddings: np.ndarray, metadatas: List[Dict]):
+        """Écrit (upsert) des chunks déjà embeddés, sans recalcul : import d'instantané"""
+        self._write_batch(self.collection.upsert, ids, contents, embeddings, metadatas)
+
+    async def get_document_chunk_index(self, doc_id: str, page_size: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Renvoie les métadonnées (sans contenu ni embedding) de tous les chunks
+        stockés pour un document, indexées par identifiant de chunk.
+        """
+        page_size = page_size or self.batch_size
+        index = {}
+        offset = 0
         try:
-            # Vérifier si le document existe
-            try:
-                results = self.collection.get(
-                    ids=[doc_id],
-                    include=["metadatas", "documents"]
+            while True:
+                page = await asyncio.to_thread(
+                    self.collection.get,
+                    where={"doc_id": doc_id},
+                    include=["metadatas"],
+                    limit=page_size,
+                    offset=offset
                 )
-            except Exception as e:
-                logger.error(f"Erreur lors de la récupération du document {doc_id}: {str(e)}")
+                index.update(zip(page["ids"], page["metadatas"]))
+                if len(page["ids"]) < page_size:
+                    return index
+                offset += page_size
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture des chunks de {doc_id}: {str(e)}")
+            raise
+
+    async def iter_document_chunks(self, doc_id: str, page_size: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Parcourt les chunks d'un document dans l'ordre de chunk_index.
+
+        Une première passe ne lit que les métadonnées (filtre where sur doc_id)
+        pour établir l'ordre ; les contenus sont ensuite lus page par page,
+        si bien qu'une seule page de contenus est en mémoire à la fois.
+        """
+        page_size = page_size or self.batch_size
+        index = await self.get_document_chunk_index(doc_id, page_size)
+        ordered_ids = sorted(index, key=lambda chunk_id: index[chunk_id].get("chunk_index", 0))
+
+        for start in range(0, len(ordered_ids), page_size):
+            page_ids = ordered_ids[start:start + page_size]
+            page = await asyncio.to_thread(
+                self.collection.get,
+                ids=page_ids,
+                where={"doc_id": doc_id},
+                include=["documents", "metadatas"]
+            )
+            # collection.get ne garantit pas l'ordre des ids demandés
+            chunks = {
+                chunk_id: (content, metadata)
+                for chunk_id, content, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+            }
+            for chunk_id in page_ids:
+                if chunk_id in chunks:
+                    content, metadata = chunks[chunk_id]
+                    yield {"id": chunk_id, "content": content, "metadata": metadata}
+
+    async def get_document_chunks(self, doc_id: str, page_size: Optional[int] = None) -> List[Dict]:
+        """Renvoie les chunks d'un document ordonnés par chunk_index"""
+        try:
+            return [chunk async for chunk in self.iter_document_chunks(doc_id, page_size)]
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des chunks de {doc_id}: {str(e)}")
+            raise
+
+    async def get_documents_chunks(self, doc_ids: List[str], max_concurrency: int = 4) -> Dict[str, List[Dict]]:
+        """Récupère les chunks de plusieurs documents en parallèle (au plus max_concurrency à la fois)"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(doc_id: str) -> List[Dict]:
+            async with semaphore:
+                return await self.get_document_chunks(doc_id)
+
+        results = await asyncio.gather(*(fetch(doc_id) for doc_id in doc_ids))
+        return dict(zip(doc_ids, results))
+
+    async def update_metadatas(self, ids: List[str], metadatas: List[Dict], batch_size: Optional[int] = None) -> int:
+        """Met à jour les métadonnées de documents existants, sans recalcul d'embedding"""
+        batch_size = batch_size or self.batch_size
+        try:
+            for start in range(0, len(ids), batch_size):
+                await asyncio.to_thread(
+                    self.collection.update,
+                    ids=ids[start:start + batch_size],
+                    metadatas=metadatas[start:start + batch_size]
+                )
+            if ids:
+                self.generation.bump()
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Erreur lors de la mise à jour des métadonnées: {str(e)}")
+            raise
+
+    async def delete_documents(self, ids: List[str], batch_size: Optional[int] = None) -> int:
+        """Supprime des documents par lots"""
+        batch_size = batch_size or self.batch_size
+        try:
+            for start in range(0, len(ids), batch_size):
+                await asyncio.to_thread(self.collection.delete, ids=ids[start:start + batch_size])
+                if self.lexical_index is not None:
+                    await asyncio.to_thread(self.lexical_index.delete, ids[start:start + batch_size])
+                if self.vector_index is not None:
+                    await asyncio.to_thread(self.vector_index.delete, ids[start:start + batch_size])
+            if ids:
+                self.generation.bump()
+                logger.info(f"{len(ids)} documents supprimés")
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Erreur lors de la suppression de documents: {str(e)}")
+            raise
+
+    @staticmethod
+    def _version_entry(version: Dict, is_current: bool) -> Dict:
+        metadata = version["metadata"]
+        entry = {
+            "version": version["version"],
+            "metadata": {
+                "date_added": version["created_at"],
+                "author": metadata.get('author', 'N/A'),
+                "category": metadata.get('category', 'N/A'),
+                "source": metadata.get('source', 'N/A')
+            },
+            "content_hash": version["content_hash"],
+            "size": version["size"],
+            "stored_as": version["stored_as"],
+            "stored_bytes": version["stored_bytes"],
+            "is_current": is_current
+        }
+        if "content" in version:
+            entry["content"] = version["content"]
+        return entry
+
+    async def get_document_versions(self, doc_id: str, include_content: bool = False) -> Dict:
+        """
+        Récupère l'historique des versions d'un document. Le contenu de la
+        version courante est toujours renvoyé ; celui des versions antérieures
+        avec include_content (reconstruit en une seule passe sur les deltas).
+        """
+        try:
+            history = await asyncio.to_thread(self.version_store.history, doc_id, include_content)
+            if history:
+                if not include_content:
+                    latest = await asyncio.to_thread(self.version_store.latest, doc_id)
+                    history[-1]["content"] = latest["content"]
                 return {
-                    "error": f"Document {doc_id} non trouvé ou erreur de récupération",
-                    "versions": []
+                    "status": "success",
+                    "doc_id": doc_id,
+                    "current_version": history[-1]["version"],
+                    "versions": [
+                        self._version_entry(version, index == len(history) - 1)
+                        for index, version in enumerate(history)
+                    ]
                 }
 
+            # Documents ajoutés avant l'historique des versions : seule la version courante est connue
+            results = await asyncio.to_thread(
+                self.collection.get,
+                ids=[doc_id],
+                include=["metadatas", "documents"]
+            )
             if not results['ids']:
                 logger.info(f"Document {doc_id} non trouvé")
                 return {
@@ -75,13 +393,12 @@ class ChromaDBManager:
                     "versions": []
                 }
 
-            # Récupérer les informations du document
-            versions = []
-            try:
-                current_metadata = results['metadatas'][0]
-                current_content = results['documents'][0]
-
-                versions.append({
+            current_metadata = results['metadatas'][0] or {}
+            return {
+                "status": "success",
+                "doc_id": doc_id,
+                "current_version": current_metadata.get('version', 1),
+                "versions": [{
                     "version": current_metadata.get('version', 1),
                     "metadata": {
                         "date_added": current_metadata.get('date_added', 'N/A'),
@@ -89,81 +406,445 @@ class ChromaDBManager:
                         "category": current_metadata.get('category', 'N/A'),
                         "source": current_metadata.get('source', 'N/A')
                     },
-                    "content": current_content,
+                    "content": results['documents'][0],
                     "is_current": True
-                })
+                }]
+            }
 
-                return {
-                    "status": "success",
-                    "doc_id": doc_id,
-                    "versions": versions
-                }
+        except Exception as e:
+            logger.error(f"Erreur inattendue lors de la récupération des versions de {doc_id}: {str(e)}")
+            raise
 
-            except Exception as e:
-                logger.error(f"Erreur lors du traitement des métadonnées: {str(e)}")
-                return {
-                    "error": "Erreur lors du traitement des métadonnées",
-                    "versions": []
+    async def get_document_version(self, doc_id: str, version: int) -> Optional[Dict]:
+        """Contenu et métadonnées d'une version donnée (dernière version lue directement)"""
+        try:
+            record = await asyncio.to_thread(self.version_store.get, doc_id, version)
+            if record is None:
+                return None
+            return {"status": "success", "doc_id": doc_id, **self._version_entry(record, record["is_current"])}
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture de la version {version} de {doc_id}: {str(e)}")
+            raise
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embedding d'une requête, mis en cache (LRU) par backend et texte"""
+        key = (self.embedder.name, self.embedder.dimension, query)
+        embedding = self.query_embedding_cache.get(key)
+        if embedding is None:
+            with track_stage("query_embedding"):
+                embedding = (await asyncio.to_thread(self.embedder.embed, [query]))[0]
+            self.query_embedding_cache.set(key, embedding)
+        return embedding
+
+    async def warm_up(self) -> Dict:
+        """
+        Charge le modèle d'embedding, l'index vectoriel (HNSW ou int8) et les
+        segments de l'index lexical avant la première recherche
+        """
+        timings = {}
+        start_time = time.perf_counter()
+        embedding = (await asyncio.to_thread(self.embedder.embed, ["préchauffage"]))[0]
+        timings["embedding"] = round(time.perf_counter() - start_time, 4)
+
+        # Avec l'index int8, l'index HNSW n'est jamais chargé en mémoire
+        if self.vector_index is None and await asyncio.to_thread(self.collection.count):
+            start_time = time.perf_counter()
+            await asyncio.to_thread(
+                self.collection.query, query_embeddings=[embedding.tolist()], n_results=1, include=[]
+            )
+            timings["chroma_query"] = round(time.perf_counter() - start_time, 4)
+        if self.lexical_index is not None:
+            start_time = time.perf_counter()
+            await asyncio.to_thread(self.lexical_index.search, "préchauffage", 1)
+            timings["lexical_query"] = round(time.perf_counter() - start_time, 4)
+        if self.vector_index is not None:
+            # Un parcours complet charge les codes int8 dans le cache de pages
+            start_time = time.perf_counter()
+            await asyncio.to_thread(self.vector_index.search, embedding, 1)
+            timings["vector_query"] = round(time.perf_counter() - start_time, 4)
+            indexed = (await asyncio.to_thread(self.vector_index.stats))["live_chunks"]
+            stored = await asyncio.to_thread(self.collection.count)
+            if indexed != stored:
+                logger.warning(
+                    f"Index int8 : {indexed} chunks indexés pour {stored} dans la collection, "
+                    f"reconstruisez-le (python -m src.db.vector_index --rebuild)"
+                )
+        return timings
+
+    def cache_stats(self) -> Dict:
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "search_results": self.search_cache.stats() if self.search_cache is not None else None
+        }
+
+    @staticmethod
+    def build_where(filters: Optional[Dict]) -> Optional[Dict]:
+        """
+        Convertit des filtres de métadonnées en clause where ChromaDB.
+        {"author": "x", "category": "y"} devient {"$and": [{"author": "x"}, {"category": "y"}]} ;
+        une clause déjà exprimée avec des opérateurs ($and, $or, $eq...) est transmise telle quelle.
+        """
+        if not filters:
+            return None
+        if len(filters) == 1:
+            return dict(filters)
+        return {"$and": [{key: value} for key, value in filters.items()]}
+
+    def _vector_query(
+        self,
+        query_embeddings: np.ndarray,
+        n_results: int,
+        where: Optional[Dict],
+        where_document: Optional[Dict],
+        include: List[str]
+    ) -> Dict:
+        """
+        Plus proches voisins de plusieurs requêtes, au format de collection.query.
+        Avec l'index int8, les filtres sont résolus par ChromaDB en identifiants
+        candidats, puis seuls les chunks retenus sont lus dans la collection.
+        """
+        if self.vector_index is None:
+            with track_stage("chroma_query", candidates=n_results):
+                return self.collection.query(
+                    query_embeddings=query_embeddings.tolist(),
+                    n_results=n_results,
+                    where=where,
+                    where_document=where_document,
+                    include=include + ["distances"]
+                )
+
+        allowed = None
+        if where is not None or where_document is not None:
+            with track_stage("chroma_get"):
+                allowed = self.collection.get(where=where, where_document=where_document, include=[])["ids"]
+        with track_stage("vector_query", items=len(query_embeddings), candidates=n_results):
+            hits = self.vector_index.search(query_embeddings, n_results, ids=allowed)
+        found_ids = sorted({chunk_id for query_hits in hits for chunk_id, _ in query_hits})
+        records = {}
+        if found_ids:
+            with track_stage("chroma_get", items=len(found_ids)):
+                fetched = self.collection.get(ids=found_ids, include=include)
+            for index, chunk_id in enumerate(fetched["ids"]):
+                records[chunk_id] = {field: fetched[field][index] for field in include}
+
+        results = {"ids": [], "distances": [], **{field: [] for field in include}}
+        for query_hits in hits:
+            # Un chunk absent de la collection (index à reconstruire) est ignoré
+            query_hits = [(chunk_id, score) for chunk_id, score in query_hits if chunk_id in records]
+            results["ids"].append([chunk_id for chunk_id, _ in query_hits])
+            # Distance cosinus, comme l'espace "cosine" de la collection
+            results["distances"].append([1 - score for _, score in query_hits])
+            for field in include:
+                results[field].append([records[chunk_id][field] for chunk_id, _ in query_hits])
+        return results
+
+    async def _search_candidates(
+        self,
+        query: str,
+        n_candidates: int,
+        where: Optional[Dict],
+        where_document: Optional[Dict],
+        mode: str,
+        query_embedding: Optional[np.ndarray],
+        with_embeddings: bool = False
+    ) -> Dict:
+        """Une passe de recherche : candidats vectoriels et lexicaux, filtres appliqués"""
+        include = ["documents", "metadatas"] + (["embeddings"] if with_embeddings else [])
+        vector_task = (
+            asyncio.to_thread(
+                self._vector_query, query_embedding[None, :], n_candidates, where, where_document, include
+            )
+            if mode != "lexical" else asyncio.sleep(0, None)
+        )
+        lexical_task = (
+            timed("lexical_query", asyncio.to_thread(self.lexical_index.search, query, n_candidates),
+                  candidates=n_candidates)
+            if mode != "vector" else asyncio.sleep(0, [])
+        )
+        vector_results, lexical_hits = await asyncio.gather(vector_task, lexical_task)
+
+        # Candidats par identifiant de chunk
+        candidates: Dict[str, Dict] = {}
+        embeddings: Dict[str, np.ndarray] = {}
+        vector_scores = []
+        if vector_results is not None:
+            if with_embeddings:
+                embeddings.update(zip(vector_results['ids'][0], np.asarray(vector_results['embeddings'][0])))
+            for rank, (chunk_id, doc, meta, distance) in enumerate(zip(
+                vector_results['ids'][0],
+                vector_results['documents'][0],
+                vector_results['metadatas'][0],
+                vector_results['distances'][0]
+            )):
+                # Conversion de la distance en score de similarité
+                similarity_score = 1 - (distance / 2)
+                vector_scores.append(similarity_score)
+                candidates[chunk_id] = {
+                    "id": chunk_id,
+                    "content": doc,
+                    "metadata": meta,
+                    "relevance_score": round(similarity_score, 3),
+                    "vector_rank": rank
                 }
 
-        except Exception as e:
-            logger.error(f"Erreur inattendue lors de la récupération des versions de {doc_id}: {str(e)}")
-            raise Exception(f"Erreur inattendue: {str(e)}")
+        for rank, (chunk_id, score) in enumerate(lexical_hits):
+            candidate = candidates.setdefault(chunk_id, {"id": chunk_id, "relevance_score": None})
+            candidate["lexical_score"] = round(score, 3)
+            candidate["lexical_rank"] = rank
+
+        # Chunks trouvés uniquement par l'index lexical : contenu lu et filtres appliqués par ChromaDB
+        missing = [chunk_id for chunk_id, candidate in candidates.items() if "content" not in candidate]
+        if missing:
+            fetched = await timed("chroma_get", asyncio.to_thread(
+                self.collection.get,
+                ids=missing,
+                where=where,
+                where_document=where_document,
+                include=["documents", "metadatas"] + (
+                    ["embeddings"] if query_embedding is not None or with_embeddings else []
+                )
+            ), items=len(missing))
+            for index, (chunk_id, doc, meta) in enumerate(
+                zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+            ):
+                candidates[chunk_id].update(content=doc, metadata=meta)
+                if with_embeddings:
+                    embeddings[chunk_id] = np.asarray(fetched["embeddings"][index])
+                if query_embedding is not None:
+                    # Même échelle que les résultats vectoriels : 1 - distance cosinus / 2
+                    cosine = float(np.dot(query_embedding, fetched["embeddings"][index]))
+                    candidates[chunk_id]["relevance_score"] = round((1 + cosine) / 2, 3)
+        filtered_lexical = 0
+        for chunk_id in missing:
+            if "content" not in candidates[chunk_id]:
+                del candidates[chunk_id]
+                filtered_lexical += 1
+
+        return {
+            "candidates": candidates,
+            "vector_scores": vector_scores,
+            "embeddings": embeddings,
+            "lexical_hits": len(lexical_hits),
+            "filtered_lexical": filtered_lexical
+        }
 
     async def search_documents(
         self,
         query: str,
         n_results: int = 3,
         filters: Optional[Dict] = None,
-        min_relevance_score: float = 0.7
+        min_relevance_score: float = 0.7,
+        mode: Optional[str] = None,
+        where_document: Optional[Dict] = None,
+        rerank: Optional[bool] = None,
+        mmr_lambda: Optional[float] = None
     ) -> Dict:
-        """Recherche sémantique avancée"""
-        try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results * 2,  # Récupérer plus pour filtrer par score
-                include=['documents', 'metadatas', 'distances']
+        """
+        Recherche vectorielle, lexicale (BM25) ou hybride.
+
+        En mode hybride, les deux recherches sont lancées en parallèle puis
+        fusionnées par rang réciproque : score = somme de 1 / (RRF_K + rang).
+        Un résultat trouvé par l'index lexical est conservé même si sa
+        similarité vectorielle est sous min_relevance_score (références,
+        sigles, expressions exactes).
+
+        Les filtres (métadonnées et contenu) sont appliqués par ChromaDB. Le
+        nombre de candidats part de n_results (n_results * SEARCH_OVERFETCH
+        avec l'index lexical) et n'est doublé que si les filtres et le seuil laissent moins de n_results
+        résultats, tant que des candidats supplémentaires peuvent encore
+        passer le seuil (les scores vectoriels arrivent par ordre décroissant).
+
+        Avec rerank, au moins SEARCH_RERANK_CANDIDATES candidats sont
+        récupérés avec leurs embeddings ; les chunks consécutifs d'un même
+        document sont regroupés puis les résultats diversifiés par MMR.
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        if mode != "vector" and self.lexical_index is None:
+            mode = "vector"
+        where = self.build_where(filters)
+        rerank = self.rerank_enabled if rerank is None else rerank
+        mmr_lambda = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+
+        # Clé calculée avant la recherche : une écriture concurrente change la
+        # génération, le résultat mis en cache ne sera alors jamais relu
+        cache_key = None
+        if self.search_cache is not None:
+            cache_key = make_search_key(
+                self.generation.current(),
+                query=query,
+                n_results=n_results,
+                filters=where,
+                where_document=where_document,
+                min_relevance_score=min_relevance_score,
+                mode=mode,
+                rerank=rerank,
+                mmr_lambda=mmr_lambda if rerank else None
             )
+            cached = self.search_cache.get(cache_key)
+            if cached is not None:
+                SEARCHES.labels(mode, "true").inc()
+                return {**copy.deepcopy(cached), "cached": True}
 
-            if not results['documents'][0]:
-                return {
-                    "status": "success",
-                    "results": [],
-                    "total_candidates": 0,
-                    "filtered_results": 0
-                }
+        try:
+            start_time = time.perf_counter()
+            # Les scores vectoriels étant décroissants, les n_results premiers candidats
+            # contiennent tous ceux qui passent le seuil ; le sur-échantillonnage ne sert
+            # qu'à la fusion avec l'index lexical
+            n_candidates = n_results if mode == "vector" else n_results * self.search_overfetch
+            if rerank:
+                n_candidates = max(n_candidates, min(self.rerank_candidates, self.search_max_candidates))
+            # Embedding de la requête calculé une seule fois pour toutes les passes
+            query_embedding = None
+            if mode != "lexical":
+                query_embedding = await self.embed_query(query)
+            rounds = 0
+            scanned = 0
+            while True:
+                rounds += 1
+                round_results = await self._search_candidates(
+                    query, n_candidates, where, where_document, mode, query_embedding, with_embeddings=rerank
+                )
+                candidates = round_results["candidates"]
+                vector_scores = round_results["vector_scores"]
+                scanned += len(vector_scores) + round_results["lexical_hits"]
 
-            # Traitement et filtrage des résultats
-            processed_results = []
-            for doc, meta, distance in zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
-            ):
-                # Conversion de la distance en score de similarité
-                similarity_score = 1 - (distance / 2)
-                
-                if similarity_score >= min_relevance_score:
-                    processed_results.append({
-                        "content": doc,
-                        "metadata": meta,
-                        "relevance_score": round(similarity_score, 3)
-                    })
-
-            # Trier par score et limiter aux n_results
-            processed_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+                processed_results = []
+                with track_stage("post_filter", items=len(candidates)):
+                    for candidate in candidates.values():
+                        vector_rank = candidate.pop("vector_rank", None)
+                        lexical_rank = candidate.pop("lexical_rank", None)
+                        if lexical_rank is None and candidate["relevance_score"] < min_relevance_score:
+                            continue
+                        candidate["rrf_score"] = round(sum(
+                            1 / (RRF_K + rank + 1) for rank in (vector_rank, lexical_rank) if rank is not None
+                        ), 5)
+                        processed_results.append(candidate)
+
+                if len(processed_results) >= n_results or n_candidates >= self.search_max_candidates:
+                    break
+                # Plus de candidats vectoriels n'aide que si la page était pleine et que
+                # le dernier candidat passait encore le seuil
+                more_vector = (
+                    len(vector_scores) == n_candidates and vector_scores[-1] >= min_relevance_score
+                )
+                # Plus de candidats lexicaux n'aide que si des résultats ont été écartés par les filtres
+                more_lexical = (
+                    round_results["lexical_hits"] == n_candidates and round_results["filtered_lexical"] > 0
+                )
+                if not (more_vector or more_lexical):
+                    break
+                n_candidates = min(n_candidates * 2, self.search_max_candidates)
+
+            # Trier par score fusionné et limiter aux n_results
+            processed_results.sort(key=lambda x: x['rrf_score'], reverse=True)
+            rerank_time = None
+            if rerank:
+                rerank_start = time.perf_counter()
+                with track_stage("rerank", items=len(processed_results)):
+                    processed_results = rerank_results(
+                        processed_results, round_results["embeddings"], n_results, mmr_lambda
+                    )
+                rerank_time = round(time.perf_counter() - rerank_start, 4)
             processed_results = processed_results[:n_results]
 
-            return {
+            search_time = time.perf_counter() - start_time
+            logger.debug(
+                f"Recherche ({mode}) : {scanned} candidats examinés en {rounds} passes, "
+                f"{len(processed_results)} résultats en {search_time:.3f}s"
+            )
+            response = {
                 "status": "success",
+                "mode": mode,
                 "results": processed_results,
-                "total_candidates": len(results['documents'][0]),
-                "filtered_results": len(processed_results)
+                "total_candidates": len(candidates),
+                "vector_candidates": len(vector_scores),
+                "lexical_candidates": round_results["lexical_hits"],
+                "filtered_results": len(processed_results),
+                "stats": {
+                    "rounds": rounds,
+                    "candidates_requested": n_candidates,
+                    "candidates_scanned": scanned,
+                    "returned": len(processed_results),
+                    "filters": where is not None or where_document is not None,
+                    "rerank_time": rerank_time
+                },
+                "search_time": round(search_time, 4)
             }
+            if cache_key is not None:
+                self.search_cache.set(cache_key, copy.deepcopy(response))
+            SEARCHES.labels(mode, "false").inc()
+            return {**response, "cached": False}
 
         except Exception as e:
             logger.error(f"Erreur lors de la recherche: {str(e)}")
             raise
 
-# Instance unique pour l'application
-db_manager = ChromaDBManager()
\ No newline at end of file
+    async def search_documents_batch(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        filters: Optional[Dict] = None,
+        where_document: Optional[Dict] = None,
+        min_relevance_score: float = 0.7
+    ) -> Dict:
+        """
+        Recherche vectorielle de plusieurs requêtes à la fois : un seul appel au
+        moteur d'embedding et une seule requête à l'index (un parcours de
+        l'index int8, ou une requête ChromaDB à plusieurs embeddings) pour le lot.
+        """
+        try:
+            start_time = time.perf_counter()
+            where = self.build_where(filters)
+            with track_stage("query_embedding", items=len(queries)):
+                embeddings = await asyncio.to_thread(self.embedder.embed, list(queries))
+            vector_results = await asyncio.to_thread(
+                self._vector_query, embeddings, n_results, where, where_document, ["documents", "metadatas"]
+            )
+
+            results = []
+            for query, ids, documents, metadatas, distances in zip(
+                queries,
+                vector_results["ids"],
+                vector_results["documents"],
+                vector_results["metadatas"],
+                vector_results["distances"]
+            ):
+                hits = []
+                for chunk_id, doc, meta, distance in zip(ids, documents, metadatas, distances):
+                    similarity_score = 1 - (distance / 2)
+                    if similarity_score >= min_relevance_score:
+                        hits.append({
+                            "id": chunk_id,
+                            "content": doc,
+                            "metadata": meta,
+                            "relevance_score": round(similarity_score, 3)
+                        })
+                results.append({"query": query, "results": hits})
+
+            SEARCHES.labels("vector", "false").inc(len(queries))
+            return {
+                "status": "success",
+                "mode": "vector",
+                "index": "int8" if self.vector_index is not None else "hnsw",
+                "results": results,
+                "search_time": round(time.perf_counter() - start_time, 4)
+            }
+
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche par lot ({len(queries)} requêtes): {str(e)}")
+            raise
+
+# Instance unique pour l'application, créée au premier usage : importer le module
+# n'ouvre pas la base
+_db_manager: Optional[ChromaDBManager] = None
+_db_manager_lock = threading.Lock()
+
+
+def get_db_manager() -> ChromaDBManager:
+    global _db_manager
+    with _db_manager_lock:
+        if _db_manager is None:
+            _db_manager = ChromaDBManager()
+        return _db_manager
@@ -0,0 +1,106 @@
+"""
+Création du client ChromaDB.
+
+CHROMA_MODE :
+- "embedded" (défaut) : base locale (PersistentClient, CHROMA_PATH), réservée
+  à un seul processus : l'API doit alors tourner avec un seul worker ;
+- "http" : serveur ChromaDB distant (CHROMADB_HOST, CHROMADB_PORT), partagé
+  par autant de workers uvicorn que nécessaire.
+
+En mode http, les requêtes passent par une session dont le pool de
+connexions keep-alive est dimensionné pour les threads qui appellent
+ChromaDB (asyncio.to_thread), avec un délai maximal par requête et des
+reprises avec délai exponentiel sur erreur de connexion ou 502/503/504.
+"""
+from typing import Optional
+import logging
+import os
+import time
+
+import chromadb
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+CHROMA_MODES = ("embedded", "http")
+
+
+class TimeoutSession(requests.Session):
+    """Session requests avec un délai par défaut (le client ChromaDB n'en fixe aucun)"""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_http_session(
+    pool_size: int = 32,
+    timeout: float = 30.0,
+    retries: int = 3,
+    backoff: float = 0.5
+) -> requests.Session:
+    session = TimeoutSession(timeout)
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            # Écritures rejouables : ChromaDB ignore un identifiant déjà ajouté, upsert et delete sont idempotents
+            allowed_methods=None,
+            raise_on_status=False
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def create_chroma_client(mode: Optional[str] = None):
+    """Client ChromaDB configuré par CHROMA_MODE et les variables CHROMA_* / CHROMADB_*"""
+    mode = mode or os.getenv("CHROMA_MODE", "embedded")
+    if mode == "embedded":
+        return chromadb.PersistentClient(path=os.getenv("CHROMA_PATH", "/chroma/chroma"))
+    if mode != "http":
+        raise ValueError(f"Mode ChromaDB inconnu: {mode} (attendu : {', '.join(CHROMA_MODES)})")
+
+    host = os.getenv("CHROMADB_HOST", "localhost")
+    port = os.getenv("CHROMADB_PORT", "8000")
+    ssl = os.getenv("CHROMADB_SSL", "false").lower() == "true"
+    retries = int(os.getenv("CHROMA_HTTP_RETRIES", "3"))
+    backoff = float(os.getenv("CHROMA_HTTP_BACKOFF", "0.5"))
+
+    # Le serveur peut démarrer après l'API (docker-compose) : connexion reprise avec délai exponentiel
+    for attempt in range(retries + 1):
+        try:
+            client = chromadb.HttpClient(host=host, port=port, ssl=ssl)
+            break
+        except Exception as e:
+            if attempt == retries:
+                logger.error(f"Serveur ChromaDB injoignable ({host}:{port}): {str(e)}")
+                raise
+            delay = backoff * 2 ** attempt
+            logger.warning(f"Serveur ChromaDB injoignable ({host}:{port}), nouvel essai dans {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+
+    session = create_http_session(
+        pool_size=int(os.getenv("CHROMA_HTTP_POOL_SIZE", "32")),
+        timeout=float(os.getenv("CHROMA_HTTP_TIMEOUT", "30")),
+        retries=retries,
+        backoff=backoff
+    )
+    server = client._server
+    # Avec une authentification, la session appartient à l'adaptateur d'authentification : elle est conservée
+    if type(server._session) is requests.Session:
+        session.headers.update(server._session.headers)
+        server._session.close()
+        server._session = session
+    logger.info(f"Client ChromaDB HTTP connecté à {host}:{port}")
+    return client
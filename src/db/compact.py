@@ -0,0 +1,207 @@
+"""
+Compaction des collections existantes.
+
+Les anciennes versions de l'ingestion copiaient l'analyse IA (et le nombre de
+chunks) dans les métadonnées de chaque chunk. Cet outil déplace ces données
+dans le stockage des documents, réécrit les chunks sans elles (en réutilisant
+leurs embeddings, sans nouveau calcul) et affiche un rapport des gains.
+
+ChromaDB fusionne les métadonnées lors d'une mise à jour : retirer des clés
+impose de supprimer puis réinsérer les chunks. Chaque lot réécrit est d'abord
+enregistré dans un journal (COMPACT_JOURNAL_PATH) : si la compaction est
+interrompue entre la suppression et la réinsertion, le lot est rejoué au
+lancement suivant.
+
+Usage :
+    python -m src.db.compact --dry-run
+    python -m src.db.compact
+"""
+import argparse
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.db.chroma import get_db_manager
+from src.db.document_store import get_document_store
+
+logger = logging.getLogger(__name__)
+
+# Données de niveau document qui n'ont plus leur place dans les chunks
+DOCUMENT_LEVEL_KEYS = ("ai_analysis", "chunks_count", "total_chunks")
+
+
+def _doc_id_of(chunk_id: str, metadata: Dict) -> str:
+    return metadata.get("doc_id") or chunk_id.rsplit("_chunk_", 1)[0]
+
+
+def _hit_size(content: str, metadata: Dict) -> int:
+    """Taille JSON d'un résultat de recherche tel que renvoyé au client"""
+    return len(json.dumps({"content": content, "metadata": metadata, "relevance_score": 1.0}))
+
+
+def default_journal_path() -> str:
+    return os.getenv("COMPACT_JOURNAL_PATH", os.path.join(os.getenv("DATA_DIR", "/app/data"), "compact.journal.json"))
+
+
+def _write_journal(path: str, batch: Dict):
+    """Écriture atomique et durable du lot en cours de réécriture"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(batch, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _rewrite(collection, batch: Dict):
+    collection.delete(ids=batch["ids"])
+    collection.add(
+        ids=batch["ids"],
+        embeddings=batch["embeddings"],
+        documents=batch["documents"],
+        metadatas=batch["metadatas"]
+    )
+
+
+def replay_journal(collection, journal_path: str) -> int:
+    """Termine la réécriture d'un lot interrompue ; renvoie le nombre de chunks rejoués"""
+    if not os.path.exists(journal_path):
+        return 0
+    with open(journal_path) as f:
+        batch = json.load(f)
+    _rewrite(collection, batch)
+    os.remove(journal_path)
+    logger.warning(f"Compaction interrompue : {len(batch['ids'])} chunks réécrits depuis le journal")
+    return len(batch["ids"])
+
+
+def compact_collection(
+    collection,
+    store,
+    page_size: int = 256,
+    dry_run: bool = False,
+    journal_path: Optional[str] = None
+) -> Dict:
+    journal_path = journal_path or default_journal_path()
+    report = {
+        "chunks_scanned": 0,
+        "chunks_compacted": 0,
+        "documents_recorded": 0,
+        "metadata_bytes_before": 0,
+        "metadata_bytes_after": 0,
+        "hit_bytes_before": 0,
+        "hit_bytes_after": 0,
+        "chunks_replayed": 0
+    }
+    if not dry_run:
+        report["chunks_replayed"] = replay_journal(collection, journal_path)
+    to_compact: List[str] = []
+    recorded = set()
+
+    # 1re passe : métadonnées et contenus (sans embeddings), pour repérer les chunks
+    # à compacter et mesurer la taille des résultats de recherche
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas", "documents"], limit=page_size, offset=offset)
+        for chunk_id, content, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            compacted = {key: value for key, value in metadata.items() if key not in DOCUMENT_LEVEL_KEYS}
+            report["chunks_scanned"] += 1
+            report["metadata_bytes_before"] += len(json.dumps(metadata))
+            report["metadata_bytes_after"] += len(json.dumps(compacted))
+            report["hit_bytes_before"] += _hit_size(content, metadata)
+            report["hit_bytes_after"] += _hit_size(content, compacted)
+
+            if len(compacted) == len(metadata):
+                continue
+            to_compact.append(chunk_id)
+
+            doc_id = _doc_id_of(chunk_id, metadata)
+            if doc_id not in recorded:
+                recorded.add(doc_id)
+                if not dry_run:
+                    store.upsert(
+                        doc_id,
+                        metadata={
+                            key: value for key, value in compacted.items()
+                            if key not in ("doc_id", "chunk_index", "content_hash", "date_added", "version", "processed")
+                        },
+                        analysis=metadata.get("ai_analysis"),
+                        chunks_count=metadata.get("chunks_count", metadata.get("total_chunks")),
+                        processing_info={"migrated_from_chunk_metadata": True}
+                    )
+
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+
+    report["chunks_compacted"] = len(to_compact)
+    report["documents_recorded"] = len(recorded)
+    if dry_run:
+        return report
+
+    # 2e passe : réécriture par lots avec les embeddings existants
+    for start in range(0, len(to_compact), page_size):
+        batch = collection.get(
+            ids=to_compact[start:start + page_size],
+            include=["embeddings", "documents", "metadatas"]
+        )
+        rewritten = {
+            "ids": batch["ids"],
+            "embeddings": np.asarray(batch["embeddings"], dtype=np.float32).tolist(),
+            "documents": batch["documents"],
+            "metadatas": [
+                {**{key: value for key, value in metadata.items() if key not in DOCUMENT_LEVEL_KEYS},
+                 "doc_id": _doc_id_of(chunk_id, metadata)}
+                for chunk_id, metadata in zip(batch["ids"], batch["metadatas"])
+            ]
+        }
+        # La mise à jour de Chroma fusionne les métadonnées : il faut supprimer
+        # puis réinsérer pour retirer des clés, le lot étant journalisé au préalable
+        _write_journal(journal_path, rewritten)
+        _rewrite(collection, rewritten)
+        os.remove(journal_path)
+        logger.info(f"{start + len(batch['ids'])}/{len(to_compact)} chunks compactés")
+
+    return report
+
+
+def print_report(report: Dict, dry_run: bool):
+    scanned = report["chunks_scanned"] or 1
+    saved = report["metadata_bytes_before"] - report["metadata_bytes_after"]
+    print("Simulation (aucune écriture)" if dry_run else "Compaction terminée")
+    print(f"- Chunks analysés : {report['chunks_scanned']}")
+    print(f"- Chunks compactés : {report['chunks_compacted']}")
+    print(f"- Documents enregistrés : {report['documents_recorded']}")
+    if report["chunks_replayed"]:
+        print(f"- Chunks rejoués depuis le journal : {report['chunks_replayed']}")
+    print(
+        f"- Métadonnées : {report['metadata_bytes_before'] / 1024:.1f} Ko -> "
+        f"{report['metadata_bytes_after'] / 1024:.1f} Ko ({saved / 1024:.1f} Ko économisés)"
+    )
+    print(
+        f"- Taille moyenne d'un résultat de recherche : {report['hit_bytes_before'] / scanned:.0f} o -> "
+        f"{report['hit_bytes_after'] / scanned:.0f} o"
+    )
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Affiche le rapport sans rien modifier")
+    parser.add_argument("--page-size", type=int, default=256)
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    report = compact_collection(db_manager.collection, get_document_store(), args.page_size, args.dry_run)
+    if not args.dry_run:
+        # Invalide les résultats de recherche mis en cache par l'API
+        db_manager.generation.bump()
+    print_report(report, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentStore:
+    """
+    Stockage des données propres à un document (analyse IA, nombre de chunks,
+    informations de traitement), enregistrées une seule fois par doc_id.
+    Les chunks de ChromaDB n'en gardent que la référence (leur doc_id).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        data_dir = os.getenv("DATA_DIR", "/app/data")
+        self.path = path or os.getenv("DOCUMENT_STORE_PATH", os.path.join(data_dir, "documents.sqlite3"))
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    metadata TEXT NOT NULL DEFAULT '{}',
+                    analysis TEXT,
+                    chunks_count INTEGER NOT NULL DEFAULT 0,
+                    processing_info TEXT NOT NULL DEFAULT '{}',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )"""
+            )
+            self._conn.commit()
+            logger.info(f"Stockage des documents initialisé ({self.path})")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'initialisation du stockage des documents: {str(e)}")
+            raise
+
+    def upsert(
+        self,
+        doc_id: str,
+        metadata: Optional[Dict] = None,
+        analysis: Optional[str] = None,
+        chunks_count: Optional[int] = None,
+        processing_info: Optional[Dict] = None
+    ) -> Dict:
+        """Crée ou met à jour l'enregistrement d'un document ; les champs à None sont conservés"""
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            current = self._get(doc_id)
+            record = {
+                "doc_id": doc_id,
+                "metadata": metadata if metadata is not None else current.get("metadata", {}),
+                "analysis": analysis if analysis is not None else current.get("analysis"),
+                "chunks_count": chunks_count if chunks_count is not None else current.get("chunks_count", 0),
+                "processing_info": processing_info if processing_info is not None else current.get("processing_info", {}),
+                "created_at": current.get("created_at", now),
+                "updated_at": now
+            }
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(doc_id, metadata, analysis, chunks_count, processing_info, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    doc_id,
+                    json.dumps(record["metadata"]),
+                    record["analysis"],
+                    record["chunks_count"],
+                    json.dumps(record["processing_info"]),
+                    record["created_at"],
+                    record["updated_at"]
+                )
+            )
+            self._conn.commit()
+            return record
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._get(doc_id) or None
+
+    def get_many(self, doc_ids: List[str]) -> Dict[str, Dict]:
+        with self._lock:
+            return {doc_id: record for doc_id in doc_ids if (record := self._get(doc_id))}
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount
+            self._conn.commit()
+            return bool(deleted)
+
+    def _get(self, doc_id: str) -> Dict:
+        row = self._conn.execute(
+            "SELECT doc_id, metadata, analysis, chunks_count, processing_info, created_at, updated_at "
+            "FROM documents WHERE doc_id = ?",
+            (doc_id,)
+        ).fetchone()
+        if row is None:
+            return {}
+        return {
+            "doc_id": row[0],
+            "metadata": json.loads(row[1]),
+            "analysis": row[2],
+            "chunks_count": row[3],
+            "processing_info": json.loads(row[4]),
+            "created_at": row[5],
+            "updated_at": row[6]
+        }
+
+# Instance unique pour l'application, créée au premier usage
+_document_store: Optional[DocumentStore] = None
+_document_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    global _document_store
+    with _document_store_lock:
+        if _document_store is None:
+            _document_store = DocumentStore()
+        return _document_store
+
@@ -0,0 +1,272 @@
+"""
+Calcul explicite des embeddings, utilisé par ChromaDBManager à l'ingestion
+comme à la recherche.
+
+Backends (EMBEDDING_BACKEND) :
+- "onnx" (défaut) : all-MiniLM-L6-v2 en ONNX, le modèle par défaut de
+  ChromaDB (mêmes vecteurs, collections existantes compatibles), avec un
+  padding limité au texte le plus long du lot au lieu de 256 tokens ;
+- "sentence-transformers" : modèle EMBEDDING_MODEL (dépendance optionnelle) ;
+- "hashing" : embedding déterministe par hachage des tokens, sans modèle ni
+  réseau, pour les tests et les benchmarks.
+
+Changer de backend change l'espace des vecteurs : la collection doit alors
+être recréée.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.db.bm25 import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine:
+    """
+    Découpe les textes en lots et les encode, éventuellement en parallèle
+    dans un pool de threads (ONNX Runtime et PyTorch libèrent le GIL).
+    Les textes sont triés par longueur pour que chaque lot soit homogène.
+    """
+    name = "base"
+    dimension = 0
+
+    def __init__(self, batch_size: int = 64, threads: int = 1):
+        self.batch_size = batch_size
+        self.threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats_lock = threading.Lock()
+        self._texts = 0
+        self._batches = 0
+        self._duration = 0.0
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Renvoie une matrice float32 (len(texts), dimension) de vecteurs normalisés"""
+        raise NotImplementedError
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="embedding")
+        return self._executor
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        start_time = time.perf_counter()
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        batches = [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+        def run(indices: np.ndarray) -> np.ndarray:
+            return self._embed_batch([texts[index] for index in indices])
+
+        if self.threads > 1 and len(batches) > 1:
+            results = list(self._get_executor().map(run, batches))
+        else:
+            results = [run(indices) for indices in batches]
+
+        embeddings = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for indices, result in zip(batches, results):
+            embeddings[indices] = result
+
+        with self._stats_lock:
+            self._texts += len(texts)
+            self._batches += len(batches)
+            self._duration += time.perf_counter() - start_time
+        return embeddings
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "backend": self.name,
+                "dimension": self.dimension,
+                "batch_size": self.batch_size,
+                "threads": self.threads,
+                "texts": self._texts,
+                "batches": self._batches,
+                "duration": round(self._duration, 4),
+                "texts_per_second": round(self._texts / self._duration, 1) if self._duration else 0.0
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1e-12
+    return (vectors / norms).astype(np.float32)
+
+
+@lru_cache(maxsize=100_000)
+def _feature(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder(EmbeddingEngine):
+    """
+    Hachage des tokens et des paires de tokens consécutifs dans `dimension`
+    composantes signées. Déterministe d'un processus à l'autre ; les textes
+    qui partagent du vocabulaire sont proches en cosinus.
+    """
+    name = "hashing"
+
+    def __init__(self, dimension: int = 384, batch_size: int = 256, threads: int = 1):
+        super().__init__(batch_size=batch_size, threads=threads)
+        self.dimension = dimension
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        rows, features = [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            bigrams = [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+            for token in tokens + bigrams:
+                rows.append(row)
+                features.append(_feature(token))
+
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if features:
+            features = np.array(features, dtype=np.uint64)
+            columns = (features % np.uint64(self.dimension)).astype(np.int64)
+            signs = np.where((features >> np.uint64(63)) == 1, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors, (np.array(rows), columns), signs)
+        return _normalize(vectors)
+
+
+class OnnxEmbedder(EmbeddingEngine):
+    """all-MiniLM-L6-v2 exécuté avec ONNX Runtime (modèle téléchargé par ChromaDB)"""
+    name = "onnx"
+    dimension = 384
+    max_length = 256
+
+    def __init__(self, batch_size: int = 64, threads: int = 1, intra_op_threads: int = 0):
+        super().__init__(batch_size=batch_size, threads=threads)
+        self.intra_op_threads = intra_op_threads
+        self._session = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+            from tokenizers import Tokenizer
+
+            # Téléchargement et emplacement du modèle : ceux de ChromaDB
+            model = ONNXMiniLM_L6_V2()
+            model._download_model_if_not_exists()
+            model_dir = os.path.join(model.DOWNLOAD_PATH, model.EXTRACTED_FOLDER_NAME)
+
+            tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            # Padding à la longueur du plus long texte du lot
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+            options = onnxruntime.SessionOptions()
+            if self.intra_op_threads:
+                options.intra_op_num_threads = self.intra_op_threads
+            self._session = onnxruntime.InferenceSession(
+                os.path.join(model_dir, "model.onnx"),
+                sess_options=options,
+                providers=onnxruntime.get_available_providers()
+            )
+            self._tokenizer = tokenizer
+            logger.info(f"Modèle d'embedding ONNX chargé ({self.threads} threads, lots de {self.batch_size})")
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        if self._session is None:
+            self._load()
+        encoded = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([item.ids for item in encoded], dtype=np.int64)
+        attention_mask = np.array([item.attention_mask for item in encoded], dtype=np.int64)
+        last_hidden_state = self._session.run(None, {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids)
+        })[0]
+        # Moyenne des tokens pondérée par le masque d'attention
+        mask = attention_mask[:, :, np.newaxis].astype(np.float32)
+        embeddings = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return _normalize(embeddings)
+
+
+class SentenceTransformerEmbedder(EmbeddingEngine):
+    """Modèle sentence-transformers (pip install sentence-transformers)"""
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str, batch_size: int = 64, threads: int = 1, device: Optional[str] = None):
+        super().__init__(batch_size=batch_size, threads=threads)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "Le backend sentence-transformers nécessite le paquet sentence-transformers"
+            ) from e
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+
+EMBEDDING_BACKENDS = ("onnx", "sentence-transformers", "hashing")
+
+
+def create_embedder(
+    backend: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    threads: Optional[int] = None
+) -> EmbeddingEngine:
+    """Crée le moteur d'embedding configuré par les variables d'environnement EMBEDDING_*"""
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "onnx")
+    batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    threads = threads or int(os.getenv("EMBEDDING_THREADS", "1"))
+
+    if backend == "onnx":
+        return OnnxEmbedder(
+            batch_size=batch_size,
+            threads=threads,
+            intra_op_threads=int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+        )
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(
+            model_name=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+            batch_size=batch_size,
+            threads=threads,
+            device=os.getenv("EMBEDDING_DEVICE") or None
+        )
+    if backend == "hashing":
+        return HashingEmbedder(
+            dimension=int(os.getenv("EMBEDDING_DIMENSION", "384")),
+            batch_size=batch_size,
+            threads=threads
+        )
+    raise ValueError(f"Backend d'embedding inconnu: {backend} (attendu : {', '.join(EMBEDDING_BACKENDS)})")
+
+
+class ChromaEmbeddingFunction:
+    """Adaptateur pour les appels de ChromaDB qui calculent eux-mêmes les embeddings"""
+
+    def __init__(self, engine: EmbeddingEngine):
+        self.engine = engine
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return self.engine.embed(texts).tolist()
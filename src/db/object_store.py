@@ -0,0 +1,210 @@
+"""
+Stockage d'objets des instantanés : système de fichiers local ou service
+compatible S3 (MinIO de docker-compose, AWS S3...).
+
+L'emplacement est une URL :
+- file:///chemin/vers/snapshots (ou un simple chemin) ;
+- s3://bucket/prefixe, avec S3_ENDPOINT_URL pour un service autre qu'AWS et
+  les identifiants habituels (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY).
+"""
+from typing import List, Optional
+from urllib.parse import urlparse
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectStore:
+    """Interface d'un stockage d'objets ; les clés sont des chemins séparés par /"""
+
+    def upload(self, path: str, key: str):
+        raise NotImplementedError
+
+    def download(self, key: str, path: str):
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def get_bytes(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> List[str]:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Chemin d'un objet lisible directement sur disque (projection mémoire sans copie), sinon None"""
+        return None
+
+
+class LocalObjectStore(ObjectStore):
+    """Répertoire local ; chaque objet est écrit dans un fichier temporaire puis renommé"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Clé hors du stockage: {key}")
+        return path
+
+    def _replace(self, key: str, write):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def upload(self, path: str, key: str):
+        self._replace(key, lambda tmp_path: shutil.copyfile(path, tmp_path))
+
+    def download(self, key: str, path: str):
+        shutil.copyfile(self._path(key), path)
+
+    def put_bytes(self, key: str, data: bytes):
+        def write(tmp_path: str):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        self._replace(key, write)
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def list(self, prefix: str = "") -> List[str]:
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            for filename in files:
+                key = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, "/")
+                if key.startswith(prefix) and not key.endswith(".tmp"):
+                    keys.append(key)
+        return sorted(keys)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+class S3ObjectStore(ObjectStore):
+    """
+    Service compatible S3 (pip install boto3). Les gros fichiers sont envoyés
+    et lus en plusieurs parties transférées en parallèle.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        part_size: int = 64 * 1024 * 1024,
+        max_concurrency: int = 8
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError as e:
+            raise ImportError("Le stockage S3 nécessite le paquet boto3") from e
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region or "us-east-1")
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency
+        )
+        self._bucket_checked = False
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _ensure_bucket(self):
+        """Crée le bucket au premier envoi s'il n'existe pas (MinIO démarre sans bucket)"""
+        if self._bucket_checked:
+            return
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchBucket"):
+                raise
+            self.client.create_bucket(Bucket=self.bucket)
+            logger.info(f"Bucket {self.bucket} créé")
+        self._bucket_checked = True
+
+    def upload(self, path: str, key: str):
+        self._ensure_bucket()
+        self.client.upload_file(path, self.bucket, self._key(key), Config=self.transfer_config)
+
+    def download(self, key: str, path: str):
+        self.client.download_file(self.bucket, self._key(key), path, Config=self.transfer_config)
+
+    def put_bytes(self, key: str, data: bytes):
+        self._ensure_bucket()
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get_bytes(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NoSuchBucket"):
+                return False
+            raise
+
+    def list(self, prefix: str = "") -> List[str]:
+        from botocore.exceptions import ClientError
+        keys = []
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        try:
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+                keys.extend(item["Key"][strip:] for item in page.get("Contents", []))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchBucket":
+                return []
+            raise
+        return sorted(keys)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+def create_object_store(url: Optional[str] = None) -> ObjectStore:
+    """Stockage désigné par `url` (par défaut SNAPSHOT_URL, sinon $DATA_DIR/snapshots)"""
+    url = url or os.getenv("SNAPSHOT_URL") or os.path.join(os.getenv("DATA_DIR", "/app/data"), "snapshots")
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3ObjectStore(
+            bucket=parsed.netloc,
+            prefix=parsed.path,
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+            region=os.getenv("S3_REGION") or None,
+            part_size=int(os.getenv("S3_PART_SIZE", str(64 * 1024 * 1024))),
+            max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+        )
+    if parsed.scheme in ("", "file"):
+        return LocalObjectStore(parsed.path if parsed.scheme == "file" else url)
+    raise ValueError(f"Stockage d'objets non pris en charge: {url} (attendu : file:// ou s3://)")
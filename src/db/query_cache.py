@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Cache LRU en mémoire, borné en nombre d'entrées, avec expiration optionnelle"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if self.ttl is None or time.monotonic() - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._entries[key]
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+class CollectionGeneration:
+    """
+    Numéro de génération de la collection, incrémenté à chaque écriture.
+
+    La génération est matérialisée par un fichier remplacé (os.replace) à
+    chaque écriture : tous les processus de l'API la voient changer avec un
+    simple stat, sans lecture ni verrou.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if not os.path.exists(path):
+            self.bump()
+
+    def bump(self):
+        with self._lock:
+            self._local += 1
+        # Nom temporaire unique par appel : les workers d'ingestion écrivent en parallèle
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"updated_at": time.time(), "pid": os.getpid()}, f)
+        os.replace(tmp_path, self.path)
+
+    def current(self) -> Tuple:
+        try:
+            stat = os.stat(self.path)
+            return (self._local, stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return (self._local, None, None)
+
+
+def make_search_key(generation: Tuple, **params) -> str:
+    """Clé de cache d'une recherche : génération de la collection et paramètres normalisés"""
+    return json.dumps([generation, params], sort_keys=True, default=str)
@@ -0,0 +1,119 @@
+"""
+Diversification des résultats de recherche.
+
+Les chunks se chevauchent (chunk_overlap) : une requête remonte souvent
+plusieurs chunks consécutifs du même document, presque identiques. Deux
+étapes, appliquées aux candidats déjà triés par pertinence :
+- regroupement des chunks consécutifs d'un même document (le plus pertinent
+  est gardé, les autres sont listés dans "collapsed_chunks") ;
+- Maximal Marginal Relevance : chaque résultat suivant maximise
+  lambda * pertinence - (1 - lambda) * similarité maximale aux résultats déjà choisis.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def mmr(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Sélection MMR de k indices. Les similarités entre candidats sont
+    calculées en un seul produit matriciel ; chaque itération ne met à jour
+    qu'un vecteur (similarité maximale à la sélection).
+    """
+    count = len(relevance)
+    k = min(k, count)
+    if k <= 0:
+        return []
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1e-12
+    normalized = embeddings / norms
+    similarities = normalized @ normalized.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarities[selected[0]].copy()
+    available = np.ones(count, dtype=bool)
+    available[selected[0]] = False
+
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarities[best], out=max_similarity)
+    return selected
+
+
+def collapse_adjacent_chunks(results: List[Dict]) -> List[Dict]:
+    """
+    Regroupe les chunks consécutifs (chunk_index qui se suivent) d'un même
+    document. `results` est trié par pertinence décroissante ; l'ordre et le
+    représentant (le plus pertinent) de chaque groupe sont conservés.
+    """
+    positions: Dict[tuple, int] = {}
+    for position, result in enumerate(results):
+        metadata = result.get("metadata") or {}
+        if "doc_id" in metadata and "chunk_index" in metadata:
+            positions[(metadata["doc_id"], metadata["chunk_index"])] = position
+
+    # Groupes de chunks consécutifs, par document
+    group_of = list(range(len(results)))
+    for (doc_id, chunk_index), position in sorted(positions.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        previous = positions.get((doc_id, chunk_index - 1))
+        if previous is not None:
+            group_of[position] = group_of[previous]
+
+    def root(position: int) -> int:
+        while group_of[position] != position:
+            position = group_of[position]
+        return position
+
+    members: Dict[int, List[int]] = {}
+    for position in range(len(results)):
+        members.setdefault(root(position), []).append(position)
+
+    collapsed = []
+    for group in members.values():
+        representative = min(group)
+        result = results[representative]
+        if len(group) > 1:
+            result = {
+                **result,
+                "collapsed_chunks": sorted(results[position]["metadata"]["chunk_index"] for position in group)
+            }
+        collapsed.append((representative, result))
+    collapsed.sort(key=lambda item: item[0])
+    return [result for _, result in collapsed]
+
+
+def rerank_results(
+    results: List[Dict],
+    embeddings: Dict[str, np.ndarray],
+    n_results: int,
+    lambda_mult: float = 0.5,
+    relevance_key: str = "rrf_score"
+) -> List[Dict]:
+    """
+    Regroupe les chunks consécutifs puis applique MMR. `embeddings` associe
+    l'identifiant de chaque chunk à son embedding ; les résultats sans
+    embedding passent après ceux qui ont été diversifiés.
+    """
+    results = collapse_adjacent_chunks(results)
+    with_embedding = [result for result in results if result["id"] in embeddings]
+    without_embedding = [result for result in results if result["id"] not in embeddings]
+    if not with_embedding:
+        return results[:n_results]
+
+    relevance = np.array([result[relevance_key] for result in with_embedding], dtype=np.float64)
+    # Pertinence ramenée à [0, 1] pour être comparable aux similarités cosinus
+    if relevance.max() > 0:
+        relevance = relevance / relevance.max()
+    matrix = np.vstack([embeddings[result["id"]] for result in with_embedding]).astype(np.float32)
+    order = mmr(relevance, matrix, n_results, lambda_mult)
+    return ([with_embedding[index] for index in order] + without_embedding)[:n_results]
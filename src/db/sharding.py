@@ -0,0 +1,635 @@
+"""
+Partitionnement de la collection ChromaDB en plusieurs collections (shards).
+
+SHARD_STRATEGY :
+- "none" (défaut) : une seule collection "documents" ;
+- "key" : une collection par valeur de la métadonnée SHARD_KEY (ex. category,
+  tenant) ; les chunks sans cette métadonnée restent dans "documents" ;
+- "hash" : SHARD_COUNT collections, le shard d'un chunk étant déterminé par
+  l'empreinte de son document (tous les chunks d'un document sont ensemble).
+
+ShardedCollection expose l'interface de collection utilisée par le reste du
+code (add, upsert, update, delete, get, query, count). Les écritures sont
+routées shard par shard ; une lecture dont le filtre where fixe la clé de
+partition (ou doc_id en mode hash) n'interroge que les shards concernés, les
+autres sont interrogées en parallèle et leurs résultats fusionnés par tas
+(top-k sur la distance).
+
+Après un changement de stratégie, de clé ou de nombre de shards, les chunks
+existants sont déplacés (avec leurs embeddings, sans nouveau calcul) par :
+    python -m src.db.sharding --stats
+    python -m src.db.sharding --rebalance --dry-run
+    python -m src.db.sharding --rebalance --drop-empty
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+
+from src.monitoring.metrics import SHARD_FANOUT
+
+logger = logging.getLogger(__name__)
+
+SHARD_STRATEGIES = ("none", "key", "hash")
+BASE_COLLECTION = "documents"
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# Champs renvoyés par collection.get / collection.query, en plus des ids
+RESULT_FIELDS = ("embeddings", "metadatas", "documents", "distances")
+DEFAULT_GET_INCLUDE = ["metadatas", "documents"]
+DEFAULT_QUERY_INCLUDE = ["metadatas", "documents", "distances"]
+
+
+def _slug(value: str, max_length: int) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")[:max_length].strip("-")
+
+
+def doc_id_of(chunk_id: str) -> str:
+    """Document d'un chunk d'après son identifiant ({doc_id}_chunk_{empreinte})"""
+    return chunk_id.rsplit("_chunk_", 1)[0]
+
+
+def _constrained_values(where: Optional[Dict], key: str) -> Optional[Set]:
+    """Valeurs possibles de `key` imposées par un filtre where (None si non contrainte)"""
+    if not where:
+        return None
+    if key in where:
+        condition = where[key]
+        if not isinstance(condition, dict):
+            return {condition}
+        if "$eq" in condition:
+            return {condition["$eq"]}
+        if "$in" in condition:
+            return set(condition["$in"])
+        return None
+    if "$and" in where:
+        constrained = [values for values in (_constrained_values(c, key) for c in where["$and"]) if values is not None]
+        return set.intersection(*constrained) if constrained else None
+    if "$or" in where:
+        constrained = [_constrained_values(c, key) for c in where["$or"]]
+        return set.union(*constrained) if all(values is not None for values in constrained) else None
+    return None
+
+
+def _without_key(where: Optional[Dict], key: str) -> Optional[Dict]:
+    """Filtre where privé de ses conditions d'égalité ou d'appartenance sur `key`"""
+    if not where:
+        return where
+    if key in where:
+        condition = where[key]
+        if not isinstance(condition, dict) or set(condition) & {"$eq", "$in"}:
+            return None
+        return where
+    if "$and" in where:
+        remaining = [c for c in (_without_key(c, key) for c in where["$and"]) if c]
+        if not remaining:
+            return None
+        return remaining[0] if len(remaining) == 1 else {"$and": remaining}
+    return where
+
+
+class ShardRouter:
+    """Nommage des shards et routage des chunks et des filtres vers les shards"""
+
+    def __init__(self, strategy: str = "none", key: str = "category", count: int = 4, base: str = BASE_COLLECTION):
+        if strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"Stratégie de partitionnement inconnue: {strategy} (attendu : {', '.join(SHARD_STRATEGIES)})")
+        if strategy == "hash" and count < 1:
+            raise ValueError("SHARD_COUNT doit être au moins 1")
+        self.strategy = strategy
+        self.key = key
+        self.count = count
+        self.base = base
+        # Les noms portent la clé ou le nombre de shards : une nouvelle configuration
+        # écrit dans de nouvelles collections, que le rééquilibrage alimente
+        self._key_prefix = f"{base}_{_slug(key, 16)}_"
+        self._hash_prefix = f"{base}_hash{count}_"
+
+    @property
+    def routes_ids(self) -> bool:
+        """Le shard d'un chunk se déduit-il de son seul identifiant ?"""
+        return self.strategy != "key"
+
+    def static_shards(self) -> List[str]:
+        """Shards toujours présents (les shards par valeur de clé sont créés à la première écriture)"""
+        if self.strategy == "hash":
+            return [f"{self._hash_prefix}{bucket}" for bucket in range(self.count)]
+        return [self.base]
+
+    def key_shard(self, value) -> str:
+        """Collection des chunks dont la clé de partition vaut `value` (nom ChromaDB valide, au plus 63 caractères)"""
+        text = str(value)
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=4).hexdigest()
+        slug = _slug(text, 24)
+        return f"{self._key_prefix}{slug}_{digest}" if slug else f"{self._key_prefix}{digest}"
+
+    def hash_shard(self, doc_id: str) -> str:
+        digest = hashlib.blake2b(str(doc_id).encode("utf-8"), digest_size=8).digest()
+        return f"{self._hash_prefix}{int.from_bytes(digest, 'big') % self.count}"
+
+    def shard_for(self, chunk_id: str, metadata: Optional[Dict]) -> str:
+        if self.strategy == "hash":
+            return self.hash_shard(doc_id_of(chunk_id))
+        if self.strategy == "key":
+            value = (metadata or {}).get(self.key)
+            if value is not None and value != "":
+                return self.key_shard(value)
+        return self.base
+
+    def shards_for_where(self, where: Optional[Dict]) -> Optional[Set[str]]:
+        """Shards pouvant contenir des chunks satisfaisant `where` (None : tous)"""
+        if self.strategy == "none":
+            return {self.base}
+        if self.strategy == "hash":
+            values = _constrained_values(where, "doc_id")
+            return None if values is None else {self.hash_shard(value) for value in values}
+        values = _constrained_values(where, self.key)
+        return None if values is None else {self.shard_for("", {self.key: value}) for value in values}
+
+    def shard_where(self, where: Optional[Dict]) -> Optional[Dict]:
+        """
+        Filtre à transmettre aux shards choisis par shards_for_where : en mode key,
+        la condition sur la clé est vraie pour tout le shard et n'est pas réévaluée
+        par ChromaDB (sauf pour le shard par défaut, qui mélange les chunks sans clé).
+        """
+        if self.strategy != "key":
+            return where
+        values = _constrained_values(where, self.key)
+        # Valeurs non textuelles : 1 et "1" partagent un shard, la condition reste utile
+        if values is None or not all(isinstance(value, str) and value for value in values):
+            return where
+        return _without_key(where, self.key)
+
+    def group_ids(self, ids: Sequence[str]) -> Dict[str, List[str]]:
+        groups: Dict[str, List[str]] = {}
+        for chunk_id in ids:
+            groups.setdefault(self.shard_for(chunk_id, None), []).append(chunk_id)
+        return groups
+
+    def owns(self, name: str) -> bool:
+        """La collection `name` fait-elle partie de la disposition courante ?"""
+        if self.strategy == "hash":
+            return name in self.static_shards()
+        if self.strategy == "key":
+            return name == self.base or name.startswith(self._key_prefix)
+        return name == self.base
+
+
+def create_router() -> ShardRouter:
+    return ShardRouter(
+        strategy=os.getenv("SHARD_STRATEGY", "none"),
+        key=os.getenv("SHARD_KEY", "category"),
+        count=int(os.getenv("SHARD_COUNT", "4"))
+    )
+
+
+def _pick(values: Optional[Sequence], positions: List[int]) -> Optional[List]:
+    return None if values is None else [values[position] for position in positions]
+
+
+def _concat(results: List[Dict], include: List[str]) -> Dict:
+    merged = {"ids": [], **{field: [] if field in include else None for field in RESULT_FIELDS}}
+    for result in results:
+        merged["ids"].extend(result["ids"])
+        for field in include:
+            merged[field].extend(result[field])
+    return merged
+
+
+class ShardedCollection:
+    """
+    Ensemble de collections ChromaDB présenté comme une seule collection.
+
+    `version` renvoie une valeur qui change à chaque écriture (génération de
+    la collection) : les shards créés par d'autres processus sont alors
+    redécouverts avant la lecture suivante, et les tailles de shard mémorisées
+    pour la pagination sont oubliées.
+    """
+
+    def __init__(
+        self,
+        client,
+        router: ShardRouter,
+        embedding_function=None,
+        version: Optional[Callable[[], object]] = None,
+        fanout_threads: Optional[int] = None
+    ):
+        self.client = client
+        self.router = router
+        self.name = router.base
+        self.embedding_function = embedding_function
+        self._version = version
+        self._seen_version = version() if version is not None else None
+        self._collections: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        # Nombre de chunks de chaque shard satisfaisant un filtre, pour la génération _sizes_version
+        self._sizes: Dict[tuple, int] = {}
+        self._sizes_version = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=fanout_threads or int(os.getenv("SHARD_FANOUT_THREADS", "8")),
+            thread_name_prefix="shard-fanout"
+        )
+        for name in router.static_shards():
+            self._collection(name)
+        if router.strategy == "key":
+            self._refresh()
+
+    # Shards connus
+
+    def _collection(self, name: str):
+        """Collection d'un shard, créée au besoin"""
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = self.client.get_or_create_collection(
+                        name=name,
+                        metadata=COLLECTION_METADATA,
+                        embedding_function=self.embedding_function
+                    )
+                    self._collections[name] = collection
+        return collection
+
+    def _refresh(self):
+        """Redécouvre les shards par valeur de clé (créés ou supprimés par un autre processus)"""
+        names = {collection.name for collection in self.client.list_collections() if self.router.owns(collection.name)}
+        with self._lock:
+            for name in set(self._collections) - names:
+                del self._collections[name]
+            for name in names - set(self._collections):
+                self._collections[name] = self.client.get_collection(name, embedding_function=self.embedding_function)
+
+    def shards(self) -> Dict[str, object]:
+        if self.router.strategy == "key" and self._version is not None:
+            version = self._version()
+            if version != self._seen_version:
+                self._seen_version = version
+                self._refresh()
+        with self._lock:
+            return dict(sorted(self._collections.items()))
+
+    def _read_targets(self, where: Optional[Dict], operation: str) -> List:
+        known = self.shards()
+        names = self.router.shards_for_where(where)
+        targets = list(known.values()) if names is None else [known[name] for name in sorted(names) if name in known]
+        SHARD_FANOUT.labels(operation).observe(len(targets))
+        return targets
+
+    def _fan_out(self, function: Callable, items: Iterable) -> List:
+        """Applique `function` à chaque élément, en parallèle s'il y en a plusieurs"""
+        items = list(items)
+        if len(items) <= 1:
+            return [function(item) for item in items]
+        return list(self._executor.map(function, items))
+
+    # Écritures
+
+    def _write(self, method: str, ids: List[str], embeddings=None, metadatas=None, documents=None):
+        targets = [
+            self.router.shard_for(chunk_id, metadatas[position] if metadatas is not None else None)
+            for position, chunk_id in enumerate(ids)
+        ]
+        # En mode key, un identifiant existant peut être rangé sous une autre valeur de la clé
+        stale: Dict[str, List[str]] = {}
+        skipped: Set[int] = set()
+        if not self.router.routes_ids:
+            locations = self._locate(ids)
+            for position, chunk_id in enumerate(ids):
+                source = locations.get(chunk_id)
+                if source is None or source == targets[position]:
+                    continue
+                if method == "add":
+                    # Même sémantique que ChromaDB : un identifiant existant n'est pas réécrit
+                    skipped.add(position)
+                else:
+                    stale.setdefault(source, []).append(chunk_id)
+            if skipped:
+                logger.warning(f"{len(skipped)} identifiants existants ignorés par add")
+
+        groups: Dict[str, List[int]] = {}
+        for position, name in enumerate(targets):
+            if position not in skipped:
+                groups.setdefault(name, []).append(position)
+
+        def write(group):
+            name, positions = group
+            getattr(self._collection(name), method)(
+                ids=_pick(ids, positions),
+                embeddings=_pick(embeddings, positions),
+                metadatas=_pick(metadatas, positions),
+                documents=_pick(documents, positions)
+            )
+
+        SHARD_FANOUT.labels(method).observe(len(groups))
+        self._fan_out(write, groups.items())
+        # Anciennes copies supprimées après l'écriture des nouvelles, comme dans update
+        self._fan_out(lambda item: self._collection(item[0]).delete(ids=item[1]), stale.items())
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("add", list(ids), embeddings, metadatas, documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("upsert", list(ids), embeddings, metadatas, documents)
+
+    def _locate(self, ids: List[str]) -> Dict[str, str]:
+        """Shard de chaque identifiant existant"""
+        if self.router.routes_ids:
+            return {chunk_id: name for name, group in self.router.group_ids(ids).items() for chunk_id in group}
+        shards = self.shards()
+        found = self._fan_out(
+            lambda item: (item[0], item[1].get(ids=ids, include=[])["ids"]),
+            shards.items()
+        )
+        return {chunk_id: name for name, chunk_ids in found for chunk_id in chunk_ids}
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None):
+        """
+        Mise à jour en place ; en mode key, un chunk dont la valeur de la clé
+        change est déplacé (avec son embedding) vers son nouveau shard.
+        """
+        ids = list(ids)
+        locations = self._locate(ids)
+        in_place: Dict[str, List[int]] = {}
+        moves: Dict[str, List[int]] = {}
+        for position, chunk_id in enumerate(ids):
+            source = locations.get(chunk_id)
+            if source is None:
+                continue
+            metadata = metadatas[position] if metadatas is not None else None
+            target = source
+            if self.router.strategy == "key" and metadata and self.router.key in metadata:
+                target = self.router.shard_for(chunk_id, metadata)
+            (in_place if target == source else moves).setdefault(source, []).append(position)
+
+        for name, positions in in_place.items():
+            self._collection(name).update(
+                ids=_pick(ids, positions),
+                embeddings=_pick(embeddings, positions),
+                metadatas=_pick(metadatas, positions),
+                documents=_pick(documents, positions)
+            )
+
+        for name, positions in moves.items():
+            source = self._collection(name)
+            stored = source.get(ids=_pick(ids, positions), include=["embeddings", "metadatas", "documents"])
+            by_id = {
+                chunk_id: (embedding, metadata, document)
+                for chunk_id, embedding, metadata, document in zip(
+                    stored["ids"], stored["embeddings"], stored["metadatas"], stored["documents"]
+                )
+            }
+            moved_ids, moved_embeddings, moved_metadatas, moved_documents = [], [], [], []
+            for position in positions:
+                embedding, metadata, document = by_id[ids[position]]
+                moved_ids.append(ids[position])
+                moved_embeddings.append(embeddings[position] if embeddings is not None else embedding)
+                # ChromaDB fusionne les métadonnées lors d'une mise à jour : même sémantique ici
+                moved_metadatas.append({**(metadata or {}), **metadatas[position]})
+                moved_documents.append(documents[position] if documents is not None else document)
+            self._write("upsert", moved_ids, moved_embeddings, moved_metadatas, moved_documents)
+            source.delete(ids=moved_ids)
+
+    def delete(self, ids=None, where=None, where_document=None):
+        if ids is not None and self.router.routes_ids:
+            targets = [(self._collection(name), group) for name, group in self.router.group_ids(list(ids)).items()]
+            SHARD_FANOUT.labels("delete").observe(len(targets))
+        else:
+            targets = [(collection, ids) for collection in self._read_targets(where, "delete")]
+        where = self.router.shard_where(where)
+        self._fan_out(
+            lambda target: target[0].delete(ids=target[1], where=where, where_document=where_document),
+            targets
+        )
+
+    # Lectures
+
+    def count(self) -> int:
+        return sum(self._fan_out(lambda collection: collection.count(), self.shards().values()))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, where_document=None, include=None) -> Dict:
+        """
+        Lecture sur les shards concernés. Avec limit/offset, la pagination est
+        globale : les shards sont parcourus dans l'ordre de leur nom, et seules
+        les pages qui recoupent la fenêtre demandée sont lues.
+        """
+        include = list(include) if include is not None else list(DEFAULT_GET_INCLUDE)
+        if isinstance(ids, str):
+            ids = [ids]
+        if ids is not None and self.router.routes_ids:
+            known = self.shards()
+            targets = [
+                (known[name], group) for name, group in sorted(self.router.group_ids(ids).items()) if name in known
+            ]
+            SHARD_FANOUT.labels("get").observe(len(targets))
+        else:
+            targets = [(collection, ids) for collection in self._read_targets(where, "get")]
+        where = self.router.shard_where(where)
+
+        def read(target, limit=None, offset=None, fields=include):
+            collection, shard_ids = target
+            return collection.get(
+                ids=shard_ids, where=where, where_document=where_document,
+                include=fields, limit=limit, offset=offset
+            )
+
+        if (limit is None and offset is None) or len(targets) <= 1:
+            if len(targets) == 1:
+                return read(targets[0], limit, offset)
+            return _concat(self._fan_out(read, targets), include)
+
+        def size(target) -> int:
+            """Nombre de chunks du shard satisfaisant le filtre (sans rien lire d'autre que les ids)"""
+            if ids is None and where is None and where_document is None:
+                return target[0].count()
+            key = (target[0].name, json.dumps([target[1], where, where_document], sort_keys=True, default=str))
+            version = self._version() if self._version is not None else None
+            with self._lock:
+                if version is None or version != self._sizes_version:
+                    self._sizes = {}
+                    self._sizes_version = version
+                cached = self._sizes.get(key)
+            if cached is None:
+                cached = len(read(target, fields=[])["ids"])
+                if version is not None:
+                    with self._lock:
+                        self._sizes[key] = cached
+            return cached
+
+        # Shards lus dans l'ordre : la taille d'un shard n'est calculée (une fois par
+        # génération) que lorsque la fenêtre commence au-delà de ses derniers chunks
+        skip = offset or 0
+        remaining = limit
+        pages = []
+        for target in targets:
+            if remaining is not None and remaining <= 0:
+                break
+            take = remaining
+            if take is None:
+                # ChromaDB refuse un offset sans limit (et limit=0) : le nombre total de chunks du shard la borne
+                take = target[0].count()
+                if not take:
+                    continue
+            page = read(target, take, skip)
+            if page["ids"]:
+                pages.append(page)
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(page["ids"])
+            elif skip:
+                skip = max(0, skip - size(target))
+        return _concat(pages, include)
+
+    def query(
+        self,
+        query_embeddings,
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+        where_document: Optional[Dict] = None,
+        include=None
+    ) -> Dict:
+        """
+        Recherche des n_results plus proches voisins : chaque shard concerné
+        renvoie ses n_results meilleurs candidats (triés par distance), fusionnés
+        par tas en un top-k global.
+        """
+        include = list(include) if include is not None else list(DEFAULT_QUERY_INCLUDE)
+        # Les distances sont nécessaires à la fusion, même si elles ne sont pas demandées
+        fields = [field for field in include if field != "distances"] + ["distances"]
+        targets = self._read_targets(where, "query")
+        where = self.router.shard_where(where)
+        results = self._fan_out(
+            lambda collection: collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                where_document=where_document,
+                include=fields
+            ),
+            targets
+        )
+
+        merged = {"ids": [], **{field: [] if field in include else None for field in RESULT_FIELDS}}
+        for query_index in range(len(query_embeddings)):
+            # Chaque shard renvoie ses candidats triés par distance croissante
+            ranked = heapq.merge(*[
+                [(distance, shard, rank) for rank, distance in enumerate(result["distances"][query_index])]
+                for shard, result in enumerate(results)
+            ])
+            top = list(itertools.islice(ranked, n_results))
+            merged["ids"].append([results[shard]["ids"][query_index][rank] for _, shard, rank in top])
+            for field in include:
+                merged[field].append([results[shard][field][query_index][rank] for _, shard, rank in top])
+        return merged
+
+
+def shard_stats(client, router: ShardRouter) -> List[Dict]:
+    """Nombre de chunks de chaque collection issue de la collection de base"""
+    return [
+        {"collection": collection.name, "chunks": collection.count(), "active": router.owns(collection.name)}
+        for collection in sorted(client.list_collections(), key=lambda collection: collection.name)
+        if collection.name == router.base or collection.name.startswith(f"{router.base}_")
+    ]
+
+
+def rebalance(
+    client,
+    router: ShardRouter,
+    embedding_function=None,
+    page_size: int = 256,
+    dry_run: bool = False,
+    drop_empty: bool = False
+) -> Dict:
+    """
+    Déplace chaque chunk vers le shard que lui attribue `router`, depuis toutes
+    les collections issues de la collection de base (ancienne disposition
+    comprise). Les embeddings sont recopiés, les identifiants conservés (l'index
+    BM25 reste valable).
+    """
+    # Sources listées avant tout déplacement : un shard vide au départ n'est pas relu une fois rempli
+    sources = [stats["collection"] for stats in shard_stats(client, router) if stats["chunks"]]
+    sharded = ShardedCollection(client, router, embedding_function, fanout_threads=1)
+    report = {"chunks_scanned": 0, "chunks_moved": 0, "moves": {}, "dropped": []}
+
+    for source_name in sources:
+        source = client.get_collection(source_name, embedding_function=embedding_function)
+        offset = 0
+        while True:
+            page = source.get(include=["embeddings", "metadatas", "documents"], limit=page_size, offset=offset)
+            report["chunks_scanned"] += len(page["ids"])
+            misplaced = [
+                position for position, (chunk_id, metadata) in enumerate(zip(page["ids"], page["metadatas"]))
+                if router.shard_for(chunk_id, metadata) != source_name
+            ]
+            for position in misplaced:
+                target = router.shard_for(page["ids"][position], page["metadatas"][position])
+                moves = report["moves"].setdefault(source_name, {})
+                moves[target] = moves.get(target, 0) + 1
+            report["chunks_moved"] += len(misplaced)
+
+            if misplaced and not dry_run:
+                moved_ids = _pick(page["ids"], misplaced)
+                sharded.upsert(
+                    ids=moved_ids,
+                    embeddings=_pick(page["embeddings"], misplaced),
+                    metadatas=_pick(page["metadatas"], misplaced),
+                    documents=_pick(page["documents"], misplaced)
+                )
+                source.delete(ids=moved_ids)
+                # Les chunks déplacés ne sont plus dans la source : seuls les restants décalent la page
+                offset += len(page["ids"]) - len(misplaced)
+            else:
+                offset += len(page["ids"])
+            if len(page["ids"]) < page_size:
+                break
+        logger.info(f"Collection {source_name} rééquilibrée")
+
+    if drop_empty and not dry_run:
+        for stats in shard_stats(client, router):
+            if not stats["active"] and stats["chunks"] == 0:
+                client.delete_collection(stats["collection"])
+                report["dropped"].append(stats["collection"])
+    return report
+
+
+def main():
+    from src.db.chroma import get_db_manager
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stats", action="store_true", help="Nombre de chunks par collection")
+    parser.add_argument("--rebalance", action="store_true", help="Déplace les chunks vers leur shard")
+    parser.add_argument("--dry-run", action="store_true", help="Rapport du rééquilibrage sans rien modifier")
+    parser.add_argument("--drop-empty", action="store_true", help="Supprime les collections hors disposition vidées")
+    parser.add_argument("--page-size", type=int, default=256)
+    args = parser.parse_args()
+
+    db_manager = get_db_manager()
+    router = db_manager.shard_router
+    print(f"Stratégie : {router.strategy}" + (f" ({router.key})" if router.strategy == "key" else "")
+          + (f" ({router.count} shards)" if router.strategy == "hash" else ""))
+
+    if args.rebalance:
+        report = rebalance(
+            db_manager.client, router, db_manager.embedding_function,
+            args.page_size, args.dry_run, args.drop_empty
+        )
+        if not args.dry_run:
+            # Invalide les résultats de recherche en cache et signale les nouveaux shards aux autres processus
+            db_manager.generation.bump()
+        print("Simulation (aucune écriture)" if args.dry_run else "Rééquilibrage terminé")
+        print(json.dumps(report, indent=2))
+
+    if args.stats or not args.rebalance:
+        for stats in shard_stats(db_manager.client, router):
+            print(f"- {stats['collection']}: {stats['chunks']} chunks" + ("" if stats["active"] else " (hors disposition)"))
+
+
+if __name__ == "__main__":
+    main()
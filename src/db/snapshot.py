@@ -0,0 +1,260 @@
+"""
+Instantanés de la collection : sauvegarde, réplication et démarrage à chaud.
+
+Un instantané est un répertoire (préfixe) du stockage d'objets :
+- embeddings.npy : matrice float32 (chunks x dimension) au format NumPy,
+  projetable en mémoire (np.load(..., mmap_mode="r")) ;
+- records.parquet : identifiants, contenus et métadonnées (JSON) des chunks,
+  dans le même ordre que les lignes des embeddings, par groupes de lignes ;
+- manifest.json : nombre de chunks, dimension et backend d'embedding,
+  taille et empreinte SHA-256 des fichiers. Il est écrit en dernier : un
+  instantané sans manifeste est incomplet et ignoré.
+
+L'export lit la collection page par page : une seule page est en mémoire.
+L'import recharge les chunks par lots avec leurs embeddings (aucun recalcul),
+index lexical BM25 compris ; les chunks de même identifiant sont remplacés.
+Les stockages SQLite de DATA_DIR (documents, versions, file) ne font pas
+partie de l'instantané.
+
+Usage :
+    python -m src.db.snapshot export [--name NOM] [--url s3://snapshots]
+    python -m src.db.snapshot import NOM [--url s3://snapshots]
+    python -m src.db.snapshot list
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.db.object_store import ObjectStore, create_object_store
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "rag-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.parquet"
+MANIFEST_FILE = "manifest.json"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Les instantanés nécessitent le paquet pyarrow") from e
+    return pyarrow, pyarrow.parquet
+
+
+def _file_digest(path: str) -> Dict:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            digest.update(block)
+    return {"bytes": os.path.getsize(path), "sha256": digest.hexdigest()}
+
+
+def export_snapshot(
+    collection,
+    store: ObjectStore,
+    name: str,
+    embedder_name: str,
+    page_size: int = 1024,
+    tmp_dir: Optional[str] = None
+) -> Dict:
+    """Écrit la collection dans le stockage d'objets sous le préfixe `name`"""
+    pa, pq = _require_pyarrow()
+    start = time.perf_counter()
+    expected = collection.count()
+    schema = pa.schema([("id", pa.string()), ("document", pa.string()), ("metadata", pa.string())])
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+        embeddings_path = os.path.join(work_dir, EMBEDDINGS_FILE)
+        records_path = os.path.join(work_dir, RECORDS_FILE)
+        matrix = None
+        dimension = 0
+        rows = 0
+        with pq.ParquetWriter(records_path, schema, compression="zstd") as writer:
+            # Les écritures concurrentes ne sont pas reflétées au-delà du nombre de chunks initial
+            while rows < expected:
+                page = collection.get(
+                    include=["embeddings", "documents", "metadatas"],
+                    limit=min(page_size, expected - rows),
+                    offset=rows
+                )
+                if not page["ids"]:
+                    break
+                embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                if matrix is None:
+                    dimension = embeddings.shape[1]
+                    matrix = np.lib.format.open_memmap(
+                        embeddings_path, mode="w+", dtype=np.float32, shape=(expected, dimension)
+                    )
+                matrix[rows:rows + len(embeddings)] = embeddings
+                writer.write_table(pa.table(
+                    {
+                        "id": page["ids"],
+                        "document": page["documents"],
+                        "metadata": [json.dumps(metadata or {}, ensure_ascii=False) for metadata in page["metadatas"]]
+                    },
+                    schema=schema
+                ))
+                rows += len(page["ids"])
+                logger.info(f"Instantané {name} : {rows}/{expected} chunks exportés")
+
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(embeddings_path, mode="w+", dtype=np.float32, shape=(0, 0))
+        matrix.flush()
+        del matrix
+        if rows < expected:
+            # Chunks supprimés pendant l'export : la matrice est ramenée au nombre de lignes écrites
+            np.save(embeddings_path + ".npy", np.load(embeddings_path, mmap_mode="r")[:rows])
+            os.replace(embeddings_path + ".npy", embeddings_path)
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "name": name,
+            "created_at": datetime.utcnow().isoformat(),
+            "count": rows,
+            "dimension": dimension,
+            "dtype": "float32",
+            "embedding_backend": embedder_name,
+            "files": {
+                EMBEDDINGS_FILE: _file_digest(embeddings_path),
+                RECORDS_FILE: _file_digest(records_path)
+            }
+        }
+        for filename in (EMBEDDINGS_FILE, RECORDS_FILE):
+            store.upload(os.path.join(work_dir, filename), f"{name}/{filename}")
+        store.put_bytes(f"{name}/{MANIFEST_FILE}", json.dumps(manifest, indent=2).encode("utf-8"))
+
+    manifest["export_time"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Instantané {name} exporté : {rows} chunks en {manifest['export_time']}s")
+    return manifest
+
+
+def read_manifest(store: ObjectStore, name: str) -> Dict:
+    manifest = json.loads(store.get_bytes(f"{name}/{MANIFEST_FILE}"))
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Instantané {name} : format non pris en charge")
+    return manifest
+
+
+def list_snapshots(store: ObjectStore) -> List[Dict]:
+    snapshots = []
+    for key in store.list():
+        if key.endswith(f"/{MANIFEST_FILE}"):
+            manifest = read_manifest(store, key[:-len(MANIFEST_FILE) - 1])
+            snapshots.append({
+                key: manifest[key] for key in ("name", "created_at", "count", "dimension", "embedding_backend")
+            })
+    return snapshots
+
+
+def import_snapshot(
+    db_manager,
+    store: ObjectStore,
+    name: str,
+    batch_size: Optional[int] = None,
+    verify: bool = True,
+    force: bool = False,
+    tmp_dir: Optional[str] = None
+) -> Dict:
+    """
+    Recharge un instantané dans la collection de db_manager. Les embeddings
+    sont lus par projection mémoire, directement dans le stockage local ou
+    après téléchargement (en parallèle, par parties) depuis S3.
+    """
+    _, pq = _require_pyarrow()
+    start = time.perf_counter()
+    manifest = read_manifest(store, name)
+    embedder = db_manager.embedder
+    if not force and (manifest["embedding_backend"] != embedder.name or manifest["dimension"] != embedder.dimension):
+        raise ValueError(
+            f"Instantané {name} créé avec {manifest['embedding_backend']} ({manifest['dimension']} dimensions), "
+            f"backend courant {embedder.name} ({embedder.dimension} dimensions) : utilisez --force pour l'importer"
+        )
+    batch_size = batch_size or db_manager.batch_size
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+        paths = {}
+        for filename in (EMBEDDINGS_FILE, RECORDS_FILE):
+            key = f"{name}/{filename}"
+            path = store.local_path(key)
+            if path is None:
+                path = os.path.join(work_dir, filename)
+                store.download(key, path)
+            if verify and _file_digest(path) != manifest["files"][filename]:
+                raise ValueError(f"Instantané {name} : {filename} corrompu (taille ou empreinte SHA-256)")
+            paths[filename] = path
+        download_time = time.perf_counter() - start
+
+        embeddings = np.load(paths[EMBEDDINGS_FILE], mmap_mode="r")
+        records = pq.ParquetFile(paths[RECORDS_FILE])
+        rows = 0
+        for batch in records.iter_batches(batch_size=batch_size):
+            columns = batch.to_pydict()
+            count = len(columns["id"])
+            db_manager.bulk_load(
+                ids=columns["id"],
+                contents=columns["document"],
+                embeddings=np.asarray(embeddings[rows:rows + count]),
+                metadatas=[json.loads(metadata) for metadata in columns["metadata"]]
+            )
+            rows += count
+            logger.info(f"Instantané {name} : {rows}/{manifest['count']} chunks importés")
+        del embeddings
+
+    if rows != manifest["count"]:
+        raise ValueError(f"Instantané {name} : {rows} chunks lus, {manifest['count']} attendus")
+    total_time = time.perf_counter() - start
+    logger.info(f"Instantané {name} importé : {rows} chunks en {total_time:.1f}s")
+    return {
+        "status": "success",
+        "name": name,
+        "chunks": rows,
+        "download_time": round(download_time, 3),
+        "total_time": round(total_time, 3)
+    }
+
+
+def main():
+    from src.db.chroma import get_db_manager
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import", "list"])
+    parser.add_argument("name", nargs="?", help="Nom de l'instantané (export : horodatage par défaut)")
+    parser.add_argument("--url", help="Stockage d'objets (SNAPSHOT_URL par défaut)")
+    parser.add_argument("--page-size", type=int, default=1024, help="Chunks lus ou écrits par lot")
+    parser.add_argument("--no-verify", action="store_true", help="Import sans contrôle des empreintes")
+    parser.add_argument("--force", action="store_true", help="Import malgré un backend d'embedding différent")
+    args = parser.parse_args()
+
+    store = create_object_store(args.url)
+    if args.command == "list":
+        print(json.dumps(list_snapshots(store), indent=2))
+        return
+
+    db_manager = get_db_manager()
+    if args.command == "export":
+        name = args.name or datetime.utcnow().strftime("snapshot-%Y%m%dT%H%M%SZ")
+        result = export_snapshot(db_manager.collection, store, name, db_manager.embedder.name, args.page_size)
+    else:
+        if not args.name:
+            parser.error("import : nom de l'instantané requis")
+        result = import_snapshot(
+            db_manager, store, args.name, args.page_size, verify=not args.no_verify, force=args.force
+        )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Index vectoriel exact quantifié en int8, stocké sur disque et chargé en
+mémoire mappée : alternative à l'index HNSW de ChromaDB (VECTOR_INDEX=int8).
+
+Les embeddings sont normalisés puis quantifiés ligne par ligne : code int8 =
+arrondi(x / échelle), échelle = max|x| / 127. Une recherche parcourt tous les
+vecteurs visibles par blocs (produit matriciel float32 d'un bloc de codes par
+la matrice des requêtes, puis argpartition), pour plusieurs requêtes à la
+fois : le résultat est exact à la quantification près, sans graphe en mémoire.
+Un vecteur occupe dimension + 4 octets (384 dimensions : ~388 octets, contre
+1536 en float32 plus les liens du graphe HNSW).
+
+Comme l'index BM25, l'index est une suite de segments immuables listés dans
+un manifeste ; une version plus récente d'un chunk (ou sa suppression) masque
+les précédentes, et les segments contigus sont fusionnés quand il y en a trop.
+Un segment contient :
+- codes.npy  : codes int8 (n_chunks x dimension)
+- scales.npy : échelle float32 de chaque ligne (-1 pour une suppression)
+et doc_ids.json, les identifiants des chunks.
+
+Limite : l'index ne remplace HNSW que pour les requêtes. ChromaDB 0.4 ne
+permet pas de désactiver HNSW pour une collection qui stocke des embeddings,
+et ceux-ci restent nécessaires (instantanés, rééquilibrage, compaction,
+reconstruction) : chaque écriture alimente et persiste toujours l'index HNSW,
+chargé en mémoire par le processus qui écrit, et les segments int8 s'ajoutent
+à ses fichiers sur disque.
+
+Reconstruction depuis ChromaDB (embeddings existants, sans recalcul) :
+    python -m src.db.vector_index --rebuild
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_BACKENDS = ("hnsw", "int8")
+
+
+def quantize(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Codes int8 et échelles des embeddings normalisés (similarité cosinus = produit scalaire)"""
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class _Segment:
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        with open(os.path.join(path, "doc_ids.json")) as f:
+            self.doc_ids: List[str] = json.load(f)
+        # Chunks visibles (ni masqués par un segment plus récent, ni supprimés)
+        self.live = np.ones(len(self.doc_ids), dtype=bool)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+
+def _write_segment(path: str, codes: np.ndarray, scales: np.ndarray, doc_ids: List[str]):
+    tmp_path = f"{path}.tmp"
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "codes.npy"), codes)
+    np.save(os.path.join(tmp_path, "scales.npy"), scales)
+    with open(os.path.join(tmp_path, "doc_ids.json"), "w") as f:
+        json.dump(doc_ids, f)
+    os.replace(tmp_path, path)
+
+
+class Int8VectorIndex:
+    def __init__(self, path: str, dimension: int, max_segments: int = 16, block_rows: int = 4096):
+        self.path = path
+        self.dimension = dimension
+        self.max_segments = max_segments
+        # Lignes converties en float32 par produit matriciel : un bloc qui tient dans le cache
+        # du processeur (4096 x 384 x 4 octets = 6 Mo) est plus rapide qu'un grand bloc
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._manifest_mtime = None
+        # Emplacement (segment, rang) de la version visible de chaque chunk
+        self._locations: Dict[str, Tuple[_Segment, int]] = {}
+        os.makedirs(path, exist_ok=True)
+        self._manifest_path = os.path.join(path, "manifest.json")
+        self._lock_path = os.path.join(path, "index.lock")
+        stored = self._read_manifest().get("dimension")
+        if stored is not None and stored != dimension:
+            raise ValueError(
+                f"Index int8 de dimension {stored}, embeddings de dimension {dimension} : "
+                f"reconstruisez-le (python -m src.db.vector_index --rebuild)"
+            )
+        self._reload_if_changed()
+
+    # --- Manifeste et chargement --------------------------------------------
+
+    def _read_manifest(self) -> Dict:
+        if not os.path.exists(self._manifest_path):
+            return {"segments": []}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, segments: List[str]):
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dimension": self.dimension, "segments": segments}, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _reload_if_changed(self):
+        """Recharge les segments si le manifeste a été modifié (éventuellement par un autre processus)"""
+        try:
+            # Le manifeste est remplacé par os.replace : l'inode change à chaque écriture
+            stat = os.stat(self._manifest_path)
+            mtime = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._manifest_mtime:
+            return
+
+        with self._lock:
+            names = self._read_manifest()["segments"]
+            current = [segment.name for segment in self._segments]
+            loaded = {segment.name: segment for segment in self._segments}
+            segments = [loaded.get(name) or _Segment(os.path.join(self.path, name)) for name in names]
+            if names[:len(current)] == current:
+                # Cas courant : de nouveaux segments ont seulement été ajoutés
+                for segment in segments[len(current):]:
+                    self._apply_segment(segment)
+            else:
+                self._locations = {}
+                for segment in segments:
+                    self._apply_segment(segment)
+            self._segments = segments
+            self._manifest_mtime = mtime
+
+    def _apply_segment(self, segment: _Segment):
+        """Rend visibles les chunks d'un segment et masque leurs versions précédentes"""
+        segment.live = np.asarray(segment.scales) >= 0
+        for index, doc_id in enumerate(segment.doc_ids):
+            previous = self._locations.get(doc_id)
+            if previous is not None:
+                previous[0].live[previous[1]] = False
+            if segment.live[index]:
+                self._locations[doc_id] = (segment, index)
+            else:
+                self._locations.pop(doc_id, None)
+
+    # --- Écriture -----------------------------------------------------------
+
+    def add(self, ids: List[str], embeddings: np.ndarray):
+        """Indexe (ou réindexe) des chunks"""
+        if not len(ids):
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Embeddings de dimension {embeddings.shape[1]}, index de dimension {self.dimension}")
+        codes, scales = quantize(embeddings)
+        self._append_segment(codes, scales, list(ids))
+
+    def delete(self, ids: List[str]):
+        """Retire des chunks de l'index (segment de suppressions)"""
+        if ids:
+            self._append_segment(
+                np.zeros((len(ids), self.dimension), dtype=np.int8),
+                np.full(len(ids), -1, dtype=np.float32),
+                list(ids)
+            )
+
+    def _append_segment(self, codes: np.ndarray, scales: np.ndarray, doc_ids: List[str]):
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            name = f"seg_{uuid.uuid4().hex}"
+            _write_segment(os.path.join(self.path, name), codes, scales, doc_ids)
+            segments = self._read_manifest()["segments"] + [name]
+            if len(segments) > self.max_segments:
+                segments = self._merge(segments)
+            self._write_manifest(segments)
+        self._reload_if_changed()
+
+    def _merge(self, names: List[str]) -> List[str]:
+        """
+        Fusionne la fenêtre de segments contigus la plus légère, pour revenir
+        à max_segments / 2 segments. Les segments doivent rester contigus pour
+        que l'ordre des versions d'un chunk soit préservé.
+        """
+        segments = [_Segment(os.path.join(self.path, name)) for name in names]
+        window = len(segments) - max(1, self.max_segments // 2) + 1
+        sizes = [len(segment.doc_ids) for segment in segments]
+        start = min(range(len(segments) - window + 1), key=lambda i: sum(sizes[i:i + window]))
+        merged = segments[start:start + window]
+
+        keeps = []
+        seen = set()
+        # Du plus récent au plus ancien : seule la dernière version de chaque chunk est gardée
+        for segment in reversed(merged):
+            keep = np.zeros(len(segment.doc_ids), dtype=bool)
+            # À l'intérieur d'un segment aussi : un identifiant répété dans un lot est visible à sa dernière occurrence
+            for index in range(len(segment.doc_ids) - 1, -1, -1):
+                doc_id = segment.doc_ids[index]
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                # Les suppressions ne sont utiles que s'il reste des segments plus anciens
+                keep[index] = segment.scales[index] >= 0 or start > 0
+            keeps.append((segment, keep))
+
+        name = f"seg_{uuid.uuid4().hex}"
+        tmp_path = os.path.join(self.path, f"{name}.tmp")
+        os.makedirs(tmp_path)
+        rows = sum(int(keep.sum()) for _, keep in keeps)
+        # Copie segment par segment : les codes fusionnés ne sont jamais entièrement en mémoire
+        codes = np.lib.format.open_memmap(
+            os.path.join(tmp_path, "codes.npy"), mode="w+", dtype=np.int8, shape=(rows, self.dimension)
+        )
+        scales, doc_ids = [], []
+        for segment, keep in keeps:
+            kept = np.flatnonzero(keep)
+            codes[len(doc_ids):len(doc_ids) + len(kept)] = segment.codes[kept]
+            scales.append(np.asarray(segment.scales)[kept])
+            doc_ids.extend(segment.doc_ids[index] for index in kept)
+        codes.flush()
+        del codes
+        np.save(os.path.join(tmp_path, "scales.npy"), np.concatenate(scales).astype(np.float32))
+        with open(os.path.join(tmp_path, "doc_ids.json"), "w") as f:
+            json.dump(doc_ids, f)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        logger.info(f"Index int8 : {window} segments fusionnés ({len(doc_ids)} chunks)")
+
+        # Les anciens segments restent lisibles par les processus qui les ont mappés
+        for segment in merged:
+            shutil.rmtree(os.path.join(self.path, segment.name), ignore_errors=True)
+        return names[:start] + [name] + names[start + window:]
+
+    def clear(self):
+        with open(self._lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            for name in self._read_manifest()["segments"]:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            self._write_manifest([])
+        self._reload_if_changed()
+
+    # --- Lecture ------------------------------------------------------------
+
+    def _blocks(self, segment: _Segment, rows: Optional[np.ndarray]) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(rangs, codes, échelles) des lignes candidates d'un segment, par blocs de block_rows"""
+        if rows is None:
+            for start in range(0, len(segment.doc_ids), self.block_rows):
+                end = min(start + self.block_rows, len(segment.doc_ids))
+                live = segment.live[start:end]
+                if live.all():
+                    yield np.arange(start, end), segment.codes[start:end], segment.scales[start:end]
+                elif live.any():
+                    block_rows = np.arange(start, end)[live]
+                    yield block_rows, segment.codes[block_rows], segment.scales[block_rows]
+        else:
+            # Recherche filtrée : seules les lignes autorisées sont lues
+            for start in range(0, len(rows), self.block_rows):
+                block_rows = rows[start:start + self.block_rows]
+                yield block_rows, segment.codes[block_rows], segment.scales[block_rows]
+
+    def search(self, queries: np.ndarray, k: int, ids: Optional[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        """
+        Renvoie, pour chaque requête (ligne de queries), les k meilleurs
+        (chunk_id, similarité cosinus). Avec ids, seuls ces chunks sont candidats.
+        """
+        self._reload_if_changed()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+
+        with self._lock:
+            segments = list(self._segments)
+            allowed = None
+            if ids is not None:
+                allowed = {segment.name: [] for segment in segments}
+                for doc_id in ids:
+                    location = self._locations.get(doc_id)
+                    if location is not None:
+                        allowed[location[0].name].append(location[1])
+
+        # Candidats de chaque bloc (top-k par requête) : score, segment et rang, en colonnes par requête
+        owners: List[_Segment] = []
+        block_scores, block_owners, block_positions = [], [], []
+        for segment in segments:
+            rows = None
+            if allowed is not None:
+                if not allowed[segment.name]:
+                    continue
+                rows = np.sort(np.array(allowed[segment.name], dtype=np.int64))
+            for block_rows, codes, scales in self._blocks(segment, rows):
+                scores = codes.astype(np.float32) @ queries.T
+                scores *= np.asarray(scales, dtype=np.float32)[:, None]
+                top = min(k, len(block_rows))
+                best = np.argpartition(-scores, top - 1, axis=0)[:top]
+                block_scores.append(np.take_along_axis(scores, best, axis=0))
+                block_owners.append(np.full(best.shape, len(owners)))
+                owners.append(segment)
+                block_positions.append(block_rows[best])
+
+        if not block_scores:
+            return [[] for _ in queries]
+        scores = np.concatenate(block_scores)
+        owner_indexes = np.concatenate(block_owners)
+        positions = np.concatenate(block_positions)
+        results = []
+        for query_index in range(len(queries)):
+            column = scores[:, query_index]
+            top = min(k, len(column))
+            best = np.argpartition(-column, top - 1)[:top]
+            best = best[np.argsort(-column[best])]
+            results.append([
+                (owners[owner_indexes[index, query_index]].doc_ids[positions[index, query_index]], float(column[index]))
+                for index in best
+            ])
+        return results
+
+    def stats(self) -> Dict:
+        self._reload_if_changed()
+        return {
+            "segments": len(self._segments),
+            "live_chunks": len(self._locations),
+            "dimension": self.dimension,
+            "index_bytes": sum(segment.nbytes for segment in self._segments)
+        }
+
+
+def create_vector_index(dimension: int, backend: Optional[str] = None) -> Optional[Int8VectorIndex]:
+    """Index int8 configuré par VECTOR_INDEX et VECTOR_INDEX_* ; None avec l'index HNSW de ChromaDB"""
+    backend = backend or os.getenv("VECTOR_INDEX", "hnsw")
+    if backend not in VECTOR_INDEX_BACKENDS:
+        raise ValueError(f"Index vectoriel inconnu: {backend} (attendu : {', '.join(VECTOR_INDEX_BACKENDS)})")
+    if backend == "hnsw":
+        return None
+    return Int8VectorIndex(
+        path=os.getenv("VECTOR_INDEX_PATH", os.path.join(os.getenv("DATA_DIR", "/app/data"), "int8_index")),
+        dimension=dimension,
+        max_segments=int(os.getenv("VECTOR_INDEX_MAX_SEGMENTS", "16")),
+        block_rows=int(os.getenv("VECTOR_INDEX_BLOCK_ROWS", "4096"))
+    )
+
+
+def rebuild_from_collection(index: Int8VectorIndex, collection, page_size: int = 1000) -> int:
+    """Reconstruit l'index à partir des embeddings stockés dans ChromaDB"""
+    index.clear()
+    offset = 0
+    total = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if page["ids"]:
+            index.add(page["ids"], np.asarray(page["embeddings"], dtype=np.float32))
+        total += len(page["ids"])
+        if len(page["ids"]) < page_size:
+            return total
+        offset += page_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruit l'index depuis ChromaDB")
+    args = parser.parse_args()
+
+    from src.db.chroma import get_db_manager
+
+    db_manager = get_db_manager()
+    # L'index peut être construit avant de passer VECTOR_INDEX à int8
+    index = db_manager.vector_index or create_vector_index(db_manager.embedder.dimension, "int8")
+    if args.rebuild:
+        total = rebuild_from_collection(index, db_manager.collection)
+        db_manager.generation.bump()
+        print(f"{total} chunks indexés")
+    print(json.dumps(index.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import difflib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+
+from src.db.query_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def make_delta(base_lines: List[str], lines: List[str]) -> List:
+    """
+    Delta ligne à ligne de base_lines vers lines : suite de copies [début, fin]
+    de lignes de la version précédente et de lignes insérées (listes de chaînes).
+    """
+    delta = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(lines[j1:j2])
+    return delta
+
+
+def apply_delta(base_lines: List[str], delta: List) -> List[str]:
+    lines = []
+    for operation in delta:
+        if operation and isinstance(operation[0], int):
+            lines.extend(base_lines[operation[0]:operation[1]])
+        else:
+            lines.extend(operation)
+    return lines
+
+
+def _fingerprint(content: str, metadata: Dict) -> Tuple[str, str]:
+    return (
+        hashlib.sha256(content.encode("utf-8")).hexdigest(),
+        json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    )
+
+
+def _pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _unpack(payload: bytes):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class VersionStore:
+    """
+    Historique des versions du contenu de chaque document, en ajout seul.
+
+    Chaque version est stockée compressée, sous forme de delta par rapport à
+    la précédente, sauf une version complète (keyframe) toutes les
+    keyframe_interval versions ou quand le delta n'est pas plus petit : une
+    version historique se reconstruit à partir de la keyframe qui la précède,
+    en au plus keyframe_interval - 1 deltas. La dernière version est aussi
+    gardée complète dans la table heads, lue en une requête.
+    """
+
+    def __init__(self, path: Optional[str] = None, keyframe_interval: Optional[int] = None, cache_entries: Optional[int] = None):
+        data_dir = os.getenv("DATA_DIR", "/app/data")
+        self.path = path or os.getenv("VERSION_STORE_PATH", os.path.join(data_dir, "versions.sqlite3"))
+        self.keyframe_interval = keyframe_interval or int(os.getenv("VERSION_KEYFRAME_INTERVAL", "25"))
+        # Versions historiques reconstruites (immuables, donc jamais invalidées)
+        self.cache = LRUCache(cache_entries or int(os.getenv("VERSION_CACHE_ENTRIES", "64")))
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Transactions explicites : le numéro de version est attribué sous BEGIN IMMEDIATE,
+            # sans collision entre les workers uvicorn
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS versions (
+                    doc_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    is_keyframe INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    metadata TEXT NOT NULL DEFAULT '{}',
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (doc_id, version)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS heads (
+                    doc_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    content BLOB NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    metadata TEXT NOT NULL DEFAULT '{}'
+                )"""
+            )
+            logger.info(f"Historique des versions initialisé ({self.path})")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'initialisation de l'historique des versions: {str(e)}")
+            raise
+
+    def append(self, doc_id: str, content: str, metadata: Optional[Dict] = None) -> Dict:
+        """
+        Enregistre une nouvelle version si le contenu ou les métadonnées ont
+        changé ; sinon renvoie la version courante (unchanged=True).
+        """
+        content_hash, metadata_json = _fingerprint(content, metadata or {})
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                head = self._conn.execute(
+                    "SELECT version, content, content_hash, metadata FROM heads WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                if head is not None and head[2] == content_hash and head[3] == metadata_json:
+                    self._conn.execute("COMMIT")
+                    return {"doc_id": doc_id, "version": head[0], "unchanged": True}
+
+                version = head[0] + 1 if head else 1
+                lines = content.splitlines(keepends=True)
+                full = _pack(lines)
+                payload, is_keyframe = full, True
+                if head is not None and (version - 1) % self.keyframe_interval:
+                    delta = _pack(make_delta(_unpack(head[1]), lines))
+                    if len(delta) < len(full):
+                        payload, is_keyframe = delta, False
+
+                self._conn.execute(
+                    "INSERT INTO versions (doc_id, version, is_keyframe, payload, content_hash, size, metadata, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (doc_id, version, int(is_keyframe), payload, content_hash, len(content),
+                     metadata_json, datetime.utcnow().isoformat())
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO heads (doc_id, version, content, content_hash, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, version, full, content_hash, metadata_json)
+                )
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"Erreur lors de l'enregistrement d'une version de {doc_id}: {str(e)}")
+                raise
+        return {
+            "doc_id": doc_id,
+            "version": version,
+            "unchanged": False,
+            "stored_as": "keyframe" if is_keyframe else "delta",
+            "stored_bytes": len(payload)
+        }
+
+    def peek(self, doc_id: str, content: str, metadata: Optional[Dict] = None) -> Dict:
+        """
+        Comme append, sans rien écrire : version courante (0 si le document
+        n'a pas d'historique) et unchanged si append ne créerait pas de version.
+        """
+        content_hash, metadata_json = _fingerprint(content, metadata or {})
+        with self._lock:
+            head = self._conn.execute(
+                "SELECT version, content_hash, metadata FROM heads WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        if head is None:
+            return {"doc_id": doc_id, "version": 0, "unchanged": False}
+        return {"doc_id": doc_id, "version": head[0], "unchanged": (head[1], head[2]) == (content_hash, metadata_json)}
+
+    def latest(self, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, content, content_hash, metadata FROM heads WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "doc_id": doc_id,
+            "version": row[0],
+            "content": "".join(_unpack(row[1])),
+            "content_hash": row[2],
+            "metadata": json.loads(row[3])
+        }
+
+    def get(self, doc_id: str, version: int) -> Optional[Dict]:
+        """Contenu d'une version : dernière version lue directement, sinon keyframe + deltas"""
+        cached = self.cache.get((doc_id, version))
+        if cached is not None:
+            return cached
+        with self._lock:
+            head = self._conn.execute("SELECT version, content FROM heads WHERE doc_id = ?", (doc_id,)).fetchone()
+            if head is None or not 1 <= version <= head[0]:
+                return None
+            # Dernière version : seule sa ligne est lue, le contenu vient de heads
+            first = version
+            if version < head[0]:
+                first = self._conn.execute(
+                    "SELECT MAX(version) FROM versions WHERE doc_id = ? AND version <= ? AND is_keyframe = 1",
+                    (doc_id, version)
+                ).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT version, is_keyframe, payload, content_hash, size, metadata, created_at FROM versions "
+                "WHERE doc_id = ? AND version BETWEEN ? AND ? ORDER BY version",
+                (doc_id, first, version)
+            ).fetchall()
+
+        if version == head[0]:
+            return {**self._row_info(doc_id, rows[-1]), "content": "".join(_unpack(head[1])), "is_current": True}
+        lines: List[str] = []
+        for _, is_keyframe, payload, *_ in rows:
+            lines = _unpack(payload) if is_keyframe else apply_delta(lines, _unpack(payload))
+        # Une version antérieure le reste : l'entrée en cache n'est jamais périmée
+        record = {**self._row_info(doc_id, rows[-1]), "content": "".join(lines), "is_current": False}
+        self.cache.set((doc_id, version), record)
+        return record
+
+    def history(self, doc_id: str, include_content: bool = False) -> List[Dict]:
+        """Versions d'un document, de la plus ancienne à la plus récente (contenus reconstruits en une passe)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, is_keyframe, payload, content_hash, size, metadata, created_at FROM versions "
+                "WHERE doc_id = ? ORDER BY version",
+                (doc_id,)
+            ).fetchall()
+        versions = []
+        lines: List[str] = []
+        for row in rows:
+            info = self._row_info(doc_id, row)
+            if include_content:
+                lines = _unpack(row[2]) if row[1] else apply_delta(lines, _unpack(row[2]))
+                info["content"] = "".join(lines)
+            versions.append(info)
+        return versions
+
+    def stats(self) -> Dict:
+        with self._lock:
+            documents, versions, keyframes, stored, raw = self._conn.execute(
+                "SELECT COUNT(DISTINCT doc_id), COUNT(*), COALESCE(SUM(is_keyframe), 0), "
+                "COALESCE(SUM(LENGTH(payload)), 0), COALESCE(SUM(size), 0) FROM versions"
+            ).fetchone()
+        return {
+            "documents": documents,
+            "versions": versions,
+            "keyframes": keyframes,
+            "stored_bytes": stored,
+            "content_bytes": raw,
+            "compression_ratio": round(raw / stored, 2) if stored else None,
+            "keyframe_interval": self.keyframe_interval,
+            "cache": self.cache.stats()
+        }
+
+    @staticmethod
+    def _row_info(doc_id: str, row) -> Dict:
+        version, is_keyframe, payload, content_hash, size, metadata, created_at = row
+        return {
+            "doc_id": doc_id,
+            "version": version,
+            "content_hash": content_hash,
+            "size": size,
+            "stored_as": "keyframe" if is_keyframe else "delta",
+            "stored_bytes": len(payload),
+            "metadata": json.loads(metadata),
+            "created_at": created_at
+        }
+
+# Instance unique pour l'application, créée au premier usage
+_version_store: Optional[VersionStore] = None
+_version_store_lock = threading.Lock()
+
+
+def get_version_store() -> VersionStore:
+    global _version_store
+    with _version_store_lock:
+        if _version_store is None:
+            _version_store = VersionStore()
+        return _version_store
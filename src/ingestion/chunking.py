@@ -0,0 +1,62 @@
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import Iterable, Iterator, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs de texte passés au splitter : la mémoire de travail du
+# découpage est bornée par DEFAULT_BLOCK_SIZE + chunk_size, quelle que soit
+# la taille du document.
+DEFAULT_BLOCK_SIZE = 100_000
+
+TextSource = Union[str, Iterable[str]]
+
+
+def build_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200) -> RecursiveCharacterTextSplitter:
+    """Text splitter partagé par l'ingestion et les benchmarks"""
+    return RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        is_separator_regex=False
+    )
+
+
+def iter_text_blocks(source: TextSource, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[str]:
+    """Découpe une chaîne ou un flux de segments en blocs d'au plus block_size caractères"""
+    segments = [source] if isinstance(source, str) else source
+    for segment in segments:
+        for start in range(0, len(segment), block_size):
+            yield segment[start:start + block_size]
+
+
+def iter_chunks(
+    splitter: RecursiveCharacterTextSplitter,
+    source: TextSource,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> Iterator[str]:
+    """
+    Générateur de chunks à mémoire bornée.
+
+    Le texte est traité bloc par bloc ; le dernier chunk de chaque bloc peut
+    être coupé par la frontière du bloc, il est donc réinjecté (avec le texte
+    qui le suit) au début du bloc suivant.
+    """
+    carry = ""
+    for block in iter_text_blocks(source, block_size):
+        buffer = carry + block
+        chunks = splitter.split_text(buffer)
+        if not chunks:
+            carry = ""
+            continue
+
+        yield from chunks[:-1]
+
+        # On repart du texte brut (espaces compris) pour ne pas coller deux mots
+        last_chunk = chunks[-1]
+        position = buffer.rfind(last_chunk)
+        carry = buffer[position:] if position >= 0 else last_chunk
+
+    if carry:
+        yield from splitter.split_text(carry)
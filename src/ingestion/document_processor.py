@@ -1,72 +1,106 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from typing import List, Dict
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import hashlib
 import logging
-from src.llm.manager import llm_manager
-from src.db.chroma import db_manager
+import threading
+from datetime import datetime
+from src.ingestion.chunking import build_text_splitter, iter_chunks
+from src.llm.manager import LLMManager, get_llm_manager
+from src.db.chroma import ChromaDBManager, get_db_manager
+from src.db.document_store import DocumentStore, get_document_store
+from src.db.versions import VersionStore, get_version_store
+from src.monitoring.metrics import track_iter, track_stage
 
 logger = logging.getLogger(__name__)
 
 class DocumentProcessor:
-    def __init__(self):
-        self.llm_manager = llm_manager
-        self.db_manager = db_manager
+    def __init__(
+        self,
+        llm_manager: Optional[LLMManager] = None,
+        db_manager: Optional[ChromaDBManager] = None,
+        document_store: Optional[DocumentStore] = None,
+        version_store: Optional[VersionStore] = None
+    ):
+        self.llm_manager = llm_manager or get_llm_manager()
+        self.db_manager = db_manager or get_db_manager()
+        self.document_store = document_store or get_document_store()
+        self.version_store = version_store or get_version_store()
         # Initialisation du text splitter avec des paramètres optimisés
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            is_separator_regex=False
-        )
+        self.text_splitter = build_text_splitter(chunk_size=1000, chunk_overlap=200)
 
     async def process_document(self, doc_id: str, content: str, metadata: Dict) -> Dict:
         """Traite un document avec analyse IA"""
         try:
-            # Découper le document en chunks
-            chunks = self.text_splitter.create_documents(
-                texts=[content],
-                metadatas=[{
-                    "doc_id": doc_id,
-                    "chunk_index": i,
-                    **metadata
-                } for i in range(len(content))]
-            )
-            
-            logger.info(f"Document {doc_id} découpé en {len(chunks)} chunks")
-
-            # Analyser le contenu avec le LLM
-            analysis_result = await self.llm_manager.analyze_document(content)
+            # Analyser le contenu avec le LLM (map-reduce sur les chunks si le document est long)
+            with track_stage("llm_analysis", doc_id=doc_id):
+                if self.llm_manager.should_map_reduce(len(content)):
+                    analysis_result = await self.llm_manager.analyze_chunks(
+                        track_iter("split", iter_chunks(self.text_splitter, content), doc_id=doc_id)
+                    )
+                else:
+                    analysis_result = await self.llm_manager.analyze_document(content)
             
-            # Enrichir les métadonnées
+            # Les chunks ne portent que les métadonnées légères et la référence au document ;
+            # l'analyse est enregistrée une seule fois dans le stockage des documents
             enriched_metadata = {
                 **metadata,
-                "ai_analysis": analysis_result["analysis"],
-                "processed": True,
-                "chunks_count": len(chunks)
+                "processed": True
             }
 
-            # Stocker chaque chunk dans ChromaDB
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    **enriched_metadata,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks)
-                }
-                await self.db_manager.add_document(
-                    doc_id=f"{doc_id}_chunk_{i}",
-                    content=chunk.page_content,
-                    metadata=chunk_metadata
+            # Découper et stocker les chunks au fil de l'eau
+            storage_result = await self.store_chunks(
+                doc_id=doc_id,
+                chunks=track_iter("split", iter_chunks(self.text_splitter, content), doc_id=doc_id),
+                metadata=enriched_metadata
+            )
+            enriched_metadata["chunks_count"] = storage_result["total_chunks"]
+
+            logger.info(f"Document {doc_id} découpé en {storage_result['total_chunks']} chunks")
+
+            # Nouvelle version dans l'historique (delta compressé), une fois le contenu indexé
+            with track_stage("version_write", doc_id=doc_id):
+                version_info = await asyncio.to_thread(self.version_store.append, doc_id, content, metadata)
+
+            chunks_info = {
+                "total_chunks": storage_result["total_chunks"],
+                "avg_chunk_size": storage_result["avg_chunk_size"],
+                "embedded_chunks": storage_result["embedded_chunks"],
+                "unchanged_chunks": storage_result["unchanged_chunks"],
+                "deleted_chunks": storage_result["deleted_chunks"]
+            }
+            analysis_info = {
+                "mode": analysis_result.get("mode", "single"),
+                "timings": analysis_result.get("timings", {})
+            }
+
+            with track_stage("document_store_write", doc_id=doc_id):
+                await asyncio.to_thread(
+                    self.document_store.upsert,
+                    doc_id,
+                    metadata=metadata,
+                    analysis=analysis_result["analysis"],
+                    chunks_count=storage_result["total_chunks"],
+                    processing_info={
+                        "processed_at": datetime.utcnow().isoformat(),
+                        "version": version_info["version"],
+                        "model": analysis_result.get("model"),
+                        "chunks_info": chunks_info,
+                        "analysis_info": analysis_info
+                    }
                 )
 
             return {
                 "status": "success",
                 "doc_id": doc_id,
+                "version": version_info["version"],
                 "analysis": analysis_result["analysis"],
                 "metadata": enriched_metadata,
-                "chunks_info": {
-                    "total_chunks": len(chunks),
-                    "avg_chunk_size": sum(len(c.page_content) for c in chunks) / len(chunks)
+                "chunks_info": chunks_info,
+                "analysis_info": analysis_info,
+                "storage_info": {
+                    "batch_size": storage_result["batch_size"],
+                    "batches": storage_result["batches"],
+                    "total_time": storage_result["total_time"]
                 }
             }
             
@@ -74,15 +108,121 @@ class DocumentProcessor:
             logger.error(f"Erreur lors du traitement du document {doc_id}: {str(e)}")
             raise
 
+    async def store_chunks(self, doc_id: str, chunks: Iterable[str], metadata: Dict) -> Dict:
+        """
+        Stocke un flux de chunks de façon incrémentale.
+
+        Chaque chunk est identifié par l'empreinte de son contenu : seuls les
+        chunks nouveaux sont embeddés et écrits, les chunks inchangés ne voient
+        au plus que leurs métadonnées mises à jour, et les chunks qui ont
+        disparu du document sont supprimés. Au plus un lot est gardé en mémoire.
+        """
+        batch_size = self.db_manager.batch_size
+        existing = await self.db_manager.get_document_chunk_index(doc_id)
+
+        new_ids, new_contents, new_metadatas = [], [], []
+        update_ids, update_metadatas = [], []
+        seen_ids = set()
+        occurrences = {}
+        batches = []
+        total_chunks = 0
+        total_size = 0
+        unchanged_chunks = 0
+        updated_chunks = 0
+        total_time = 0.0
+
+        async def flush_new():
+            nonlocal total_time
+            result = await self.db_manager.add_documents(
+                ids=new_ids,
+                contents=new_contents,
+                metadatas=new_metadatas,
+                batch_size=batch_size,
+                upsert=True
+            )
+            batches.extend(result["batches"])
+            total_time += result["total_time"]
+            new_ids.clear()
+            new_contents.clear()
+            new_metadatas.clear()
+
+        async def flush_updates():
+            nonlocal updated_chunks
+            updated_chunks += await self.db_manager.update_metadatas(update_ids, update_metadatas, batch_size)
+            update_ids.clear()
+            update_metadatas.clear()
+
+        for chunk in chunks:
+            content_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+            # Un même texte peut apparaître plusieurs fois dans un document
+            occurrence = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = occurrence + 1
+            chunk_id = f"{doc_id}_chunk_{content_hash[:16]}"
+            if occurrence:
+                chunk_id = f"{chunk_id}_{occurrence}"
+
+            chunk_metadata = {
+                **metadata,
+                "doc_id": doc_id,
+                "chunk_index": total_chunks,
+                "content_hash": content_hash
+            }
+            seen_ids.add(chunk_id)
+            total_chunks += 1
+            total_size += len(chunk)
+
+            stored = existing.get(chunk_id)
+            if stored is None:
+                new_ids.append(chunk_id)
+                new_contents.append(chunk)
+                new_metadatas.append(chunk_metadata)
+                if len(new_ids) >= batch_size:
+                    await flush_new()
+            else:
+                unchanged_chunks += 1
+                if any(stored.get(key) != value for key, value in chunk_metadata.items()):
+                    update_ids.append(chunk_id)
+                    update_metadatas.append(chunk_metadata)
+                    if len(update_ids) >= batch_size:
+                        await flush_updates()
+
+        if new_ids:
+            await flush_new()
+        if update_ids:
+            await flush_updates()
+
+        # Chunks qui ne font plus partie du document
+        orphan_ids = [chunk_id for chunk_id in existing if chunk_id not in seen_ids]
+        deleted_chunks = await self.db_manager.delete_documents(orphan_ids, batch_size)
+
+        logger.info(
+            f"Document {doc_id}: {total_chunks - unchanged_chunks} chunks embeddés, "
+            f"{unchanged_chunks} inchangés ({updated_chunks} métadonnées mises à jour), "
+            f"{deleted_chunks} supprimés"
+        )
+
+        return {
+            "total_chunks": total_chunks,
+            "avg_chunk_size": total_size / total_chunks if total_chunks else 0,
+            "embedded_chunks": total_chunks - unchanged_chunks,
+            "unchanged_chunks": unchanged_chunks,
+            "updated_chunks": updated_chunks,
+            "deleted_chunks": deleted_chunks,
+            "batch_size": batch_size,
+            "batches": batches,
+            "total_time": round(total_time, 4)
+        }
+
     async def analyze_documents(self, doc_ids: List[str]) -> Dict:
         """Analyse comparative de plusieurs documents"""
         try:
             documents_content = []
             chunks_by_doc = {}
 
-            # Récupérer tous les chunks pour chaque document
+            # Récupérer les chunks de tous les documents en parallèle
+            all_chunks = await self.db_manager.get_documents_chunks(doc_ids)
             for doc_id in doc_ids:
-                chunks = await self.db_manager.get_document_chunks(doc_id)
+                chunks = all_chunks[doc_id]
                 if chunks:
                     documents_content.append(" ".join(c["content"] for c in chunks))
                     chunks_by_doc[doc_id] = chunks
@@ -116,4 +256,14 @@ class DocumentProcessor:
             logger.error(f"Erreur lors de l'analyse comparative: {str(e)}")
             raise
 
-document_processor = DocumentProcessor()
\ No newline at end of file
+# Instance unique pour l'application, créée au premier usage
+_document_processor: Optional[DocumentProcessor] = None
+_document_processor_lock = threading.Lock()
+
+
+def get_document_processor() -> DocumentProcessor:
+    global _document_processor
+    with _document_processor_lock:
+        if _document_processor is None:
+            _document_processor = DocumentProcessor()
+        return _document_processor
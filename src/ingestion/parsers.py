@@ -0,0 +1,119 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Extension -> format pris en charge
+SUPPORTED_FORMATS = {
+    ".pdf": "pdf",
+    ".html": "html",
+    ".htm": "html",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".txt": "text"
+}
+
+CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "text/html": "html",
+    "text/markdown": "markdown",
+    "text/plain": "text"
+}
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    """Détermine le format d'un fichier à partir de son extension, à défaut de son type MIME"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in SUPPORTED_FORMATS:
+        return SUPPORTED_FORMATS[extension]
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    if mime_type in CONTENT_TYPES:
+        return CONTENT_TYPES[mime_type]
+    raise UnsupportedFormatError(f"Format non pris en charge: {filename} ({content_type})")
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def _html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = soup.get_text("\n")
+    # Les paragraphes sont conservés pour guider le découpage en chunks
+    return re.sub(r"\n\s*\n+", "\n\n", text).strip()
+
+
+def extract_text(data: bytes, file_format: str) -> str:
+    """
+    Extrait le texte d'un fichier. Exécuté dans un processus du pool :
+    les imports des bibliothèques d'analyse sont faits ici.
+    """
+    if file_format == "pdf":
+        from pdfminer.high_level import extract_text as extract_pdf_text
+        return extract_pdf_text(io.BytesIO(data)).strip()
+    if file_format == "html":
+        return _html_to_text(_decode(data))
+    if file_format == "markdown":
+        import markdown
+        return _html_to_text(markdown.markdown(_decode(data)))
+    if file_format == "text":
+        return _decode(data).strip()
+    raise UnsupportedFormatError(f"Format non pris en charge: {file_format}")
+
+
+class DocumentParser:
+    """
+    Extraction de texte dans un pool de processus, pour que l'analyse des
+    fichiers (coûteuse en CPU) ne bloque jamais la boucle d'événements.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv("PARSER_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # "spawn" : les processus ne dupliquent pas l'état (threads, connexions) de l'API
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Pool d'analyse de fichiers démarré ({self.max_workers} processus)")
+        return self._executor
+
+    async def parse(self, data: bytes, filename: Optional[str], content_type: Optional[str] = None) -> dict:
+        file_format = detect_format(filename, content_type)
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        try:
+            text = await loop.run_in_executor(self._get_executor(), extract_text, data, file_format)
+        except BrokenProcessPool:
+            # Un processus a été tué (mémoire, crash) : le pool sera recréé au prochain appel
+            logger.error("Pool d'analyse de fichiers interrompu, il sera recréé")
+            self._executor = None
+            raise
+        return {
+            "text": text,
+            "format": file_format,
+            "parse_time": round(loop.time() - start_time, 3)
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,391 @@
+from enum import Enum
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+JobHandler = Callable[[str, Dict], Awaitable]
+
+
+class JobQueue:
+    """
+    File de traitements persistante (SQLite) consommée par un pool de workers.
+
+    La base est partagée par tous les processus uvicorn : chacun fait tourner
+    `workers` workers, et le nombre total de traitements simultanés est borné
+    par `max_running`. Un traitement en échec est relancé avec un délai
+    exponentiel jusqu'à `max_attempts` tentatives. Le bail d'un traitement en
+    cours est renouvelé tant que son worker est vivant ; un traitement dont le
+    worker a disparu est repris à l'expiration de son bail (ou abandonné si
+    ses tentatives sont épuisées). Deux traitements d'un même document ne
+    tournent jamais en même temps. Les statuts des traitements terminés sont
+    purgés après `status_ttl` secondes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        handler: JobHandler,
+        workers: int = 2,
+        max_running: Optional[int] = None,
+        max_attempts: int = 3,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+        status_ttl: float = 24 * 3600,
+        lease_timeout: float = 3600.0,
+        poll_interval: float = 1.0
+    ):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_running = max_running or workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.status_ttl = status_ttl
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+        self._lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_purge = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_id TEXT NOT NULL,
+                batch_id TEXT,
+                payload TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                worker TEXT,
+                enqueued_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                lease_expires_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, available_at)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "batch_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_doc_id ON jobs(doc_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch_id ON jobs(batch_id)")
+
+    # --- Écriture -----------------------------------------------------------
+
+    def enqueue(self, doc_id: str, payload: Dict) -> int:
+        """Ajoute un traitement à la file et renvoie son identifiant"""
+        now = time.time()
+        with self._lock:
+            job_id = self._conn.execute(
+                "INSERT INTO jobs (doc_id, payload, status, enqueued_at, available_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (doc_id, json.dumps(payload), ProcessingStatus.PENDING.value, now, now)
+            ).lastrowid
+        self._notify()
+        return job_id
+
+    def enqueue_many(self, jobs: Iterable[Tuple[str, Dict]], batch_id: Optional[str] = None) -> int:
+        """Ajoute plusieurs traitements (doc_id, payload) en une seule transaction"""
+        now = time.time()
+        rows = [
+            (doc_id, batch_id, json.dumps(payload), ProcessingStatus.PENDING.value, now, now)
+            for doc_id, payload in jobs
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO jobs (doc_id, batch_id, payload, status, enqueued_at, available_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify()
+        return len(rows)
+
+    def depth(self) -> int:
+        """Nombre de traitements en attente"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (ProcessingStatus.PENDING.value,)
+            ).fetchone()[0]
+
+    async def wait_for_capacity(self, max_pending: int, poll_interval: Optional[float] = None):
+        """Attend que la file repasse sous max_pending traitements en attente (contre-pression)"""
+        while await asyncio.to_thread(self.depth) >= max_pending:
+            await asyncio.sleep(poll_interval or self.poll_interval)
+
+    def _claim(self) -> Optional[Dict]:
+        """Réserve le prochain traitement disponible, dans la limite de max_running"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Baux expirés : le worker a disparu, le traitement est remis en file
+                # ou abandonné si ses tentatives sont épuisées
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, payload = NULL, error = ?, worker = NULL "
+                    "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                    (ProcessingStatus.FAILED.value, now, "Bail expiré : worker disparu",
+                     ProcessingStatus.PROCESSING.value, now, self.max_attempts)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND lease_expires_at < ?",
+                    (ProcessingStatus.PENDING.value, ProcessingStatus.PROCESSING.value, now)
+                )
+                running = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ?", (ProcessingStatus.PROCESSING.value,)
+                ).fetchone()[0]
+                if running >= self.max_running:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                # Un document déjà en cours de traitement n'est pas réservé une seconde fois
+                row = self._conn.execute(
+                    "SELECT id, doc_id, payload, attempts FROM jobs "
+                    "WHERE status = ? AND available_at <= ? "
+                    "AND doc_id NOT IN (SELECT doc_id FROM jobs WHERE status = ?) "
+                    "ORDER BY available_at, id LIMIT 1",
+                    (ProcessingStatus.PENDING.value, now, ProcessingStatus.PROCESSING.value)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, "
+                    "started_at = ?, lease_expires_at = ? WHERE id = ?",
+                    (ProcessingStatus.PROCESSING.value, self.worker_id, now, now + self.lease_timeout, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return {"id": row[0], "doc_id": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def _renew(self, job_id: int):
+        """Prolonge le bail d'un traitement en cours"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (time.time() + self.lease_timeout, job_id, ProcessingStatus.PROCESSING.value, self.worker_id)
+            )
+
+    def _complete(self, job_id: int):
+        with self._lock:
+            # Le contenu n'est plus utile une fois le traitement terminé
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, payload = NULL, error = NULL WHERE id = ?",
+                (ProcessingStatus.COMPLETED.value, time.time(), job_id)
+            )
+
+    def _release(self, job_id: int):
+        """Remet en file un traitement interrompu (arrêt du worker), sans compter la tentative"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, worker = NULL WHERE id = ?",
+                (ProcessingStatus.PENDING.value, job_id)
+            )
+
+    def _fail(self, job_id: int, attempts: int, error: str):
+        now = time.time()
+        with self._lock:
+            if attempts < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, error = ?, worker = NULL WHERE id = ?",
+                    (ProcessingStatus.PENDING.value, now + delay, error, job_id)
+                )
+                logger.warning(f"Traitement {job_id} en échec (tentative {attempts}), nouvel essai dans {delay:.0f}s")
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, payload = NULL, error = ? WHERE id = ?",
+                    (ProcessingStatus.FAILED.value, now, error, job_id)
+                )
+                logger.error(f"Traitement {job_id} abandonné après {attempts} tentatives: {error}")
+
+    def purge_expired(self) -> int:
+        """Supprime les statuts des traitements terminés depuis plus de status_ttl secondes"""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (ProcessingStatus.COMPLETED.value, ProcessingStatus.FAILED.value, time.time() - self.status_ttl)
+            ).rowcount
+
+    # --- Lecture ------------------------------------------------------------
+
+    def get_status(self, doc_id: str) -> Optional[Dict]:
+        """Statut du traitement le plus récent d'un document"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, attempts, error, enqueued_at, started_at, finished_at "
+                "FROM jobs WHERE doc_id = ? ORDER BY id DESC LIMIT 1",
+                (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, attempts, error, enqueued_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "attempts": attempts,
+            "error": error,
+            "wait_time": round((started_at or time.time()) - enqueued_at, 3),
+            "run_time": round(finished_at - started_at, 3) if finished_at and started_at else None
+        }
+
+    def batch_status(self, batch_id: str) -> Optional[Dict]:
+        """Avancement agrégé d'un lot de traitements"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall())
+            first_enqueued, last_finished = self._conn.execute(
+                "SELECT MIN(enqueued_at), MAX(finished_at) FROM jobs WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+        total = sum(counts.values())
+        if not total:
+            return None
+        done = counts.get(ProcessingStatus.COMPLETED.value, 0) + counts.get(ProcessingStatus.FAILED.value, 0)
+        return {
+            "batch_id": batch_id,
+            "total": total,
+            **{status.value: counts.get(status.value, 0) for status in ProcessingStatus},
+            "progress": round(done / total, 3),
+            "elapsed": round((last_finished if done == total else time.time()) - first_enqueued, 3)
+        }
+
+    def stats(self, window: float = 3600) -> Dict:
+        """Profondeur de la file et temps d'attente / d'exécution sur la dernière fenêtre"""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest_pending = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM jobs WHERE status = ?", (ProcessingStatus.PENDING.value,)
+            ).fetchone()[0]
+            avg_wait, avg_run, finished = self._conn.execute(
+                "SELECT AVG(started_at - enqueued_at), AVG(finished_at - started_at), COUNT(*) "
+                "FROM jobs WHERE status = ? AND finished_at >= ?",
+                (ProcessingStatus.COMPLETED.value, now - window)
+            ).fetchone()
+        return {
+            "depth": counts.get(ProcessingStatus.PENDING.value, 0),
+            "running": counts.get(ProcessingStatus.PROCESSING.value, 0),
+            "completed": counts.get(ProcessingStatus.COMPLETED.value, 0),
+            "failed": counts.get(ProcessingStatus.FAILED.value, 0),
+            "oldest_pending_wait": round(now - oldest_pending, 3) if oldest_pending else 0.0,
+            "avg_wait_time": round(avg_wait or 0.0, 3),
+            "avg_run_time": round(avg_run or 0.0, 3),
+            "completed_last_window": finished,
+            "throughput_per_minute": round(finished / window * 60, 3),
+            "workers": self.workers,
+            "max_running": self.max_running
+        }
+
+    # --- Workers ------------------------------------------------------------
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"File de traitements démarrée ({self.workers} workers, {self.max_running} simultanés max)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _notify(self):
+        if self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        elif not self._loop.is_closed():
+            # Appel depuis un thread (asyncio.to_thread, workers d'ingestion) : asyncio.Event n'est pas thread-safe
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _heartbeat(self, job_id: int):
+        """Renouvelle le bail tant que le traitement tourne"""
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            try:
+                await asyncio.to_thread(self._renew, job_id)
+            except Exception as e:
+                logger.error(f"Erreur lors du renouvellement du bail du traitement {job_id}: {str(e)}")
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                if time.time() - self._last_purge > 60:
+                    self._last_purge = time.time()
+                    await asyncio.to_thread(self.purge_expired)
+
+                job = await asyncio.to_thread(self._claim)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+                try:
+                    await self.handler(job["doc_id"], job["payload"])
+                except asyncio.CancelledError:
+                    self._release(job["id"])
+                    raise
+                except Exception as e:
+                    logger.error(f"Erreur lors du traitement de {job['doc_id']}: {str(e)}")
+                    await asyncio.to_thread(self._fail, job["id"], job["attempts"], str(e))
+                else:
+                    await asyncio.to_thread(self._complete, job["id"])
+                finally:
+                    heartbeat.cancel()
+                # Une place s'est libérée pour les autres workers
+                self._notify()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur du worker {index}: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    def new_batch_id() -> str:
+        return uuid.uuid4().hex
@@ -0,0 +1,112 @@
+"""
+Construction du contexte d'une question à partir des chunks retrouvés.
+
+Les chunks sont ajoutés par ordre de pertinence tant qu'ils tiennent dans un
+budget de tokens : les doublons (y compris les chunks qui se chevauchent
+presque entièrement) sont écartés, chaque chunk est tronqué à
+max_chunk_tokens et le dernier est tronqué pour finir le budget.
+"""
+from typing import Dict, List, Optional, Set
+import hashlib
+import math
+import re
+
+# Estimation du nombre de tokens (tokenizer SentencePiece de Mistral, texte français) :
+# une sous-estimation allongerait le prompt, l'estimation reste donc prudente
+CHARS_PER_TOKEN = 3.5
+
+# En dessous, un extrait tronqué n'apporte plus d'information utile
+MIN_CHUNK_TOKENS = 32
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Marque de fin d'un extrait tronqué, comprise dans son budget
+TRUNCATION_SUFFIX = " […]"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Tronque un texte à max_tokens (estimés, marque de troncature comprise), sur une frontière de mot"""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    max_chars = max(0, max_chars - len(TRUNCATION_SUFFIX))
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars].rstrip() + TRUNCATION_SUFFIX
+
+
+def _shingles(text: str, size: int = 5) -> Set[int]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {hash(" ".join(words))}
+    return {hash(" ".join(words[index:index + size])) for index in range(len(words) - size + 1)}
+
+
+def pack_context(
+    results: List[Dict],
+    max_tokens: int,
+    max_chunk_tokens: Optional[int] = None,
+    duplicate_threshold: float = 0.8
+) -> Dict:
+    """
+    Assemble le contexte à partir des résultats de search_documents (triés
+    par pertinence). Renvoie le texte, les sources numérotées et les tokens
+    estimés du contexte.
+    """
+    max_chunk_tokens = max_chunk_tokens or max_tokens
+    parts, sources = [], []
+    seen_hashes: Set[str] = set()
+    packed_shingles: List[Set[int]] = []
+    used_tokens = 0
+    duplicates = 0
+    over_budget = 0
+
+    for result in results:
+        content = result["content"].strip()
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if digest in seen_hashes:
+            duplicates += 1
+            continue
+        # Quasi-doublon : la plupart des séquences de 5 mots sont déjà dans le contexte
+        shingles = _shingles(content)
+        if any(len(shingles & other) / len(shingles) >= duplicate_threshold for other in packed_shingles):
+            duplicates += 1
+            continue
+
+        metadata = result.get("metadata") or {}
+        number = len(sources) + 1
+        header = f"[{number}] {metadata.get('doc_id', '?')}"
+        if "chunk_index" in metadata:
+            header += f" (extrait {metadata['chunk_index']})"
+        # Retour à la ligne après l'en-tête et séparateur entre extraits
+        remaining = max_tokens - used_tokens - estimate_tokens(header) - 2
+        if remaining < MIN_CHUNK_TOKENS:
+            over_budget += 1
+            continue
+
+        text = truncate_to_tokens(content, min(max_chunk_tokens, remaining))
+        part = f"{header}\n{text}"
+        parts.append(part)
+        used_tokens += estimate_tokens(part) + 1
+        seen_hashes.add(digest)
+        packed_shingles.append(shingles)
+        sources.append({
+            "number": number,
+            "id": result.get("id"),
+            "doc_id": metadata.get("doc_id"),
+            "chunk_index": metadata.get("chunk_index"),
+            "relevance_score": result.get("relevance_score"),
+            "tokens": estimate_tokens(text),
+            "truncated": text != content
+        })
+
+    return {
+        "context": "\n\n".join(parts),
+        "sources": sources,
+        "tokens": used_tokens,
+        "duplicates_skipped": duplicates,
+        "over_budget_skipped": over_budget
+    }
@@ -1,32 +1,55 @@
-from langchain.llms import Ollama
-from langchain.callbacks.manager import CallbackManager
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+import asyncio
 import logging
+import threading
 from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
 import time
 import os
 
+from src.llm.cache import LLMResultCache
+from src.llm.context import estimate_tokens
+from src.llm.ollama_client import OllamaClient
+
 logger = logging.getLogger(__name__)
 
 class LLMManager:
     def __init__(self):
         try:
-            callback_manager = CallbackManager([
-                StreamingStdOutCallbackHandler()
-            ])
-            
             # Récupération de l'URL d'Ollama depuis les variables d'environnement
             ollama_base_url = os.getenv('OLLAMA_HOST', 'http://ollama:11434')
+            self.model = os.getenv('OLLAMA_MODEL', 'mistral')
+            self.temperature = 0.7
             
-            # Configuration de base de Mistral
-            self.llm = Ollama(
-                model="mistral",
-                callback_manager=callback_manager,
-                temperature=0.7,
-                timeout=300,
-                base_url=ollama_base_url
+            # Client asynchrone avec pool de connexions keep-alive
+            self.client = OllamaClient(
+                base_url=ollama_base_url,
+                model=self.model,
+                temperature=self.temperature,
+                timeout=float(os.getenv('OLLAMA_TIMEOUT', '300')),
+                max_concurrency=int(os.getenv('OLLAMA_MAX_CONCURRENCY', '2')),
+                max_connections=int(os.getenv('OLLAMA_MAX_CONNECTIONS', '10'))
             )
-            logger.info(f"LLM initialisé avec succès (URL: {ollama_base_url})")
+
+            # Analyse map-reduce des documents longs
+            # (mode : "auto", "single" ou "map_reduce")
+            self.analysis_mode = os.getenv('ANALYSIS_MODE', 'auto')
+            self.max_prompt_chars = int(os.getenv('ANALYSIS_MAX_PROMPT_CHARS', '12000'))
+            self.map_concurrency = int(os.getenv('ANALYSIS_MAP_CONCURRENCY', '4'))
+
+            # Réponses aux questions (/ask) : longueur maximale de la réponse
+            self.answer_max_tokens = int(os.getenv('ASK_MAX_ANSWER_TOKENS', '512'))
+
+            # Cache des réponses (LRU mémoire + SQLite persistant)
+            self.cache = None
+            if os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true':
+                data_dir = os.getenv('DATA_DIR', '/app/data')
+                self.cache = LLMResultCache(
+                    path=os.getenv('LLM_CACHE_PATH', os.path.join(data_dir, 'llm_cache.sqlite3')),
+                    max_memory_entries=int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '256')),
+                    max_disk_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+                    ttl=float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+                )
+            logger.info(f"LLM initialisé avec succès (URL: {ollama_base_url}, modèle: {self.model})")
             
         except Exception as e:
             logger.error(f"Erreur LLM init: {str(e)}")
@@ -37,25 +60,194 @@ class LLMManager:
             logger.info(f"Début analyse document type: {analysis_type}")
             start_time = time.time()
             
-            # Sélection du prompt selon le type d'analyse
-            if analysis_type == "detailed":
-                prompt = self._get_detailed_prompt(content)
-            else:
-                prompt = self._get_standard_prompt(content)
-            
-            # Analyse avec le LLM
-            response = self.llm.invoke(prompt)
+            # Analyse avec le LLM, sans bloquer la boucle d'événements
+            response, cached = await self._generate(
+                prompt=self._get_prompt(content, analysis_type),
+                template=self._get_prompt("", analysis_type),
+                analysis_type=analysis_type,
+                content=content
+            )
             
             # Post-traitement de la réponse
             processed_response = self._process_llm_response(response)
+            processed_response["cached"] = cached
             
-            logger.info(f"Analyse terminée en {time.time() - start_time:.2f}s")
+            logger.info(f"Analyse terminée en {time.time() - start_time:.2f}s (cache: {cached})")
             return processed_response
             
         except Exception as e:
             logger.error(f"Erreur analyse: {str(e)}")
             raise
 
+    def should_map_reduce(self, content_length: int) -> bool:
+        """Indique si un document doit être analysé en map-reduce plutôt qu'en un seul prompt"""
+        if self.analysis_mode == "map_reduce":
+            return True
+        if self.analysis_mode == "single":
+            return False
+        return content_length > self.max_prompt_chars
+
+    async def analyze_chunks(
+        self,
+        chunks: Iterable[str],
+        analysis_type: str = "default",
+        max_concurrency: Optional[int] = None
+    ) -> dict:
+        """
+        Analyse map-reduce d'un document déjà découpé.
+
+        Map : les chunks sont regroupés en extraits tenant dans un prompt et
+        résumés en parallèle (au plus max_concurrency appels simultanés).
+        Reduce : les synthèses partielles sont fusionnées, en plusieurs passes
+        si besoin, puis analysées avec le prompt habituel.
+        """
+        max_concurrency = max_concurrency or self.map_concurrency
+        try:
+            logger.info(f"Début analyse map-reduce type: {analysis_type} (parallélisme {max_concurrency})")
+            start_time = time.perf_counter()
+
+            mapped = await self._map_summaries(
+                self._group_texts(chunks, self.max_prompt_chars),
+                max_concurrency
+            )
+            map_time = time.perf_counter() - start_time
+            map_calls = len(mapped)
+            cache_hits = sum(cached for _, cached in mapped)
+            summaries = [summary for summary, _ in mapped]
+
+            # Réductions intermédiaires tant que les synthèses ne tiennent pas dans un prompt
+            reduce_start = time.perf_counter()
+            reduce_rounds = 0
+            while len(summaries) > 1 and sum(len(summary) for summary in summaries) > self.max_prompt_chars:
+                groups = list(self._group_texts(summaries, self.max_prompt_chars, separator="\n\n"))
+                if len(groups) >= len(summaries):
+                    # Synthèses trop longues pour être regroupées : on réduit en l'état
+                    break
+                mapped = await self._map_summaries(groups, max_concurrency)
+                cache_hits += sum(cached for _, cached in mapped)
+                summaries = [summary for summary, _ in mapped]
+                reduce_rounds += 1
+
+            response, cached = await self._generate(
+                prompt=self._get_reduce_prompt(summaries, analysis_type),
+                template=self._get_reduce_prompt([], analysis_type),
+                analysis_type=analysis_type,
+                content="\n\n".join(summaries)
+            )
+            cache_hits += cached
+            reduce_time = time.perf_counter() - reduce_start
+
+            processed_response = self._process_llm_response(response)
+            processed_response.update({
+                "mode": "map_reduce",
+                "partial_analyses": map_calls,
+                "cache_hits": cache_hits,
+                "timings": {
+                    "map": round(map_time, 3),
+                    "reduce": round(reduce_time, 3),
+                    "total": round(time.perf_counter() - start_time, 3),
+                    "map_calls": map_calls,
+                    "reduce_rounds": reduce_rounds + 1,
+                    "max_concurrency": max_concurrency
+                }
+            })
+
+            logger.info(
+                f"Analyse map-reduce terminée en {processed_response['timings']['total']:.2f}s "
+                f"(map {map_time:.2f}s sur {map_calls} extraits, reduce {reduce_time:.2f}s)"
+            )
+            return processed_response
+
+        except Exception as e:
+            logger.error(f"Erreur analyse map-reduce: {str(e)}")
+            raise
+
+    async def _map_summaries(self, groups: Iterable[str], max_concurrency: int) -> List[Tuple[str, bool]]:
+        """Résume chaque extrait avec au plus max_concurrency extraits en cours à la fois"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        template = self._get_map_prompt("")
+        tasks = []
+
+        async def summarize(text: str) -> Tuple[str, bool]:
+            try:
+                return await self._generate(
+                    prompt=self._get_map_prompt(text),
+                    template=template,
+                    analysis_type="map",
+                    content=text
+                )
+            finally:
+                semaphore.release()
+
+        try:
+            # Les extraits ne sont lus qu'au fur et à mesure que des places se libèrent
+            for text in groups:
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(summarize(text)))
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def _generate(self, prompt: str, template: str, analysis_type: str, content: str) -> Tuple[str, bool]:
+        """Appel au LLM via le cache ; renvoie la réponse et si elle provient du cache"""
+        if self.cache is None:
+            return await self.client.generate(prompt), False
+
+        key = LLMResultCache.make_key(template, analysis_type, self.model, self.temperature, content)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached["response"], True
+
+        response = await self.client.generate(prompt)
+        await asyncio.to_thread(
+            self.cache.set, key, {"response": response, "created_at": datetime.now().isoformat()}
+        )
+        return response, False
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {"enabled": False}
+
+    @staticmethod
+    def _group_texts(texts: Iterable[str], max_chars: int, separator: str = " ") -> Iterator[str]:
+        """Regroupe des textes consécutifs en extraits d'au plus max_chars caractères"""
+        group, size = [], 0
+        for text in texts:
+            if group and size + len(text) > max_chars:
+                yield separator.join(group)
+                group, size = [], 0
+            group.append(text)
+            size += len(text) + len(separator)
+        if group:
+            yield separator.join(group)
+
+    async def stream_analysis(self, content: str, analysis_type: str = "default") -> AsyncIterator[str]:
+        """Analyse un document en renvoyant les tokens au fil de leur génération"""
+        logger.info(f"Début analyse (streaming) document type: {analysis_type}")
+        start_time = time.time()
+        async for token in self.client.stream(self._get_prompt(content, analysis_type)):
+            yield token
+        logger.info(f"Analyse (streaming) terminée en {time.time() - start_time:.2f}s")
+
+    async def stream_answer(self, question: str, context: str, stats: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Répond à une question à partir du contexte fourni, token par token"""
+        prompt = self._get_answer_prompt(question, context)
+        if stats is not None:
+            stats["prompt_tokens_estimated"] = estimate_tokens(prompt)
+        async for token in self.client.stream(
+            prompt,
+            options={"num_predict": self.answer_max_tokens},
+            stats=stats
+        ):
+            yield token
+
+    def _get_prompt(self, content: str, analysis_type: str) -> str:
+        # Sélection du prompt selon le type d'analyse
+        if analysis_type == "detailed":
+            return self._get_detailed_prompt(content)
+        return self._get_standard_prompt(content)
+
     def _get_detailed_prompt(self, content: str) -> str:
         return f"""Analysez ce document en détail et extrayez :
         1. Résumé exécutif
@@ -79,6 +271,37 @@ class LLMManager:
         Document: {content}
         """
 
+    def _get_answer_prompt(self, question: str, context: str) -> str:
+        return f"""Répondez à la question en vous appuyant uniquement sur les extraits ci-dessous.
+        Citez les extraits utilisés par leur numéro, par exemple [1].
+        Si les extraits ne permettent pas de répondre, dites-le.
+
+        Extraits:
+        {context}
+
+        Question: {question}
+        """
+
+    def _get_map_prompt(self, content: str) -> str:
+        return f"""Résumez cet extrait d'un document plus long en conservant :
+        - Les points principaux
+        - Les objectifs
+        - Les recommandations
+        - Les points d'attention
+
+        Extrait: {content}
+        """
+
+    def _get_reduce_prompt(self, summaries: List[str], analysis_type: str) -> str:
+        parts = "\n\n".join(
+            f"Partie {index}: {summary}" for index, summary in enumerate(summaries, 1)
+        )
+        return (
+            "Le document suivant est constitué des synthèses successives des parties "
+            "d'un document plus long.\n"
+            + self._get_prompt(parts, analysis_type)
+        )
+
     def _process_llm_response(self, response: str) -> dict:
         """Post-traitement de la réponse du LLM"""
         try:
@@ -86,12 +309,30 @@ class LLMManager:
             return {
                 "analysis": response,
                 "timestamp": datetime.now().isoformat(),
-                "model": "mistral",
+                "model": self.model,
                 "version": "1.0"
             }
         except Exception as e:
             logger.error(f"Erreur processing: {str(e)}")
             return {"error": str(e)}
 
-# Instance unique pour l'application
-llm_manager = LLMManager()
\ No newline at end of file
+    async def warm_up(self) -> Dict:
+        """Fait charger le modèle par Ollama avec un prompt minimal (un seul token généré)"""
+        start_time = time.perf_counter()
+        await self.client.generate("Bonjour", options={"num_predict": 1})
+        return {"llm": round(time.perf_counter() - start_time, 4)}
+
+    async def aclose(self):
+        await self.client.aclose()
+
+# Instance unique pour l'application, créée au premier usage
+_llm_manager: Optional[LLMManager] = None
+_llm_manager_lock = threading.Lock()
+
+
+def get_llm_manager() -> LLMManager:
+    global _llm_manager
+    with _llm_manager_lock:
+        if _llm_manager is None:
+            _llm_manager = LLMManager()
+        return _llm_manager
@@ -0,0 +1,117 @@
+import httpx
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from src.monitoring.metrics import LLM_IN_FLIGHT, LLM_WAITING
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClient:
+    """
+    Client HTTP asynchrone pour l'API Ollama.
+
+    Les connexions keep-alive sont mutualisées par un httpx.AsyncClient unique
+    et le nombre de générations simultanées est borné par un sémaphore, afin
+    qu'un appel LLM de plusieurs minutes ne bloque jamais la boucle d'événements.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = "mistral",
+        temperature: float = 0.7,
+        timeout: float = 300,
+        max_concurrency: int = 2,
+        max_connections: int = 10
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Place de génération (sémaphore), comptée dans les jauges d'appels en attente et en cours"""
+        LLM_WAITING.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            LLM_WAITING.dec()
+        self.in_flight += 1
+        LLM_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            LLM_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    def _payload(self, prompt: str, stream: bool, options: Optional[Dict]) -> Dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {"temperature": self.temperature, **(options or {})}
+        }
+
+    async def generate(self, prompt: str, options: Optional[Dict] = None) -> str:
+        """Génère une réponse complète (sans streaming)"""
+        async with self._slot():
+            response = await self._client.post(
+                "/api/generate",
+                json=self._payload(prompt, stream=False, options=options)
+            )
+            response.raise_for_status()
+            return response.json().get("response", "")
+
+    async def stream(
+        self,
+        prompt: str,
+        options: Optional[Dict] = None,
+        stats: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Génère une réponse token par token. Si `stats` est fourni, il reçoit
+        les compteurs du dernier message d'Ollama (prompt_eval_count, eval_count...).
+        """
+        async with self._slot():
+            async with self._client.stream(
+                "POST",
+                "/api/generate",
+                json=self._payload(prompt, stream=True, options=options)
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(f"Erreur Ollama: {data['error']}")
+                    if data.get("response"):
+                        yield data["response"]
+                    if data.get("done"):
+                        if stats is not None:
+                            stats.update({
+                                key: data[key]
+                                for key in ("prompt_eval_count", "eval_count", "prompt_eval_duration",
+                                            "eval_duration", "load_duration", "total_duration")
+                                if key in data
+                            })
+                        break
+
+    async def aclose(self):
+        await self._client.aclose()
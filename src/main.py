@@ -1,23 +1,151 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Dict, Optional, List, Any
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, Optional, List, Any, Literal
+import asyncio
+import json
 import logging
+import os
+import time
 from datetime import datetime
-from enum import Enum
 
-from src.db.chroma import db_manager
-from src.ingestion.document_processor import document_processor
-from src.llm.manager import llm_manager
+from src.ingestion.parsers import DocumentParser, UnsupportedFormatError
+from src.jobs.queue import JobQueue, ProcessingStatus
+from src.llm.context import pack_context
+from src.monitoring.metrics import render_metrics, set_queue_gauges, trace_document
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Préchauffage au démarrage : modèle d'embedding, index de la collection et modèle Ollama
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+
+class Services:
+    """Gestionnaires partagés par les endpoints, créés une fois au démarrage"""
+
+    def __init__(self, db_manager, document_store, llm_manager, document_processor, job_queue):
+        self.db_manager = db_manager
+        self.document_store = document_store
+        self.llm_manager = llm_manager
+        self.document_processor = document_processor
+        self.job_queue = job_queue
+
+
+def create_job_queue() -> JobQueue:
+    """File de traitements persistante, partagée entre les workers uvicorn"""
+    return JobQueue(
+        path=os.getenv("JOB_QUEUE_PATH", os.path.join(os.getenv("DATA_DIR", "/app/data"), "jobs.sqlite3")),
+        handler=process_document_task,
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        max_running=int(os.getenv("JOB_MAX_RUNNING", "0")) or None,
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        backoff_base=float(os.getenv("JOB_RETRY_BACKOFF", "5")),
+        status_ttl=float(os.getenv("JOB_STATUS_TTL", str(24 * 3600)))
+    )
+
+
+def build_services() -> Services:
+    """
+    Ouvre ChromaDB, les stockages SQLite (file de traitements comprise) et
+    crée le client Ollama. Les modules correspondants (ChromaDB, LangChain)
+    ne sont importés qu'ici : importer src.main ne coûte presque rien et
+    n'écrit rien dans DATA_DIR, y compris sous --reload.
+    """
+    from src.db.chroma import get_db_manager
+    from src.db.document_store import get_document_store
+    from src.ingestion.document_processor import get_document_processor
+    from src.llm.manager import get_llm_manager
+
+    return Services(
+        db_manager=get_db_manager(),
+        document_store=get_document_store(),
+        llm_manager=get_llm_manager(),
+        document_processor=get_document_processor(),
+        job_queue=create_job_queue()
+    )
+
+
+async def create_services() -> Services:
+    """Crée les gestionnaires hors de la boucle d'événements puis démarre les workers de la file"""
+    start_time = time.perf_counter()
+    try:
+        services = await asyncio.to_thread(build_services)
+        await services.job_queue.start()
+        app.state.startup_info["init_time"] = round(time.perf_counter() - start_time, 4)
+        logger.info(f"Services initialisés en {time.perf_counter() - start_time:.2f}s")
+        return services
+    except Exception as e:
+        logger.error(f"Erreur lors de l'initialisation des services: {str(e)}")
+        raise
+
+
+async def warm_up(services: Services) -> Dict:
+    """
+    Charge les modèles avant la première requête. Un échec n'empêche pas le
+    démarrage : il est signalé par /readyz et la première requête paiera le chargement.
+    """
+    timings = {}
+    for name, manager in (("search", services.db_manager), ("llm", services.llm_manager)):
+        try:
+            timings.update(await manager.warm_up())
+        except Exception as e:
+            logger.warning(f"Préchauffage ({name}) impossible: {str(e)}")
+            timings[f"{name}_error"] = str(e)
+    logger.info(f"Préchauffage terminé: {timings}")
+    return timings
+
+
+async def finish_startup():
+    services = await asyncio.shield(app.state.services_task)
+    if WARMUP_ENABLED:
+        app.state.startup_info["warmup"] = await warm_up(services)
+    app.state.startup_info["ready_after"] = round(time.perf_counter() - app.state.started_at, 4)
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Le serveur accepte les connexions immédiatement : les gestionnaires sont
+    créés (puis préchauffés) en arrière-plan, les endpoints qui en dépendent
+    attendent la fin de l'initialisation et /readyz indique quand elle est terminée.
+    """
+    app.state.started_at = time.perf_counter()
+    app.state.ready = False
+    app.state.startup_info = {}
+    app.state.services_task = asyncio.create_task(create_services())
+    app.state.startup_task = asyncio.create_task(finish_startup())
+    try:
+        yield
+    finally:
+        app.state.startup_task.cancel()
+        await asyncio.gather(app.state.startup_task, app.state.services_task, return_exceptions=True)
+        document_parser.shutdown()
+        services_task = app.state.services_task
+        if not services_task.cancelled() and services_task.exception() is None:
+            services = services_task.result()
+            await services.job_queue.stop()
+            services.db_manager.embedder.shutdown()
+            await services.llm_manager.aclose()
+
+
+async def get_services(request: Request) -> Services:
+    """Dépendance des endpoints : attend la fin de l'initialisation (503 si elle a échoué)"""
+    try:
+        return await asyncio.shield(request.app.state.services_task)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Service indisponible: {str(e)}")
+
+
 app = FastAPI(
     title="RAG Document Management API",
     description="API de gestion documentaire avec RAG",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configuration CORS
@@ -35,18 +163,125 @@ class DocumentRequest(BaseModel):
     content: str = Field(..., description="Contenu du document")
     metadata: Dict[str, str] = Field(default_factory=dict, description="Métadonnées du document")
 
+class BatchDocumentRequest(BaseModel):
+    documents: List[DocumentRequest] = Field(..., min_length=1, max_length=1000, description="Documents à ajouter")
+
 class SearchRequest(BaseModel):
     query: str
     n_results: int = Field(default=3, ge=1, le=10)
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = Field(
+        default=None, description="Type de recherche (SEARCH_MODE par défaut)"
+    )
+    filters: Optional[Dict[str, Any]] = Field(
+        default=None, description="Filtre sur les métadonnées (clause where ChromaDB, ex. {\"author\": \"x\"})"
+    )
+    where_document: Optional[Dict[str, Any]] = Field(
+        default=None, description="Filtre sur le contenu (ex. {\"$contains\": \"garantie\"})"
+    )
+    min_relevance_score: float = Field(default=0.7, ge=0, le=1)
+    rerank: Optional[bool] = Field(
+        default=None, description="Regroupe les chunks consécutifs et diversifie les résultats (MMR)"
+    )
+    mmr_lambda: Optional[float] = Field(
+        default=None, ge=0, le=1, description="Compromis pertinence (1) / diversité (0) du MMR"
+    )
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=100, description="Requêtes traitées en un seul passage")
+    n_results: int = Field(default=3, ge=1, le=10)
+    filters: Optional[Dict[str, Any]] = Field(
+        default=None, description="Filtre sur les métadonnées, commun à toutes les requêtes"
+    )
+    where_document: Optional[Dict[str, Any]] = Field(
+        default=None, description="Filtre sur le contenu, commun à toutes les requêtes"
+    )
+    min_relevance_score: float = Field(default=0.7, ge=0, le=1)
 
-class ProcessingStatus(str, Enum):
-    PENDING = "pending"
-    PROCESSING = "processing"
-    COMPLETED = "completed"
-    FAILED = "failed"
+class AskRequest(BaseModel):
+    question: str = Field(..., min_length=1, description="Question posée sur les documents")
+    n_results: int = Field(default=5, ge=1, le=20, description="Chunks retrouvés avant construction du contexte")
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+    filters: Optional[Dict[str, Any]] = None
+    min_relevance_score: float = Field(default=0.5, ge=0, le=1)
+    max_context_tokens: Optional[int] = Field(default=None, ge=64, le=32000, description="Budget de tokens du contexte")
 
-# Cache pour le statut des traitements
-processing_status = {}
+class AnalyzeRequest(BaseModel):
+    content: str = Field(..., description="Contenu à analyser")
+    analysis_type: str = Field(default="default", description="Type d'analyse (default ou detailed)")
+
+async def process_document_task(doc_id: str, payload: Dict):
+    # Les workers ne démarrent qu'une fois les services créés
+    services = app.state.services_task.result()
+    with trace_document(doc_id):
+        await services.document_processor.process_document(
+            doc_id=doc_id,
+            content=payload["content"],
+            metadata=payload["metadata"]
+        )
+
+# Contre-pression de l'ingestion en masse : au-delà de JOB_MAX_PENDING traitements
+# en attente, les endpoints par lots attendent avant d'en ajouter d'autres
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+INGEST_STREAM_BUFFER = int(os.getenv("INGEST_STREAM_BUFFER", "100"))
+# Une ligne NDJSON plus longue (ou un corps sans saut de ligne) interrompt le flux en 413
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(10 * 1024 * 1024)))
+
+# Questions (/ask) : budget de tokens du contexte et taille maximale d'un extrait
+ASK_CONTEXT_TOKENS = int(os.getenv("ASK_CONTEXT_TOKENS", "1500"))
+ASK_MAX_CHUNK_TOKENS = int(os.getenv("ASK_MAX_CHUNK_TOKENS", "400"))
+
+# Extraction du texte des fichiers téléversés dans un pool de processus
+document_parser = DocumentParser()
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# Champs de formulaire et séparateurs multipart en plus du fichier
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Borne la taille du corps d'un téléversement pendant sa réception.
+
+    Starlette lit tout le formulaire multipart (fichier compris, sur disque
+    au-delà de 1 Mo) avant d'appeler l'endpoint, qui ne peut donc pas
+    interrompre un envoi trop volumineux. Un Content-Length trop grand est
+    refusé sans rien lire ; sinon (corps « chunked » notamment), les octets
+    reçus sont comptés et la lecture s'arrête sur une 413 dès que
+    max_file_bytes + overhead est dépassé.
+    """
+
+    def __init__(self, app, path: str, max_file_bytes: int, overhead: int = UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.path = path
+        self.max_file_bytes = max_file_bytes
+        self.max_body_bytes = max_file_bytes + overhead
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Fichier trop volumineux (max {self.max_file_bytes} octets)"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Levée pendant la lecture du formulaire : FastAPI la transmet telle quelle (413)
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware, path="/upload_document/", max_file_bytes=UPLOAD_MAX_BYTES)
 
 @app.get("/")
 async def read_root():
@@ -56,16 +291,44 @@ async def read_root():
         "timestamp": datetime.now().isoformat()
     }
 
+def startup_error() -> Optional[BaseException]:
+    services_task = app.state.services_task
+    if services_task.done() and not services_task.cancelled():
+        return services_task.exception()
+    return None
+
+@app.get("/healthz")
+async def healthz():
+    """Vivacité : le processus répond (503 seulement si l'initialisation a définitivement échoué)"""
+    error = startup_error()
+    if error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": str(error)})
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Disponibilité : services créés et, avec WARMUP_ENABLED, modèles préchargés"""
+    error = startup_error()
+    if error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": str(error)})
+    if not app.state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "starting",
+                "uptime": round(time.perf_counter() - app.state.started_at, 4),
+                **app.state.startup_info
+            }
+        )
+    return {"status": "ready", **app.state.startup_info}
+
 @app.post("/add_document/", status_code=202)
-async def api_add_document(request: DocumentRequest, background_tasks: BackgroundTasks):
+async def api_add_document(request: DocumentRequest, services: Services = Depends(get_services)):
     try:
-        processing_status[request.doc_id] = ProcessingStatus.PENDING
-        
-        background_tasks.add_task(
-            process_document_task,
+        await asyncio.to_thread(
+            services.job_queue.enqueue,
             request.doc_id,
-            request.content,
-            request.metadata
+            {"content": request.content, "metadata": request.metadata}
         )
 
         return {
@@ -77,51 +340,363 @@ async def api_add_document(request: DocumentRequest, background_tasks: Backgroun
 
     except Exception as e:
         logger.error(f"Erreur lors de l'ajout du document: {str(e)}")
-        processing_status[request.doc_id] = ProcessingStatus.FAILED
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_document_task(doc_id: str, content: str, metadata: Dict):
+@app.post("/upload_document/", status_code=202)
+async def api_upload_document(
+    file: UploadFile = File(..., description="Fichier PDF, HTML, Markdown ou texte"),
+    doc_id: Optional[str] = Form(None, description="Identifiant du document (nom du fichier par défaut)"),
+    author: str = Form(""),
+    category: str = Form(""),
+    source: str = Form(""),
+    services: Services = Depends(get_services)
+):
+    """Ajout d'un document à partir d'un fichier ; le texte est extrait hors de la boucle d'événements"""
+    # Le corps a déjà été borné à la réception (UploadSizeLimitMiddleware, marge du formulaire
+    # comprise) : seule la taille exacte du fichier reste à vérifier avant de le charger
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {UPLOAD_MAX_BYTES} octets)")
+    data = await file.read()
+
     try:
-        processing_status[doc_id] = ProcessingStatus.PROCESSING
-        
-        await document_processor.process_document(
-            doc_id=doc_id,
-            content=content,
-            metadata=metadata
+        parsed = await document_parser.parse(data, file.filename, file.content_type)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de l'extraction du texte de {file.filename}: {str(e)}")
+        raise HTTPException(status_code=422, detail=f"Impossible d'extraire le texte: {str(e)}")
+
+    if not parsed["text"]:
+        raise HTTPException(status_code=422, detail="Aucun texte extrait du fichier")
+
+    doc_id = doc_id or file.filename
+    metadata = {
+        "author": author,
+        "category": category,
+        "source": source or file.filename,
+        "filename": file.filename,
+        "format": parsed["format"]
+    }
+    try:
+        await asyncio.to_thread(
+            services.job_queue.enqueue,
+            doc_id,
+            {"content": parsed["text"], "metadata": metadata}
         )
+    except Exception as e:
+        logger.error(f"Erreur lors de l'ajout du document {doc_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        processing_status[doc_id] = ProcessingStatus.COMPLETED
+    return {
+        "status": "accepted",
+        "doc_id": doc_id,
+        "format": parsed["format"],
+        "extracted_chars": len(parsed["text"]),
+        "parse_time": parsed["parse_time"],
+        "status_endpoint": f"/status/{doc_id}"
+    }
 
+@app.post("/add_documents/", status_code=202)
+async def api_add_documents(request: BatchDocumentRequest, services: Services = Depends(get_services)):
+    """Ajout d'un lot de documents, suivi via /batches/{batch_id}"""
+    try:
+        batch_id = JobQueue.new_batch_id()
+        await services.job_queue.wait_for_capacity(JOB_MAX_PENDING)
+        accepted = await asyncio.to_thread(
+            services.job_queue.enqueue_many,
+            [(doc.doc_id, {"content": doc.content, "metadata": doc.metadata}) for doc in request.documents],
+            batch_id
+        )
+        return {
+            "status": "accepted",
+            "batch_id": batch_id,
+            "accepted": accepted,
+            "status_endpoint": f"/batches/{batch_id}"
+        }
     except Exception as e:
-        logger.error(f"Erreur lors du traitement de {doc_id}: {str(e)}")
-        processing_status[doc_id] = ProcessingStatus.FAILED
+        logger.error(f"Erreur lors de l'ajout du lot: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/add_documents/stream", status_code=202)
+async def api_add_documents_stream(request: Request, services: Services = Depends(get_services)):
+    """
+    Ingestion d'un flux NDJSON (un DocumentRequest par ligne).
+
+    Le corps est lu au fil de l'eau et les documents sont mis en file par
+    paquets de INGEST_STREAM_BUFFER. Quand la file est pleine, la lecture du
+    corps est suspendue : la contre-pression remonte jusqu'au client via TCP.
+    Une ligne de plus de INGEST_MAX_LINE_BYTES arrête la lecture (413) ; les
+    documents des lignes précédentes restent dans le lot.
+    """
+    batch_id = JobQueue.new_batch_id()
+    buffer = []
+    pending = bytearray()
+    accepted = 0
+    rejected = 0
+    errors = []
+
+    async def flush():
+        nonlocal accepted
+        await services.job_queue.wait_for_capacity(JOB_MAX_PENDING)
+        accepted += await asyncio.to_thread(services.job_queue.enqueue_many, list(buffer), batch_id)
+        buffer.clear()
+
+    def parse(line: bytes, line_number: int):
+        nonlocal rejected
+        if not line.strip():
+            return
+        try:
+            doc = DocumentRequest.model_validate_json(line)
+            buffer.append((doc.doc_id, {"content": doc.content, "metadata": doc.metadata}))
+        except ValidationError as e:
+            rejected += 1
+            if len(errors) < 20:
+                errors.append({"line": line_number, "error": str(e.errors()[0]["msg"])})
+
+    async def reject_long_line(line_number: int):
+        if buffer:
+            await flush()
+        logger.error(f"Lot {batch_id}: ligne {line_number} trop longue, lecture interrompue")
+        raise HTTPException(
+            status_code=413,
+            detail=f"Ligne {line_number} trop longue (max {INGEST_MAX_LINE_BYTES} octets), "
+                   f"lot {batch_id} interrompu après {accepted} documents"
+        )
+
+    try:
+        line_number = 0
+        async for data in request.stream():
+            # Recherche du saut de ligne dans les seuls octets reçus : la fin de ligne en attente a déjà été parcourue
+            search_from = len(pending)
+            pending += data
+            line_start = 0
+            while True:
+                line_end = pending.find(b"\n", search_from)
+                if line_end < 0:
+                    break
+                line_number += 1
+                if line_end - line_start > INGEST_MAX_LINE_BYTES:
+                    await reject_long_line(line_number)
+                parse(pending[line_start:line_end], line_number)
+                line_start = search_from = line_end + 1
+                if len(buffer) >= INGEST_STREAM_BUFFER:
+                    await flush()
+            del pending[:line_start]
+            if len(pending) > INGEST_MAX_LINE_BYTES:
+                await reject_long_line(line_number + 1)
+        if pending:
+            parse(pending, line_number + 1)
+        if buffer:
+            await flush()
+
+        logger.info(f"Lot {batch_id}: {accepted} documents mis en file, {rejected} rejetés")
+        return {
+            "status": "accepted",
+            "batch_id": batch_id,
+            "accepted": accepted,
+            "rejected": rejected,
+            "errors": errors,
+            "status_endpoint": f"/batches/{batch_id}"
+        }
+    except HTTPException:
         raise
+    except Exception as e:
+        logger.error(f"Erreur lors de l'ingestion NDJSON (lot {batch_id}): {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/batches/{batch_id}")
+async def api_batch_status(batch_id: str, services: Services = Depends(get_services)):
+    """Avancement agrégé d'un lot de documents"""
+    status = await asyncio.to_thread(services.job_queue.batch_status, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Lot {batch_id} non trouvé")
+    return status
 
 @app.get("/status/{doc_id}")
-async def get_processing_status(doc_id: str):
-    status = processing_status.get(doc_id, ProcessingStatus.PENDING)
-    return {"doc_id": doc_id, "status": status}
+async def get_processing_status(doc_id: str, services: Services = Depends(get_services)):
+    job = await asyncio.to_thread(services.job_queue.get_status, doc_id)
+    if job is None:
+        return {"doc_id": doc_id, "status": ProcessingStatus.PENDING}
+    return {"doc_id": doc_id, **job}
+
+@app.get("/queue_stats/")
+async def api_queue_stats(services: Services = Depends(get_services)):
+    """Profondeur de la file, temps d'attente et d'exécution des traitements"""
+    return await asyncio.to_thread(services.job_queue.stats)
 
 @app.post("/search_documents/")
-async def api_search_documents(request: SearchRequest):
+async def api_search_documents(request: SearchRequest, services: Services = Depends(get_services)):
     try:
-        results = await db_manager.search_documents(
+        results = await services.db_manager.search_documents(
             query=request.query,
-            n_results=request.n_results
+            n_results=request.n_results,
+            filters=request.filters,
+            min_relevance_score=request.min_relevance_score,
+            mode=request.mode,
+            where_document=request.where_document,
+            rerank=request.rerank,
+            mmr_lambda=request.mmr_lambda
         )
         return results
+    except ValueError as e:
+        # Filtre ou mode invalide
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors de la recherche: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search_documents/batch")
+async def api_search_documents_batch(request: BatchSearchRequest, services: Services = Depends(get_services)):
+    """Recherche vectorielle de plusieurs requêtes (un embedding et un parcours d'index pour le lot)"""
+    try:
+        return await services.db_manager.search_documents_batch(
+            queries=request.queries,
+            n_results=request.n_results,
+            filters=request.filters,
+            where_document=request.where_document,
+            min_relevance_score=request.min_relevance_score
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche par lot: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask")
+async def api_ask(request: AskRequest, services: Services = Depends(get_services)):
+    """
+    Réponse à une question à partir des documents, en Server-Sent Events :
+    - "sources" : extraits retenus pour le contexte et temps de recherche,
+    - "token" : fragments de la réponse au fil de la génération,
+    - "done" : mesures de la requête (recherche, tokens du prompt,
+      temps jusqu'au premier token, durée totale),
+    - "error" en cas d'échec pendant la génération.
+    """
+    start_time = time.perf_counter()
+    try:
+        search = await services.db_manager.search_documents(
+            query=request.question,
+            n_results=request.n_results,
+            filters=request.filters,
+            min_relevance_score=request.min_relevance_score,
+            mode=request.mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche pour /ask: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    retrieval_time = time.perf_counter() - start_time
+
+    packed = pack_context(
+        search["results"],
+        max_tokens=request.max_context_tokens or ASK_CONTEXT_TOKENS,
+        max_chunk_tokens=ASK_MAX_CHUNK_TOKENS
+    )
+
+    async def events():
+        metrics = {
+            "retrieval_time": round(retrieval_time, 4),
+            "context_tokens": packed["tokens"],
+            "sources": len(packed["sources"]),
+            "duplicates_skipped": packed["duplicates_skipped"],
+            "over_budget_skipped": packed["over_budget_skipped"]
+        }
+        yield sse_event("sources", {"sources": packed["sources"], "retrieval_time": metrics["retrieval_time"]})
+
+        if not packed["sources"]:
+            metrics["total_time"] = round(time.perf_counter() - start_time, 4)
+            yield sse_event("token", {"token": "Aucun document pertinent n'a été trouvé pour cette question."})
+            yield sse_event("done", metrics)
+            return
+
+        llm_stats: Dict = {}
+        first_token_time = None
+        answer_tokens = 0
+        try:
+            async for token in services.llm_manager.stream_answer(request.question, packed["context"], llm_stats):
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - start_time
+                answer_tokens += 1
+                yield sse_event("token", {"token": token})
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération de la réponse: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+            return
+
+        metrics.update({
+            "prompt_tokens": llm_stats.get("prompt_eval_count"),
+            "prompt_tokens_estimated": llm_stats.get("prompt_tokens_estimated"),
+            "answer_tokens": llm_stats.get("eval_count", answer_tokens),
+            "time_to_first_token": round(first_token_time, 4) if first_token_time is not None else None,
+            "total_time": round(time.perf_counter() - start_time, 4)
+        })
+        logger.info(
+            f"/ask : recherche {metrics['retrieval_time']}s, prompt ~{metrics['prompt_tokens_estimated']} tokens, "
+            f"premier token {metrics['time_to_first_token']}s, total {metrics['total_time']}s"
+        )
+        yield sse_event("done", metrics)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/documents/{doc_id}")
+async def api_get_document(doc_id: str, services: Services = Depends(get_services)):
+    """Données de niveau document : analyse IA, nombre de chunks, informations de traitement"""
+    record = await asyncio.to_thread(services.document_store.get, doc_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} non trouvé")
+    return record
+
+@app.post("/analyze_stream/")
+async def api_analyze_stream(request: AnalyzeRequest, services: Services = Depends(get_services)):
+    """Analyse d'un contenu avec renvoi progressif des tokens générés"""
+    return StreamingResponse(
+        services.llm_manager.stream_analysis(request.content, request.analysis_type),
+        media_type="text/plain; charset=utf-8"
+    )
+
+@app.get("/cache_stats/")
+async def api_cache_stats(services: Services = Depends(get_services)):
+    """Statistiques des caches (taux de succès, nombre d'entrées)"""
+    return {"llm": services.llm_manager.cache_stats(), **services.db_manager.cache_stats()}
+
+@app.get("/metrics")
+async def api_metrics():
+    """Métriques Prometheus : durée des étapes du pipeline, file de traitements, appels LLM"""
+    # Jauges de la file une fois les services créés : /metrics ne bloque pas pendant le démarrage
+    services_task = app.state.services_task
+    if services_task.done() and not services_task.cancelled() and services_task.exception() is None:
+        queue_stats = await asyncio.to_thread(services_task.result().job_queue.stats)
+        set_queue_gauges(queue_stats["depth"], queue_stats["running"])
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/embedding_stats/")
+async def api_embedding_stats(services: Services = Depends(get_services)):
+    """Backend d'embedding, taille des lots et débit mesuré (textes/s)"""
+    return services.db_manager.embedder.stats()
+
 @app.get("/document_versions/{doc_id}")
-async def api_get_document_versions(doc_id: str):
-    """Récupération de l'historique des versions"""
+async def api_get_document_versions(
+    doc_id: str,
+    include_content: bool = False,
+    services: Services = Depends(get_services)
+):
+    """Récupération de l'historique des versions (contenu des versions antérieures avec include_content)"""
     try:
-        result = await db_manager.get_document_versions(doc_id)
+        result = await services.db_manager.get_document_versions(doc_id, include_content)
         if "error" in result:
             raise HTTPException(status_code=404, detail=result["error"])
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des versions: {str(e)}")
         # Retourner une réponse d'erreur plus détaillée
@@ -130,6 +705,23 @@ async def api_get_document_versions(doc_id: str):
             detail=f"Erreur lors de la récupération des versions: {str(e)}"
         )
 
+@app.get("/document_versions/{doc_id}/{version}")
+async def api_get_document_version(doc_id: str, version: int, services: Services = Depends(get_services)):
+    """Contenu d'une version donnée d'un document"""
+    try:
+        result = await services.db_manager.get_document_version(doc_id, version)
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de la version {version} de {doc_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Version {version} du document {doc_id} non trouvée")
+    return result
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5010)
\ No newline at end of file
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1 and os.getenv("CHROMA_MODE", "embedded") == "embedded":
+        # Les fichiers SQLite/HNSW d'une base embarquée ne supportent qu'un seul processus
+        logger.warning("CHROMA_MODE=embedded : API_WORKERS ignoré, un seul worker démarré")
+        workers = 1
+    uvicorn.run("src.main:app", host="0.0.0.0", port=5010, workers=workers)
\ No newline at end of file
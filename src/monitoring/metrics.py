@@ -0,0 +1,252 @@
+"""
+Instrumentation du pipeline : métriques Prometheus par étape et traces
+OpenTelemetry optionnelles.
+
+Chaque étape (découpage, analyse LLM, embedding, écriture et requête
+ChromaDB, post-filtrage...) alimente l'histogramme rag_stage_duration_seconds
+et les compteurs rag_stage_items_total / rag_stage_errors_total, étiquetés
+par étape. Les jauges donnent la profondeur de la file de traitements et
+les appels LLM en cours.
+
+Avec plusieurs workers uvicorn, PROMETHEUS_MULTIPROC_DIR (répertoire vidé au
+démarrage) agrège les métriques de tous les processus.
+
+Avec TRACING_ENABLED=true et opentelemetry-api installé, chaque étape est
+aussi un span portant l'identifiant du document traité (rag.doc_id) ; sans
+configuration par opentelemetry-instrument, les spans sont exportés en OTLP
+si opentelemetry-sdk et l'exporteur OTLP sont installés.
+"""
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional, Tuple, TypeVar
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# De la milliseconde (requête, filtrage) à plusieurs minutes (analyse LLM)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Durée de chaque étape du pipeline",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+STAGE_ITEMS = Counter(
+    "rag_stage_items_total",
+    "Éléments traités par étape (chunks découpés, embeddés, écrits...)",
+    ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "rag_stage_errors_total",
+    "Étapes terminées en erreur",
+    ["stage"]
+)
+DOCUMENTS_PROCESSED = Counter(
+    "rag_documents_processed_total",
+    "Documents traités par la file, par statut",
+    ["status"]
+)
+SEARCHES = Counter(
+    "rag_searches_total",
+    "Recherches, par mode et selon qu'elles viennent du cache",
+    ["mode", "cached"]
+)
+SHARD_FANOUT = Histogram(
+    "rag_shard_fanout",
+    "Collections interrogées par opération sur une collection partitionnée",
+    ["operation"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "rag_job_queue_depth",
+    "Traitements en attente dans la file",
+    multiprocess_mode="mostrecent"
+)
+JOB_QUEUE_RUNNING = Gauge(
+    "rag_job_queue_running",
+    "Traitements en cours d'exécution",
+    multiprocess_mode="mostrecent"
+)
+LLM_IN_FLIGHT = Gauge(
+    "rag_llm_in_flight",
+    "Appels LLM en cours",
+    multiprocess_mode="livesum"
+)
+LLM_WAITING = Gauge(
+    "rag_llm_waiting",
+    "Appels LLM en attente d'une place (limite de concurrence)",
+    multiprocess_mode="livesum"
+)
+
+# Document en cours de traitement, propagé aux étapes (y compris dans asyncio.to_thread)
+current_doc_id: ContextVar[Optional[str]] = ContextVar("current_doc_id", default=None)
+
+
+def _create_tracer():
+    if os.getenv("TRACING_ENABLED", "false").lower() != "true":
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("TRACING_ENABLED=true mais opentelemetry-api n'est pas installé : traces désactivées")
+        return None
+
+    # Fournisseur déjà configuré (opentelemetry-instrument) : il est utilisé tel quel
+    if type(trace.get_tracer_provider()).__name__ == "ProxyTracerProvider":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            provider = TracerProvider(
+                resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "rag-api")})
+            )
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+        except ImportError:
+            logger.warning(
+                "opentelemetry-sdk ou l'exporteur OTLP absent : les spans ne sont exportés "
+                "que si un fournisseur est configuré (opentelemetry-instrument)"
+            )
+    logger.info("Traces OpenTelemetry activées")
+    return trace.get_tracer("rag-api")
+
+
+tracer = _create_tracer()
+
+
+def _span_attributes(stage: str, doc_id: Optional[str], **attributes) -> dict:
+    span_attributes = {"rag.stage": stage}
+    if doc_id is not None:
+        span_attributes["rag.doc_id"] = doc_id
+    span_attributes.update({
+        f"rag.{key}": value for key, value in attributes.items() if value is not None
+    })
+    return span_attributes
+
+
+@contextmanager
+def track_stage(stage: str, items: Optional[int] = None, doc_id: Optional[str] = None, **attributes):
+    """
+    Mesure une étape : durée, éléments traités et erreurs, et span
+    rag.<stage> si les traces sont activées. Le document courant
+    (trace_document) est utilisé si doc_id n'est pas fourni.
+    """
+    doc_id = doc_id or current_doc_id.get()
+    span_context = (
+        tracer.start_as_current_span(
+            f"rag.{stage}", attributes=_span_attributes(stage, doc_id, items=items, **attributes)
+        )
+        if tracer is not None else nullcontext()
+    )
+    start_time = time.perf_counter()
+    with span_context as span:
+        try:
+            yield span
+        except Exception:
+            STAGE_ERRORS.labels(stage).inc()
+            raise
+        finally:
+            duration = time.perf_counter() - start_time
+            STAGE_DURATION.labels(stage).observe(duration)
+            if items:
+                STAGE_ITEMS.labels(stage).inc(items)
+
+
+async def timed(stage: str, awaitable, **attributes):
+    """Attend `awaitable` en le mesurant comme une étape (pour asyncio.gather)"""
+    with track_stage(stage, **attributes):
+        return await awaitable
+
+
+def track_iter(stage: str, iterable: Iterable[T], doc_id: Optional[str] = None) -> Iterator[T]:
+    """
+    Mesure une étape produite paresseusement (découpage au fil de l'eau) :
+    seul le temps passé à produire les éléments est compté, pas celui du
+    consommateur. L'observation est faite quand l'itération se termine.
+    """
+    doc_id = doc_id or current_doc_id.get()
+    iterator = iter(iterable)
+    start_ns = time.time_ns()
+    busy = 0.0
+    count = 0
+    try:
+        while True:
+            step_start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                busy += time.perf_counter() - step_start
+                break
+            busy += time.perf_counter() - step_start
+            count += 1
+            yield item
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_DURATION.labels(stage).observe(busy)
+        if count:
+            STAGE_ITEMS.labels(stage).inc(count)
+        if tracer is not None:
+            span = tracer.start_span(
+                f"rag.{stage}",
+                start_time=start_ns,
+                attributes=_span_attributes(stage, doc_id, items=count, busy_seconds=round(busy, 6))
+            )
+            span.end()
+
+
+@contextmanager
+def trace_document(doc_id: str):
+    """
+    Traitement complet d'un document : toutes les étapes exécutées dans ce
+    bloc sont rattachées à doc_id (span parent rag.process_document).
+    """
+    token = current_doc_id.set(doc_id)
+    span_context = (
+        tracer.start_as_current_span("rag.process_document", attributes={"rag.doc_id": doc_id})
+        if tracer is not None else nullcontext()
+    )
+    try:
+        with span_context:
+            try:
+                yield
+            except Exception:
+                DOCUMENTS_PROCESSED.labels("failed").inc()
+                raise
+            DOCUMENTS_PROCESSED.labels("completed").inc()
+    finally:
+        current_doc_id.reset(token)
+
+
+def set_queue_gauges(depth: int, running: int):
+    JOB_QUEUE_DEPTH.set(depth)
+    JOB_QUEUE_RUNNING.set(running)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Métriques au format texte Prometheus (agrégées sur tous les processus en mode multiprocess)"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -50,6 +50,7 @@ def get_document_versions(doc_id):
     try:
         response = requests.get(
             f"{API_URL}/document_versions/{doc_id}",
+            params={"include_content": "true"},
             timeout=TIMEOUT
         )
         if response.status_code == 200:
@@ -120,7 +121,12 @@ def main():
                 success, results = search_documents(query, n_results)
                 if success and results.get("results"):
                     for i, doc in enumerate(results["results"], 1):
-                        with st.expander(f"Document {i} (Score: {doc['relevance_score']:.2f})"):
+                        # Les résultats trouvés uniquement par l'index lexical n'ont pas de score vectoriel
+                        if doc.get("relevance_score") is not None:
+                            score = f"Score: {doc['relevance_score']:.2f}"
+                        else:
+                            score = f"BM25: {doc.get('lexical_score', 0):.2f}"
+                        with st.expander(f"Document {i} ({score})"):
                             st.markdown("**Contenu:**")
                             st.write(doc["content"])
                             st.markdown("**Métadonnées:**")
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from src.db.bm25 import BM25Index, tokenize
+
+WORDS = ["garantie", "contrat", "résiliation", "préavis", "prestataire", "maintenance", "XR-2041-B", "facture",
+         "délai", "pénalité", "clause", "article", "assurance", "sinistre", "durée"]
+
+
+def scores(index, query, k=1000):
+    return dict(index.search(query, k))
+
+
+def assert_same_scores(index, reference, query):
+    expected = scores(reference, query)
+    found = scores(index, query)
+    assert found.keys() == expected.keys()
+    for chunk_id, score in expected.items():
+        assert found[chunk_id] == pytest.approx(score)
+
+
+def test_tokenize_keeps_references():
+    assert tokenize("Pièce XR-2041-B, norme ISO/IEC v2.3") == ["pièce", "xr-2041-b", "norme", "iso/iec", "v2.3"]
+
+
+def test_reindexed_chunk_masks_previous_version(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"))
+    index.add(["c1", "c2"], ["garantie du contrat", "facture de maintenance"])
+    index.add(["c1"], ["résiliation avec préavis"])
+
+    assert scores(index, "garantie") == {}
+    assert set(scores(index, "préavis")) == {"c1"}
+    assert index.stats()["live_chunks"] == 2
+
+
+def test_deleted_chunk_is_not_returned(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"))
+    index.add(["c1", "c2"], ["garantie du contrat", "garantie de maintenance"])
+    index.delete(["c1"])
+
+    assert set(scores(index, "garantie")) == {"c2"}
+    assert index.stats()["live_chunks"] == 1
+    # Une nouvelle version après la suppression est de nouveau visible
+    index.add(["c1"], ["garantie décennale"])
+    assert set(scores(index, "garantie")) == {"c1", "c2"}
+
+
+def test_merged_segments_match_single_segment_index(tmp_path):
+    generator = random.Random(12)
+    index = BM25Index(str(tmp_path / "bm25"), max_segments=4)
+    live = {}
+    for step in range(60):
+        if live and generator.random() < 0.25:
+            removed = generator.sample(sorted(live), min(len(live), generator.randint(1, 3)))
+            index.delete(removed)
+            for chunk_id in removed:
+                del live[chunk_id]
+        else:
+            ids = [f"c{generator.randrange(40)}" for _ in range(generator.randint(1, 4))]
+            texts = [" ".join(generator.choices(WORDS, k=generator.randint(3, 12))) for _ in ids]
+            index.add(ids, texts)
+            # Le dernier texte d'un identifiant répété dans un même lot est celui qui reste visible
+            live.update(zip(ids, texts))
+        assert index.stats()["segments"] <= 4
+
+    reference = BM25Index(str(tmp_path / "reference"))
+    reference.add(list(live), list(live.values()))
+    assert index.stats()["live_chunks"] == len(live)
+    for query in ["garantie", "contrat préavis", "XR-2041-B", "sinistre assurance durée", "inconnu"]:
+        assert_same_scores(index, reference, query)
+
+
+def test_merge_drops_tombstones_of_oldest_segments(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"), max_segments=2)
+    index.add(["c1", "c2"], ["garantie", "contrat"])
+    index.delete(["c1"])
+    # Troisième segment : fusion de toute la fenêtre, suppressions comprises
+    index.add(["c3"], ["préavis"])
+
+    stats = index.stats()
+    assert stats["segments"] <= 2
+    assert stats["live_chunks"] == 2
+    assert all("c1" not in segment.doc_ids for segment in index._segments)
+    assert scores(index, "garantie") == {}
+
+
+def test_other_instance_sees_new_segments(tmp_path):
+    writer = BM25Index(str(tmp_path / "bm25"), max_segments=3)
+    reader = BM25Index(str(tmp_path / "bm25"), max_segments=3)
+    assert reader.search("garantie") == []
+
+    for index in range(5):
+        writer.add([f"c{index}"], [f"garantie numéro {index}"])
+    writer.delete(["c0"])
+    assert set(scores(reader, "garantie")) == {"c1", "c2", "c3", "c4"}
@@ -0,0 +1,90 @@
+import os
+
+import chromadb
+import pytest
+
+from src.db.compact import compact_collection
+
+
+class MemoryStore:
+    """Stockage des documents réduit à upsert"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def upsert(self, doc_id, **fields):
+        self.documents[doc_id] = fields
+
+
+class FailingAdd:
+    """Collection dont l'ajout échoue : arrêt entre la suppression et la réinsertion"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def add(self, **kwargs):
+        raise RuntimeError("arrêt brutal")
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).create_collection("documents")
+    collection.add(
+        ids=[f"doc_chunk_{index}" for index in range(5)],
+        embeddings=[[float(index), 1.0] for index in range(5)],
+        documents=[f"extrait {index}" for index in range(5)],
+        metadatas=[
+            {"doc_id": "doc", "chunk_index": index, "author": "x", "ai_analysis": "analyse " * 50, "chunks_count": 5}
+            for index in range(5)
+        ]
+    )
+    return collection
+
+
+def assert_compacted(collection):
+    stored = collection.get(include=["metadatas", "documents", "embeddings"])
+    assert sorted(stored["ids"]) == [f"doc_chunk_{index}" for index in range(5)]
+    for chunk_id, metadata, document, embedding in zip(
+        stored["ids"], stored["metadatas"], stored["documents"], stored["embeddings"]
+    ):
+        index = int(chunk_id.rsplit("_", 1)[1])
+        assert metadata == {"doc_id": "doc", "chunk_index": index, "author": "x"}
+        assert document == f"extrait {index}"
+        assert list(embedding) == [float(index), 1.0]
+
+
+def test_compaction_moves_analysis_to_document_store(collection, tmp_path):
+    store = MemoryStore()
+    report = compact_collection(collection, store, page_size=2, journal_path=str(tmp_path / "journal.json"))
+
+    assert report["chunks_compacted"] == 5
+    assert report["metadata_bytes_after"] < report["metadata_bytes_before"]
+    assert store.documents["doc"]["analysis"].startswith("analyse")
+    assert store.documents["doc"]["chunks_count"] == 5
+    assert_compacted(collection)
+    assert not os.path.exists(tmp_path / "journal.json")
+
+
+def test_dry_run_writes_nothing(collection, tmp_path):
+    store = MemoryStore()
+    report = compact_collection(collection, store, dry_run=True, journal_path=str(tmp_path / "journal.json"))
+    assert report["chunks_compacted"] == 5
+    assert store.documents == {}
+    assert all("ai_analysis" in metadata for metadata in collection.get()["metadatas"])
+
+
+def test_interrupted_batch_is_replayed(collection, tmp_path):
+    journal_path = str(tmp_path / "journal.json")
+    with pytest.raises(RuntimeError):
+        compact_collection(FailingAdd(collection), MemoryStore(), page_size=2, journal_path=journal_path)
+    # Le premier lot a été supprimé sans être réinséré, mais il est dans le journal
+    assert collection.count() == 3
+    assert os.path.exists(journal_path)
+
+    report = compact_collection(collection, MemoryStore(), page_size=2, journal_path=journal_path)
+    assert report["chunks_replayed"] == 2
+    assert_compacted(collection)
+    assert not os.path.exists(journal_path)
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from src.llm.context import TRUNCATION_SUFFIX, estimate_tokens, pack_context, truncate_to_tokens
+
+WORDS = ["garantie", "contrat", "résiliation", "préavis", "le", "de", "prestataire", "article", "clause", "durée"]
+
+
+def make_text(generator, words):
+    return " ".join(generator.choice(WORDS) for _ in range(words))
+
+
+@pytest.mark.parametrize("max_tokens", [2, 10, 50, 51, 200])
+def test_truncated_text_fits_budget(max_tokens):
+    generator = random.Random(max_tokens)
+    for _ in range(50):
+        text = make_text(generator, generator.randint(1, 400))
+        truncated = truncate_to_tokens(text, max_tokens)
+        assert estimate_tokens(truncated) <= max_tokens
+        if truncated != text:
+            assert truncated.endswith(TRUNCATION_SUFFIX)
+
+
+def test_short_text_is_unchanged():
+    assert truncate_to_tokens("clause de résiliation", 50) == "clause de résiliation"
+
+
+def test_packed_context_fits_budget():
+    generator = random.Random(3)
+    results = [
+        {"id": f"c{index}", "content": make_text(generator, generator.randint(20, 300)),
+         "metadata": {"doc_id": f"doc{index}", "chunk_index": index}}
+        for index in range(20)
+    ]
+    for max_tokens in (60, 200, 500, 1000):
+        packed = pack_context(results, max_tokens, max_chunk_tokens=150)
+        assert packed["tokens"] <= max_tokens
+        assert estimate_tokens(packed["context"]) <= max_tokens
+
+
+def test_duplicates_are_skipped():
+    content = "le prestataire assure la maintenance du service pendant toute la durée du contrat"
+    results = [
+        {"id": "a", "content": content, "metadata": {"doc_id": "doc"}},
+        {"id": "b", "content": content + " ", "metadata": {"doc_id": "doc"}},
+        {"id": "c", "content": content + " sans exception", "metadata": {"doc_id": "doc"}}
+    ]
+    packed = pack_context(results, 1000)
+    assert [source["id"] for source in packed["sources"]] == ["a"]
+    assert packed["duplicates_skipped"] == 2
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+import src.main as main
+
+
+class MemoryQueue:
+    """File de tâches réduite à ce qu'utilise l'ingestion NDJSON"""
+
+    def __init__(self):
+        self.items = []
+
+    async def wait_for_capacity(self, max_pending):
+        return None
+
+    def enqueue_many(self, items, batch_id):
+        self.items.extend(items)
+        return len(items)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = MemoryQueue()
+    services = main.Services(None, None, None, None, queue)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_services, lambda: services)
+    monkeypatch.setattr(main, "INGEST_STREAM_BUFFER", 2)
+    return queue
+
+
+def post_stream(body, block_size):
+    """Envoie le corps par blocs ; renvoie le statut, la réponse et le nombre de blocs lus sur le total"""
+    blocks = [body[start:start + block_size] for start in range(0, len(body), block_size)] or [b""]
+    received = []
+    sent = []
+
+    async def receive():
+        index = len(received)
+        received.append(index)
+        return {"type": "http.request", "body": blocks[index], "more_body": index < len(blocks) - 1}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/add_documents/stream", "raw_path": b"/add_documents/stream", "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/x-ndjson")],
+        "client": ("test", 1), "server": ("testserver", 80)
+    }
+    asyncio.run(main.app(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    return sent[0]["status"], json.loads(body), len(received), len(blocks)
+
+
+def ndjson(*lines):
+    return b"\n".join(line if isinstance(line, bytes) else json.dumps(line).encode() for line in lines)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 10_000])
+def test_lines_split_across_blocks_are_parsed_once(queue, block_size):
+    body = ndjson(
+        {"doc_id": "a", "content": "garantie"}, b"", {"doc_id": "b", "content": "contrat"},
+        b"{pas du json", {"doc_id": "c", "content": "préavis", "metadata": {"author": "x"}}
+    )
+    status, response, _, _ = post_stream(body, block_size)
+
+    assert status == 202
+    assert (response["accepted"], response["rejected"]) == (3, 1)
+    assert [error["line"] for error in response["errors"]] == [4]
+    assert [doc_id for doc_id, _ in queue.items] == ["a", "b", "c"]
+    assert queue.items[2][1] == {"content": "préavis", "metadata": {"author": "x"}}
+
+
+def test_long_line_stops_the_stream(queue, monkeypatch):
+    monkeypatch.setattr(main, "INGEST_MAX_LINE_BYTES", 100)
+    body = ndjson({"doc_id": "a", "content": "garantie"}, {"doc_id": "b", "content": "x" * 10_000},
+                  {"doc_id": "c", "content": "contrat"})
+    status, response, received, total = post_stream(body, 16)
+
+    assert status == 413
+    assert "Ligne 2" in response["detail"]
+    # La lecture s'arrête peu après la limite ; les documents précédents restent dans le lot
+    assert received * 16 <= 200
+    assert received < total
+    assert [doc_id for doc_id, _ in queue.items] == ["a"]
+
+
+def test_long_final_line_without_newline_is_refused(queue, monkeypatch):
+    monkeypatch.setattr(main, "INGEST_MAX_LINE_BYTES", 100)
+    status, response, _, _ = post_stream(ndjson({"doc_id": "a", "content": "x" * 1000}), 10_000)
+
+    assert status == 413
+    assert queue.items == []
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+from src.jobs.queue import JobQueue, ProcessingStatus
+
+
+async def noop(doc_id, payload):
+    pass
+
+
+def make_queue(tmp_path, handler=noop, **kwargs):
+    options = {"workers": 1, "max_attempts": 3, "backoff_base": 0.01, "backoff_max": 0.05, "poll_interval": 0.05}
+    options.update(kwargs)
+    return JobQueue(str(tmp_path / "jobs.db"), handler, **options)
+
+
+async def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "délai dépassé"
+        await asyncio.sleep(0.01)
+
+
+def test_failed_job_is_retried_until_success(tmp_path):
+    calls = []
+
+    async def flaky(doc_id, payload):
+        calls.append(doc_id)
+        if len(calls) < 3:
+            raise RuntimeError("erreur passagère")
+
+    async def scenario():
+        queue = make_queue(tmp_path, flaky)
+        queue.enqueue("doc", {})
+        await queue.start()
+        try:
+            await wait_until(lambda: queue.get_status("doc")["status"] == ProcessingStatus.COMPLETED.value)
+        finally:
+            await queue.stop()
+        return queue.get_status("doc")
+
+    status = asyncio.run(scenario())
+    assert calls == ["doc"] * 3
+    assert status["attempts"] == 3
+    assert status["error"] is None
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    async def broken(doc_id, payload):
+        raise RuntimeError("toujours en échec")
+
+    async def scenario():
+        queue = make_queue(tmp_path, broken, max_attempts=2)
+        queue.enqueue("doc", {})
+        await queue.start()
+        try:
+            await wait_until(lambda: queue.get_status("doc")["status"] == ProcessingStatus.FAILED.value)
+        finally:
+            await queue.stop()
+        return queue.get_status("doc")
+
+    status = asyncio.run(scenario())
+    assert status["attempts"] == 2
+    assert status["error"] == "toujours en échec"
+
+
+def test_expired_lease_is_requeued_then_failed(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2, lease_timeout=0.01)
+    queue.enqueue("doc", {})
+
+    # Worker disparu : le traitement reste PROCESSING et son bail expire
+    assert queue._claim()["attempts"] == 1
+    time.sleep(0.02)
+    job = queue._claim()
+    assert job is not None and job["attempts"] == 2
+
+    time.sleep(0.02)
+    assert queue._claim() is None
+    status = queue.get_status("doc")
+    assert status["status"] == ProcessingStatus.FAILED.value
+    assert status["attempts"] == 2
+
+
+def test_lease_is_renewed_while_job_runs(tmp_path):
+    release = threading.Event()
+
+    async def slow(doc_id, payload):
+        await asyncio.to_thread(release.wait, 5)
+
+    async def scenario():
+        queue = make_queue(tmp_path, slow, lease_timeout=0.15)
+        queue.enqueue("doc", {})
+        await queue.start()
+        try:
+            await wait_until(lambda: queue.get_status("doc")["status"] == ProcessingStatus.PROCESSING.value)
+            # Plusieurs durées de bail : sans renouvellement, un autre worker le reprendrait
+            await asyncio.sleep(0.5)
+            other = make_queue(tmp_path, lease_timeout=0.15, max_running=2)
+            assert other._claim() is None
+            release.set()
+            await wait_until(lambda: queue.get_status("doc")["status"] == ProcessingStatus.COMPLETED.value)
+        finally:
+            release.set()
+            await queue.stop()
+        return queue.get_status("doc")
+
+    assert asyncio.run(scenario())["attempts"] == 1
+
+
+def test_document_in_progress_is_not_claimed_twice(tmp_path):
+    queue = make_queue(tmp_path, max_running=4)
+    queue.enqueue("doc", {"version": 1})
+    queue.enqueue("doc", {"version": 2})
+    queue.enqueue("autre", {})
+
+    first = queue._claim()
+    second = queue._claim()
+    assert first["payload"] == {"version": 1}
+    assert second["doc_id"] == "autre"
+    assert queue._claim() is None
+
+    queue._complete(first["id"])
+    assert queue._claim()["payload"] == {"version": 2}
+
+
+def test_notify_from_thread_wakes_worker(tmp_path):
+    done = []
+
+    async def handler(doc_id, payload):
+        done.append(time.monotonic())
+
+    async def scenario():
+        # Sans réveil, le worker n'interrogerait la file que toutes les 30 s
+        queue = make_queue(tmp_path, handler, poll_interval=30)
+        await queue.start()
+        try:
+            await asyncio.sleep(0.1)
+            start = time.monotonic()
+            await asyncio.to_thread(queue.enqueue, "doc", {})
+            await wait_until(lambda: done)
+        finally:
+            await queue.stop()
+        return done[0] - start
+
+    assert asyncio.run(scenario()) < 5
@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_writes_nothing_and_loads_no_heavy_module(tmp_path):
+    data_dir = tmp_path / "data"
+    output = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, src.main; print(sorted({m.split('.')[0] for m in sys.modules} & {'chromadb', 'langchain'}))"],
+        cwd=ROOT, env={**os.environ, "DATA_DIR": str(data_dir)},
+        check=True, capture_output=True, text=True
+    ).stdout
+    assert output.strip() == "[]"
+    assert not data_dir.exists()
@@ -0,0 +1,59 @@
+import os
+import threading
+
+from src.db.query_cache import CollectionGeneration, LRUCache, make_search_key
+
+
+def test_bump_changes_generation_seen_by_other_instances(tmp_path):
+    path = str(tmp_path / "collection.generation")
+    writer = CollectionGeneration(path)
+    reader = CollectionGeneration(path)
+    before = reader.current()
+    writer.bump()
+    # Un autre processus ne voit que le fichier : son compteur local est inchangé
+    assert reader.current() != before
+
+
+def test_search_key_invalidated_by_bump(tmp_path):
+    generation = CollectionGeneration(str(tmp_path / "collection.generation"))
+    cache = LRUCache(max_entries=8)
+    key = make_search_key(generation.current(), query="garantie", n_results=3)
+    cache.set(key, {"results": []})
+    generation.bump()
+    assert cache.get(make_search_key(generation.current(), query="garantie", n_results=3)) is None
+
+
+def test_concurrent_bumps_do_not_fail(tmp_path):
+    generation = CollectionGeneration(str(tmp_path / "collection.generation"))
+    errors = []
+
+    def bump_many():
+        for _ in range(500):
+            try:
+                generation.bump()
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=bump_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert generation.current()[0] == 1 + 4 * 500
+    assert os.listdir(tmp_path) == ["collection.generation"]
+
+
+def test_lru_cache_evicts_and_expires():
+    cache = LRUCache(max_entries=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    expiring = LRUCache(max_entries=2, ttl=0)
+    expiring.set("a", 1)
+    assert expiring.get("a") is None
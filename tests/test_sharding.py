@@ -0,0 +1,156 @@
+import chromadb
+import numpy as np
+import pytest
+
+from src.db.sharding import COLLECTION_METADATA, ShardRouter, ShardedCollection, rebalance, shard_stats
+
+CATEGORIES = ["contrat", "facture", "devis", ""]
+
+
+class Generation:
+    """Compteur de génération : incrémenté à chaque écriture, comme CollectionGeneration"""
+
+    def __init__(self):
+        self.value = 0
+
+    def current(self):
+        return self.value
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    generation = Generation()
+    collection = ShardedCollection(client, ShardRouter("key", key="category"), version=generation.current)
+    return collection, generation
+
+
+def add_chunks(collection, generation, doc_id, category, count, method="add"):
+    ids = [f"{doc_id}_chunk_{index:04d}" for index in range(count)]
+    getattr(collection, method)(
+        ids=ids,
+        embeddings=[[float(index), 1.0] for index in range(count)],
+        metadatas=[{"doc_id": doc_id, "category": category} for _ in ids],
+        documents=[f"{doc_id} {index}" for index in range(count)]
+    )
+    generation.value += 1
+    return ids
+
+
+def test_upsert_with_new_key_moves_chunk(sharded):
+    collection, generation = sharded
+    add_chunks(collection, generation, "doc", "contrat", 3)
+    add_chunks(collection, generation, "doc", "facture", 3, method="upsert")
+
+    assert collection.count() == 3
+    stored = collection.get(where={"doc_id": "doc"})
+    assert {metadata["category"] for metadata in stored["metadatas"]} == {"facture"}
+    assert collection.get(where={"category": "contrat"})["ids"] == []
+
+
+def test_add_of_existing_id_is_ignored(sharded):
+    collection, generation = sharded
+    add_chunks(collection, generation, "doc", "contrat", 2)
+    add_chunks(collection, generation, "doc", "facture", 2)
+
+    assert collection.count() == 2
+    assert {metadata["category"] for metadata in collection.get()["metadatas"]} == {"contrat"}
+
+
+def test_paged_get_with_where_matches_full_read(sharded):
+    collection, generation = sharded
+    for index, category in enumerate(["a", "b", "c", "d"]):
+        add_chunks(collection, generation, f"doc{index}", category, 5 + index)
+    add_chunks(collection, generation, "autre", "b", 4)
+
+    where = {"doc_id": {"$in": ["doc0", "doc1", "doc2", "doc3"]}}
+    expected = collection.get(where=where, include=[])["ids"]
+    assert len(expected) == 26
+    for page_size in (1, 3, 7, 30):
+        pages = []
+        for offset in range(0, len(expected) + page_size, page_size):
+            pages.extend(collection.get(where=where, limit=page_size, offset=offset, include=[])["ids"])
+        assert pages == expected
+    assert collection.get(where=where, offset=10, include=[])["ids"] == expected[10:]
+
+
+def test_shard_sizes_forgotten_after_write(sharded):
+    collection, generation = sharded
+    add_chunks(collection, generation, "doc0", "a", 4)
+    add_chunks(collection, generation, "doc1", "b", 4)
+    where = {"doc_id": {"$in": ["doc0", "doc1"]}}
+    assert len(collection.get(where=where, limit=10, offset=5, include=[])["ids"]) == 3
+
+    add_chunks(collection, generation, "doc0", "a", 6, method="upsert")
+    assert len(collection.get(where=where, limit=10, offset=5, include=[])["ids"]) == 5
+
+
+def random_chunks(count, seed=0):
+    """Chunks de 12 documents répartis sur les catégories (une vide : shard par défaut en mode key)"""
+    generator = np.random.default_rng(seed)
+    ids = [f"doc{index % 12}_chunk_{index:04d}" for index in range(count)]
+    return {
+        "ids": ids,
+        "embeddings": generator.standard_normal((count, 8)).tolist(),
+        "metadatas": [
+            {"doc_id": f"doc{index % 12}", "category": CATEGORIES[index % 12 % len(CATEGORIES)]} for index in range(count)
+        ],
+        "documents": [f"extrait {index}" for index in range(count)]
+    }
+
+
+@pytest.mark.parametrize("router", [ShardRouter("key", key="category"), ShardRouter("hash", count=3)],
+                         ids=["key", "hash"])
+@pytest.mark.parametrize("where", [
+    None,
+    {"category": "facture"},
+    {"category": {"$in": ["contrat", "devis"]}},
+    {"doc_id": {"$in": ["doc1", "doc2", "doc7"]}},
+    {"$and": [{"category": "contrat"}, {"doc_id": {"$ne": "doc0"}}]}
+])
+def test_query_matches_single_collection(tmp_path, router, where):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    chunks = random_chunks(240)
+    reference = client.create_collection("reference", metadata=COLLECTION_METADATA)
+    reference.add(**chunks)
+    sharded = ShardedCollection(client, router)
+    sharded.add(**chunks)
+    assert len(sharded.shards()) > 1
+
+    queries = np.random.default_rng(1).standard_normal((4, 8)).tolist()
+    for k in (1, 5, 12):
+        expected = reference.query(query_embeddings=queries, n_results=k, where=where,
+                                   include=["distances", "metadatas", "documents"])
+        found = sharded.query(query_embeddings=queries, n_results=k, where=where,
+                              include=["distances", "metadatas", "documents"])
+        assert found["ids"] == expected["ids"]
+        assert found["metadatas"] == expected["metadatas"]
+        assert found["documents"] == expected["documents"]
+        for found_distances, expected_distances in zip(found["distances"], expected["distances"]):
+            assert found_distances == pytest.approx(expected_distances, rel=1e-4)
+
+
+def test_rebalance_moves_every_chunk_to_its_shard(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    chunks = random_chunks(100)
+    ShardedCollection(client, ShardRouter("key", key="category")).add(**chunks)
+
+    router = ShardRouter("hash", count=3)
+    report = rebalance(client, router, page_size=7, drop_empty=True)
+
+    assert report["chunks_scanned"] == 100
+    assert report["chunks_moved"] == 100
+    located = {}
+    for stats in shard_stats(client, router):
+        assert stats["active"]
+        stored = client.get_collection(stats["collection"]).get(include=["embeddings", "metadatas"])
+        for chunk_id, embedding, metadata in zip(stored["ids"], stored["embeddings"], stored["metadatas"]):
+            assert router.shard_for(chunk_id, metadata) == stats["collection"]
+            located[chunk_id] = (embedding, metadata)
+    assert sorted(located) == sorted(chunks["ids"])
+    for chunk_id, embedding, metadata in zip(chunks["ids"], chunks["embeddings"], chunks["metadatas"]):
+        assert located[chunk_id][0] == pytest.approx(embedding, rel=1e-6)
+        assert located[chunk_id][1] == metadata
+
+    # Disposition déjà respectée : rien à déplacer
+    assert rebalance(client, router, page_size=7)["chunks_moved"] == 0
@@ -0,0 +1,128 @@
+import chromadb
+import numpy as np
+import pytest
+
+from benchmarks.fake_s3 import FakeS3Server
+from src.db.object_store import LocalObjectStore, S3ObjectStore
+from src.db.snapshot import EMBEDDINGS_FILE, RECORDS_FILE, export_snapshot, import_snapshot
+
+CHUNKS = 25
+DIMENSION = 4
+
+
+class Embedder:
+    def __init__(self, name="hash", dimension=DIMENSION):
+        self.name = name
+        self.dimension = dimension
+
+
+class CollectionLoader:
+    """Gestionnaire réduit à ce qu'utilise l'import : backend, taille des lots et bulk_load"""
+
+    def __init__(self, collection, embedder=None):
+        self.collection = collection
+        self.embedder = embedder or Embedder()
+        self.batch_size = 7
+
+    def bulk_load(self, ids, contents, embeddings, metadatas):
+        self.collection.upsert(ids=ids, documents=contents, embeddings=embeddings.tolist(), metadatas=metadatas)
+
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+
+
+@pytest.fixture
+def source(client):
+    collection = client.create_collection("source")
+    generator = np.random.default_rng(0)
+    collection.add(
+        ids=[f"doc{index % 4}_chunk_{index:04d}" for index in range(CHUNKS)],
+        embeddings=generator.standard_normal((CHUNKS, DIMENSION)).astype(np.float32).tolist(),
+        documents=[f"extrait {index} : clause de résiliation" for index in range(CHUNKS)],
+        metadatas=[{"doc_id": f"doc{index % 4}", "chunk_index": index, "author": "é"} for index in range(CHUNKS)]
+    )
+    return collection
+
+
+@pytest.fixture
+def s3_store(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    server = FakeS3Server().start()
+    try:
+        yield S3ObjectStore("snapshots", endpoint_url=server.url)
+    finally:
+        server.stop()
+
+
+def contents_of(collection):
+    stored = collection.get(include=["embeddings", "documents", "metadatas"])
+    return {
+        chunk_id: (list(np.float32(embedding)), document, metadata)
+        for chunk_id, embedding, document, metadata in zip(
+            stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"]
+        )
+    }
+
+
+def assert_round_trip(client, source, store, tmp_path):
+    manifest = export_snapshot(source, store, "s1", "hash", page_size=10, tmp_dir=str(tmp_path))
+    assert (manifest["count"], manifest["dimension"]) == (CHUNKS, DIMENSION)
+
+    target = client.create_collection("target")
+    result = import_snapshot(CollectionLoader(target), store, "s1", tmp_dir=str(tmp_path))
+    assert result["chunks"] == CHUNKS
+    assert contents_of(target) == contents_of(source)
+
+
+def test_round_trip_through_local_store(client, source, tmp_path):
+    assert_round_trip(client, source, LocalObjectStore(str(tmp_path / "snapshots")), tmp_path)
+
+
+def test_round_trip_through_s3(client, source, s3_store, tmp_path):
+    assert_round_trip(client, source, s3_store, tmp_path)
+
+
+@pytest.mark.parametrize("filename", [EMBEDDINGS_FILE, RECORDS_FILE])
+def test_tampered_file_fails_checksum(client, source, tmp_path, filename):
+    store = LocalObjectStore(str(tmp_path / "snapshots"))
+    export_snapshot(source, store, "s1", "hash")
+    path = store.local_path(f"s1/{filename}")
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    target = client.create_collection("target")
+    with pytest.raises(ValueError, match="corrompu"):
+        import_snapshot(CollectionLoader(target), store, "s1")
+    assert target.count() == 0
+
+
+def test_tampered_file_fails_checksum_through_s3(client, source, s3_store):
+    export_snapshot(source, s3_store, "s1", "hash")
+    # Même taille, un octet modifié : seule l'empreinte SHA-256 le détecte
+    data = bytearray(s3_store.get_bytes(f"s1/{EMBEDDINGS_FILE}"))
+    data[-1] ^= 0xFF
+    s3_store.put_bytes(f"s1/{EMBEDDINGS_FILE}", bytes(data))
+
+    with pytest.raises(ValueError, match="corrompu"):
+        import_snapshot(CollectionLoader(client.create_collection("target")), s3_store, "s1")
+
+
+@pytest.mark.parametrize("embedder", [Embedder(name="ollama"), Embedder(dimension=DIMENSION * 2)])
+def test_backend_or_dimension_mismatch_requires_force(client, source, tmp_path, embedder):
+    store = LocalObjectStore(str(tmp_path / "snapshots"))
+    export_snapshot(source, store, "s1", "hash")
+    target = client.create_collection("target")
+
+    with pytest.raises(ValueError, match="--force"):
+        import_snapshot(CollectionLoader(target, embedder), store, "s1")
+    assert target.count() == 0
+
+    result = import_snapshot(CollectionLoader(target, embedder), store, "s1", force=True)
+    assert result["chunks"] == CHUNKS
+    assert target.count() == CHUNKS
@@ -0,0 +1,83 @@
+import asyncio
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from src.main import UploadSizeLimitMiddleware
+
+MAX_FILE_BYTES = 1000
+OVERHEAD = 200
+BOUNDARY = "limite"
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, path="/upload/", max_file_bytes=MAX_FILE_BYTES, overhead=OVERHEAD)
+
+    @app.post("/upload/")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def multipart_body(content):
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.txt\"\r\n\r\n".encode()
+        + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+
+
+def post_chunked(app, content, block_size=100):
+    """Envoie le corps par blocs, sans Content-Length ; renvoie le statut et le nombre de blocs lus"""
+    body = multipart_body(content)
+    blocks = [body[start:start + block_size] for start in range(0, len(body), block_size)]
+    received = []
+    sent = []
+
+    async def receive():
+        received.append(len(received))
+        index = len(received) - 1
+        return {"type": "http.request", "body": blocks[index], "more_body": index < len(blocks) - 1}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/upload/", "raw_path": b"/upload/", "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+        "client": ("test", 1), "server": ("testserver", 80)
+    }
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], len(received), len(blocks)
+
+
+def test_small_chunked_upload_is_accepted():
+    status, _, _ = post_chunked(make_client().app, b"x" * 500)
+    assert status == 200
+
+
+def test_chunked_upload_is_stopped_once_over_limit():
+    status, received, total = post_chunked(make_client().app, b"x" * 100_000)
+    assert status == 413
+    # La réception s'arrête au premier bloc au-delà de la limite, pas à la fin du corps
+    assert received * 100 <= MAX_FILE_BYTES + OVERHEAD + 100
+    assert received < total
+
+
+def test_content_length_over_limit_is_refused_before_reading():
+    response = make_client().post("/upload/", files={"file": ("a.txt", b"x" * 5000)})
+    assert response.status_code == 413
+    assert "1000" in response.json()["detail"]
+
+
+def test_other_paths_are_not_limited():
+    client = make_client()
+
+    @client.app.post("/other/")
+    async def other(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    response = client.post("/other/", files={"file": ("a.txt", b"x" * 5000)})
+    assert response.status_code == 200
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from src.db.vector_index import Int8VectorIndex, quantize
+
+DIMENSION = 16
+
+
+def random_vectors(generator, count):
+    return generator.standard_normal((count, DIMENSION)).astype(np.float32)
+
+
+def results_of(index, queries, k=1000, ids=None):
+    return [dict(hits) for hits in index.search(queries, k, ids=ids)]
+
+
+def test_quantized_scores_match_cosine():
+    generator = np.random.default_rng(0)
+    vectors = random_vectors(generator, 200)
+    codes, scales = quantize(vectors)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    rebuilt = codes.astype(np.float32) * scales[:, None]
+    assert np.abs(rebuilt - normalized).max() <= scales.max() / 2 + 1e-6
+
+
+def test_search_is_exact_up_to_quantization(tmp_path):
+    generator = np.random.default_rng(1)
+    vectors = random_vectors(generator, 500)
+    index = Int8VectorIndex(str(tmp_path / "int8"), DIMENSION, block_rows=64)
+    index.add([f"c{number}" for number in range(500)], vectors)
+
+    queries = random_vectors(generator, 8)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    for query_index, hits in enumerate(index.search(queries, 10)):
+        assert len(hits) == 10
+        for chunk_id, score in hits:
+            assert score == pytest.approx(exact[query_index, int(chunk_id[1:])], abs=0.02)
+        assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_merged_segments_match_single_segment_index(tmp_path):
+    generator = np.random.default_rng(2)
+    index = Int8VectorIndex(str(tmp_path / "int8"), DIMENSION, max_segments=4, block_rows=8)
+    live = {}
+    for _ in range(60):
+        if live and generator.random() < 0.25:
+            removed = list(generator.choice(sorted(live), size=min(len(live), 3), replace=False))
+            index.delete(removed)
+            for chunk_id in removed:
+                del live[chunk_id]
+        else:
+            # Identifiants éventuellement répétés dans un lot : la dernière occurrence est visible
+            ids = [f"c{number}" for number in generator.integers(0, 40, size=generator.integers(1, 5))]
+            vectors = random_vectors(generator, len(ids))
+            index.add(ids, vectors)
+            live.update(zip(ids, vectors))
+        assert index.stats()["segments"] <= 4
+
+    reference = Int8VectorIndex(str(tmp_path / "reference"), DIMENSION)
+    reference.add(list(live), np.array(list(live.values())))
+    assert index.stats()["live_chunks"] == len(live)
+    queries = random_vectors(generator, 5)
+    for found, expected in zip(results_of(index, queries), results_of(reference, queries)):
+        assert found.keys() == expected.keys()
+        for chunk_id, score in expected.items():
+            assert found[chunk_id] == pytest.approx(score, abs=1e-5)
+
+    candidates = sorted(live)[:5] + ["absent"]
+    for found in results_of(index, queries, ids=candidates):
+        assert set(found) == set(candidates[:5])
+
+
+def test_merge_keeps_last_occurrence_of_repeated_id(tmp_path):
+    index = Int8VectorIndex(str(tmp_path / "int8"), DIMENSION, max_segments=2)
+    first, last, other = np.eye(DIMENSION, dtype=np.float32)[:3]
+    index.add(["a", "a"], np.array([first, last]))
+    index.add(["b"], np.array([other]))
+    # Troisième segment : les deux premiers sont fusionnés
+    index.add(["c"], np.array([other]))
+
+    assert index.stats()["segments"] <= 2
+    assert dict(index.search(last, 3)[0])["a"] == pytest.approx(1.0, abs=0.01)
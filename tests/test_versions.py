@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from src.db.versions import VersionStore, apply_delta, make_delta
+
+
+def lines_of(text):
+    return text.splitlines(keepends=True)
+
+
+@pytest.mark.parametrize("base, target", [
+    ("", "un\ndeux\n"),
+    ("un\ndeux\n", ""),
+    ("un\ndeux\ntrois\n", "un\ndeux\ntrois\n"),
+    ("un\ndeux\ntrois\n", "zéro\nun\ntrois\nquatre\n"),
+    ("a\nb\nc\nd\n", "d\nc\nb\na\n"),
+    ("ligne sans fin", "ligne sans fin\nsuite"),
+])
+def test_apply_delta_rebuilds_target(base, target):
+    delta = make_delta(lines_of(base), lines_of(target))
+    assert "".join(apply_delta(lines_of(base), delta)) == target
+
+
+def test_delta_copies_unchanged_lines():
+    base = [f"ligne {index}\n" for index in range(100)]
+    target = base[:50] + ["insérée\n"] + base[50:]
+    assert make_delta(base, target) == [[0, 50], ["insérée\n"], [50, 100]]
+
+
+def test_random_edits_round_trip():
+    generator = random.Random(7)
+    lines = [f"ligne {index}\n" for index in range(50)]
+    for _ in range(100):
+        edited = list(lines)
+        for _ in range(generator.randint(1, 5)):
+            position = generator.randrange(len(edited) + 1)
+            if generator.random() < 0.5 and edited:
+                del edited[min(position, len(edited) - 1)]
+            else:
+                edited.insert(position, f"nouvelle {generator.random()}\n")
+        assert apply_delta(lines, make_delta(lines, edited)) == edited
+        lines = edited
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VersionStore(str(tmp_path / "versions.sqlite3"), keyframe_interval=3, cache_entries=4)
+
+
+def test_versions_rebuilt_from_keyframes(store):
+    contents = []
+    lines = [f"paragraphe {index}\n" for index in range(40)]
+    for version in range(1, 9):
+        lines[version] = f"paragraphe {version} modifié\n"
+        contents.append("".join(lines))
+        info = store.append("doc", contents[-1], {"auteur": "test"})
+        assert info["version"] == version
+        # Une keyframe toutes les keyframe_interval versions, des deltas entre les deux
+        assert info["stored_as"] == ("keyframe" if (version - 1) % 3 == 0 else "delta")
+
+    store.cache.clear()
+    for version, content in enumerate(contents, start=1):
+        record = store.get("doc", version)
+        assert record["content"] == content
+        assert record["is_current"] == (version == len(contents))
+
+    history = store.history("doc", include_content=True)
+    assert [entry["content"] for entry in history] == contents
+
+
+def test_unchanged_content_creates_no_version(store):
+    assert store.peek("doc", "texte\n")["version"] == 0
+    store.append("doc", "texte\n", {"source": "a"})
+    assert store.peek("doc", "texte\n", {"source": "a"}) == {"doc_id": "doc", "version": 1, "unchanged": True}
+    assert store.append("doc", "texte\n", {"source": "a"})["unchanged"]
+    # Des métadonnées différentes suffisent à créer une version
+    assert not store.peek("doc", "texte\n", {"source": "b"})["unchanged"]
+    assert store.append("doc", "texte\n", {"source": "b"})["version"] == 2
+    assert store.get("doc", 3) is None